@@ -1,56 +1,78 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from app.database import get_db, Analysis
-import google.generativeai as genai
-import os
+from typing import Optional
+from app.database import SessionLocal
+from app.services.retrieval import search
+from app.services.chat_context import ChatContext, load_context, answer_key, context_cache, answer_cache
+from app.services.chat_metrics import chat_metrics
+from app.services.intents import answer_locally
+from app.services.llm import get_llm, LLMNotConfigured
+from app.services.progress import sse_event
+from app.services.telemetry import record_span
+import json
+import time
+import asyncio
+import logging
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+NO_CONTEXT_REPLY = "I don't see any uploaded bank statements yet. Please upload a PDF first so I can analyze it!"
 
 class ChatRequest(BaseModel):
     message: str
+    analysis_id: Optional[int] = None # Defaults to the newest analysis
 
-def get_latest_context(db: Session):
-    latest = db.query(Analysis).order_by(Analysis.created_at.desc()).first()
-    if not latest or not latest.raw_json_results:
-        return None
-    
-    import json
+@router.get("/api/chat/metrics")
+def chat_metrics_stats():
+    """
+    Prompt size versus full statement size, retrieval/LLM latency and
+    context/answer cache hit rates.
+    """
+    return {
+        **chat_metrics.stats(),
+        "context_cache": context_cache.stats(),
+        "answer_cache": answer_cache.stats()
+    }
+
+def resolve_context(analysis_id: Optional[int]) -> Optional[ChatContext]:
+    """
+    Runs in a worker thread with its own session, so no database connection
+    is held while the model is answering.
+    """
+    db = SessionLocal()
     try:
-        data = json.loads(latest.raw_json_results)
-        return data.get("raw_markdown", "")
-    except:
-        return ""
+        context = load_context(db, analysis_id)
+    finally:
+        db.close()
+    if context is None and analysis_id is not None:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    if context is None or not context.index["chunks"]:
+        return None
+    return context
 
-@router.post("/api/chat")
-async def chat_with_copilot(request: ChatRequest, db: Session = Depends(get_db)):
-    user_message = request.message
-    
-    # 1. Get Context
-    context_text = get_latest_context(db)
-    
-    if not context_text:
-        return {
-            "response": "I don't see any uploaded bank statements yet. Please upload a PDF first so I can analyze it!"
-        }
-    
-    # 2. Configure Gemini
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise HTTPException(status_code=500, detail="Gemini API Key not configured.")
-        
-    genai.configure(api_key=api_key)
+def build_prompt(context: ChatContext, user_message: str):
+    """
+    Returns (prompt, retrieval_ms).
+    """
+    # Only the statement chunks relevant to the question go into the prompt
+    start = time.perf_counter()
+    chunks = search(context.index, user_message)
+    excerpts = "\n\n".join(f"[{c['file']} p.{c['page']}]\n{c['text']}" for c in chunks)
+    retrieval_ms = (time.perf_counter() - start) * 1000
+    record_span("retrieval", retrieval_ms / 1000, chunks=len(chunks))
 
-    try:
-        # Use Gemini Flash Latest (Stable Free Tier)
-        model = genai.GenerativeModel('gemini-flash-latest')
-        
-        prompt = f"""
+    prompt = f"""
 You are the Maybank SME Copilot, an expert financial analyst.
-You have access to the parsed text of the user's uploaded bank statement.
+You have access to the computed analysis of the user's uploaded bank statement
+and the statement excerpts most relevant to the question.
+
+ANALYSIS SUMMARY (JSON):
+{json.dumps(context.summary, separators=(",", ":"))}
 
-CONTEXT:
-{context_text[:100000]} 
+STATEMENT EXCERPTS:
+{excerpts}
 
 USER QUESTION:
 {user_message}
@@ -62,10 +84,92 @@ INSTRUCTIONS:
 - **Be extremely concise**. Avoid fluffy intro/outro sentences.
 - Use markdown tables if comparing data.
 """
-        response = model.generate_content(prompt)
-        
-        return {"response": response.text}
+    return prompt, retrieval_ms
+
+def get_client():
+    try:
+        return get_llm()
+    except LLMNotConfigured as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/api/chat")
+async def chat_with_copilot(request: ChatRequest):
+    context = await asyncio.to_thread(resolve_context, request.analysis_id)
+    if not context:
+        return {"response": NO_CONTEXT_REPLY}
+
+    # Quantitative questions are answered exactly from the stored analysis
+    local = answer_locally(request.message, context.summary, context.facts)
+    chat_metrics.record_question(local[0] if local else None)
+    if local:
+        return {"response": local[1], "source": "local"}
+
+    # Identical questions on an unchanged analysis reuse the earlier answer
+    key = answer_key(context, request.message)
+    cached = answer_cache.get(key)
+    if cached is not None:
+        return {"response": cached}
+
+    prompt, retrieval_ms = build_prompt(context, request.message)
+    llm = get_client()
+
+    try:
+        start = time.perf_counter()
+        text = await llm.generate(prompt)
+        llm_seconds = time.perf_counter() - start
+        record_span("llm", llm_seconds, backend=llm.name, mode="generate")
+        chat_metrics.record(len(prompt), context.index.get("source_chars", 0), retrieval_ms, llm_seconds * 1000)
+        answer_cache.put(key, text)
+        return {"response": text}
 
     except Exception as e:
-        print(f"Gemini Error: {e}")
+        record_span("llm", time.perf_counter() - start, "error", backend=llm.name, mode="generate")
+        logger.error("LLM error (%s): %s", llm.name, e)
         return {"response": f"⚠️ **AI Error**: I couldn't process that request. ({str(e)})"}
+
+@router.post("/api/chat/stream")
+async def chat_with_copilot_stream(request: ChatRequest):
+    """
+    Same as /api/chat, streamed as Server-Sent Events: `token` events carry
+    text as the model produces it, then a final `done` (with the full
+    response) or `error` event. Local and memoized answers arrive as a
+    single token.
+    """
+    context = await asyncio.to_thread(resolve_context, request.analysis_id)
+    local = answer_locally(request.message, context.summary, context.facts) if context else None
+    if context:
+        chat_metrics.record_question(local[0] if local else None)
+    key = answer_key(context, request.message) if context and not local else None
+    cached = answer_cache.get(key) if key else None
+    llm = get_client() if key and cached is None else None
+
+    async def event_stream():
+        if not context:
+            reply = NO_CONTEXT_REPLY
+        else:
+            reply = local[1] if local else cached
+        if reply is not None:
+            yield sse_event({"event": "token", "text": reply})
+            yield sse_event({"event": "done", "response": reply})
+            return
+
+        prompt, retrieval_ms = build_prompt(context, request.message)
+        parts = []
+        start = time.perf_counter()
+        try:
+            async for text in llm.stream(prompt):
+                parts.append(text)
+                yield sse_event({"event": "token", "text": text})
+        except Exception as e:
+            record_span("llm", time.perf_counter() - start, "error", backend=llm.name, mode="stream")
+            logger.error("LLM error (%s): %s", llm.name, e)
+            yield sse_event({"event": "error", "detail": str(e)})
+            return
+        llm_seconds = time.perf_counter() - start
+        record_span("llm", llm_seconds, backend=llm.name, mode="stream")
+        chat_metrics.record(len(prompt), context.index.get("source_chars", 0), retrieval_ms, llm_seconds * 1000)
+        response = "".join(parts)
+        answer_cache.put(key, response)
+        yield sse_event({"event": "done", "response": response})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
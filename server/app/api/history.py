@@ -1,46 +1,119 @@
-from fastapi import APIRouter, Depends, HTTPException
+import base64
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func, or_, and_
 from sqlalchemy.orm import Session
-from app.database import get_db, Analysis, Company
-import json
+from typing import Optional
+from datetime import date, datetime, time, timedelta
+from app.database import get_db, Analysis, AnalysisSection, Company, Transaction
+from app.services.payload import load_payload, parse_fields
+from app.services.history_counts import adjust_count, counter_total, cached_count
+from app.services.chat_context import invalidate_analysis
+from app.services.aggregates import rebuild_company_months
 
 router = APIRouter()
 
+def encode_cursor(created_at: datetime, id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{id}".encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @router.get("/api/history")
-def get_history(db: Session = Depends(get_db)):
+def get_history(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    company_id: Optional[int] = None,
+    risk_level: Optional[str] = None,
+    min_score: Optional[int] = None,
+    max_score: Optional[int] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
     """
-    Returns a list of all past analyses, joined with Company data.
+    Returns one page of past analyses, newest first, joined with Company data.
+    Pass the returned `next_cursor` back as `cursor` for the following page.
     """
-    history = db.query(
+    query = db.query(
         Analysis.id,
         Analysis.score,
         Analysis.risk_level,
         Analysis.created_at,
         Company.name.label("company_name")
-    ).join(Company).order_by(Analysis.created_at.desc()).all()
-    
-    return [
-        {
-            "id": h.id,
-            "company_name": h.company_name,
-            "score": h.score,
-            "risk_level": h.risk_level,
-            "date": h.created_at.isoformat()
-        }
-        for h in history
-    ]
+    ).join(Company)
+
+    filters = []
+    if company_id is not None:
+        filters.append(Analysis.company_id == company_id)
+    if risk_level:
+        filters.append(Analysis.risk_level == risk_level)
+    if min_score is not None:
+        filters.append(Analysis.score >= min_score)
+    if max_score is not None:
+        filters.append(Analysis.score <= max_score)
+    if start:
+        filters.append(Analysis.created_at >= datetime.combine(start, time.min))
+    if end:
+        filters.append(Analysis.created_at < datetime.combine(end + timedelta(days=1), time.min))
+    query = query.filter(*filters)
+
+    if cursor:
+        # Keyset: strictly older than the last row of the previous page
+        created_at, last_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Analysis.created_at < created_at,
+            and_(Analysis.created_at == created_at, Analysis.id < last_id)
+        ))
+
+    rows = query.order_by(Analysis.created_at.desc(), Analysis.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if min_score is None and max_score is None and not start and not end:
+        total = counter_total(db, company_id, risk_level or None)
+    else:
+        key = (company_id, risk_level, min_score, max_score, start, end)
+        total = cached_count(key, db.query(func.count(Analysis.id)).filter(*filters))
+
+    return {
+        "items": [
+            {
+                "id": h.id,
+                "company_name": h.company_name,
+                "score": h.score,
+                "risk_level": h.risk_level,
+                "date": h.created_at.isoformat()
+            }
+            for h in rows
+        ],
+        "next_cursor": encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None,
+        "total": total
+    }
 
 @router.get("/api/analysis/{id}")
-def get_analysis_detail(id: int, db: Session = Depends(get_db)):
+def get_analysis_detail(id: int, fields: Optional[str] = None, db: Session = Depends(get_db)):
     """
-    Returns the full JSON payload for a specific analysis to re-render the dashboard.
+    Returns the JSON payload for a specific analysis to re-render the dashboard.
+    `fields` projects the payload onto sections (summary, graph, transactions,
+    raw_markdown), e.g. ?fields=summary,graph; omitted sections are not decoded.
     """
+    try:
+        sections = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     record = db.query(Analysis).filter(Analysis.id == id).first()
     if not record:
         raise HTTPException(status_code=404, detail="Analysis not found")
         
     try:
         # Provide the stored JSON
-        data = json.loads(record.raw_json_results)
+        data = load_payload(db, record, sections)
+        data["id"] = record.id
         return data
     except:
         raise HTTPException(status_code=500, detail="Corrupt data in history record")
@@ -54,6 +127,14 @@ def delete_analysis(id: int, db: Session = Depends(get_db)):
     if not record:
         raise HTTPException(status_code=404, detail="Analysis not found")
         
+    adjust_count(db, record.company_id, record.risk_level, -1)
+    # Every month this analysis has rows in is refolded without them
+    month = func.strftime('%Y-%m', Transaction.date)
+    months = [m for (m,) in db.query(month).filter(Transaction.analysis_id == id, Transaction.date.isnot(None)).distinct()]
+    db.query(Transaction).filter(Transaction.analysis_id == id).delete(synchronize_session=False)
+    db.query(AnalysisSection).filter(AnalysisSection.analysis_id == id).delete(synchronize_session=False)
+    rebuild_company_months(db, record.company_id, months)
     db.delete(record)
     db.commit()
+    invalidate_analysis(id)
     return {"message": "Analysis deleted successfully"}
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, HTTPException
+from app.services.jobs import get_job
+import json
+
+router = APIRouter()
+
+@router.get("/api/jobs/{job_id}")
+def get_job_status(job_id: str):
+    """
+    Returns the state of a queued analysis job.
+    """
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "analysis_id": job.analysis_id,
+        "error": job.error,
+        "created_at": job.created_at.isoformat(),
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None
+    }
+
+@router.get("/api/jobs/{job_id}/result")
+def get_job_result(job_id: str):
+    """
+    Returns the analysis payload of a finished job (same shape as /api/upload).
+    """
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error or "Job failed")
+    if job.status != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+
+    return json.loads(job.result_json)
@@ -0,0 +1,74 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import func
+from app.database import SessionLocal, Job
+from app.services.telemetry import registry
+from app.services.ocr import ocr_client
+from app.services.ocr_cache import ocr_cache
+from app.services.chat_context import context_cache, answer_cache
+from app.services.chat_metrics import chat_metrics
+from app.services.history_counts import count_cache_stats
+
+router = APIRouter()
+
+BREAKER_STATES = ["closed", "half_open", "open"]
+
+def _cache_lookups():
+    ocr = ocr_cache.stats()
+    caches = {
+        "ocr": ocr,
+        "chat_context": context_cache.stats(),
+        "chat_answer": answer_cache.stats(),
+        "history_count": count_cache_stats,
+    }
+    for name, stats in caches.items():
+        yield {"cache": name, "result": "hit"}, stats["hits"]
+        yield {"cache": name, "result": "miss"}, stats["misses"]
+
+def _cache_entries():
+    yield {"cache": "ocr"}, ocr_cache.stats()["entries"]
+    yield {"cache": "chat_context"}, context_cache.stats()["entries"]
+    yield {"cache": "chat_answer"}, answer_cache.stats()["entries"]
+
+def _ocr_attempts():
+    stats = ocr_client.stats()
+    for outcome in ("calls", "retries", "timeouts", "failures", "rejected", "permanent"):
+        yield {"backend": stats["backend"], "outcome": outcome}, stats[outcome]
+
+def _breaker_state():
+    state = ocr_client.breaker.state
+    for name in BREAKER_STATES:
+        yield {"backend": ocr_client.name, "state": name}, 1 if name == state else 0
+
+def _chat_questions():
+    stats = chat_metrics.stats()["local_answers"]
+    yield {"answered_by": "local"}, stats["hits"]
+    yield {"answered_by": "llm_or_cache"}, stats["questions"] - stats["hits"]
+
+def _jobs_by_status():
+    db = SessionLocal()
+    try:
+        rows = db.query(Job.status, func.count(Job.id)).group_by(Job.status).all()
+    finally:
+        db.close()
+    for status, count in rows:
+        yield {"status": status}, count
+
+# Read from the existing stats objects at scrape time; nothing is added to the request path
+registry.collected("sme_cache_lookups_total", "Cache lookups by cache and result", "counter", _cache_lookups)
+registry.collected("sme_cache_entries", "Entries currently held per cache", "gauge", _cache_entries)
+registry.collected("sme_ocr_cache_bytes", "Markdown bytes held in the OCR cache", "gauge", lambda: [({}, ocr_cache.stats()["size_bytes"])])
+registry.collected("sme_ocr_cache_evictions_total", "OCR cache entries evicted to stay under OCR_CACHE_MAX_BYTES", "counter", lambda: [({}, ocr_cache.evictions)])
+registry.collected("sme_ocr_attempts_total", "OCR client attempts by outcome", "counter", _ocr_attempts)
+registry.collected("sme_ocr_rate_limit_wait_seconds_total", "Time OCR calls spent waiting for the rate limiter", "counter", lambda: [({}, ocr_client.rate_wait_s)])
+registry.collected("sme_ocr_breaker_state", "OCR circuit breaker state (1 for the current state)", "gauge", _breaker_state)
+registry.collected("sme_chat_questions_total", "Chat questions by who answered them", "counter", _chat_questions)
+registry.collected("sme_jobs", "Jobs in the queue table by status", "gauge", _jobs_by_status)
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Process metrics in the Prometheus text format: stage and HTTP latency
+    histograms, cache hit/miss counters, OCR and LLM volume counters.
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
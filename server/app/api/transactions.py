@@ -0,0 +1,94 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from typing import Optional
+from datetime import date
+from app.database import get_db, Company, Transaction
+from app.services.aggregates import company_analysis, COMPANY_WINDOW_MONTHS
+
+router = APIRouter()
+
+@router.get("/api/transactions")
+def list_transactions(
+    company_id: Optional[int] = None,
+    flag: Optional[str] = Query(None, pattern="^(returns|gambling)$"),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    limit: int = Query(200, ge=1, le=5000),
+    db: Session = Depends(get_db)
+):
+    """
+    Queries stored transactions across analyses, e.g. all gambling hits in a quarter.
+    """
+    query = db.query(Transaction)
+    if company_id is not None:
+        query = query.filter(Transaction.company_id == company_id)
+    if flag == "returns":
+        query = query.filter(Transaction.is_return.is_(True))
+    elif flag == "gambling":
+        query = query.filter(Transaction.is_gambling.is_(True))
+    if start:
+        query = query.filter(Transaction.date >= start)
+    if end:
+        query = query.filter(Transaction.date <= end)
+
+    rows = query.order_by(Transaction.date.desc(), Transaction.id.desc()).limit(limit).all()
+    return [
+        {
+            "id": t.id,
+            "analysis_id": t.analysis_id,
+            "company_id": t.company_id,
+            "date": t.date.isoformat() if t.date else None,
+            "description": t.description,
+            "inflow": t.inflow,
+            "outflow": t.outflow,
+            "is_return": t.is_return,
+            "is_gambling": t.is_gambling
+        }
+        for t in rows
+    ]
+
+@router.get("/api/companies/{company_id}/monthly")
+def company_monthly_flows(company_id: int, db: Session = Depends(get_db)):
+    """
+    Monthly inflow/outflow and flag counts for a company, aggregated in SQL.
+    """
+    if not db.query(Company.id).filter(Company.id == company_id).first():
+        raise HTTPException(status_code=404, detail="Company not found")
+
+    month = func.strftime('%Y-%m', Transaction.date)
+    rows = db.query(
+        month.label("month"),
+        func.sum(Transaction.inflow).label("inflow"),
+        func.sum(Transaction.outflow).label("outflow"),
+        func.count(Transaction.id).label("transactions"),
+        func.sum(Transaction.is_return).label("returns"),
+        func.sum(Transaction.is_gambling).label("gambling")
+    ).filter(
+        Transaction.company_id == company_id, Transaction.date.isnot(None)
+    ).group_by(month).order_by(month).all()
+
+    return [
+        {
+            "month": r.month,
+            "inflow": round(r.inflow or 0.0, 2),
+            "outflow": round(r.outflow or 0.0, 2),
+            "transactions": r.transactions,
+            "returns": int(r.returns or 0),
+            "gambling": int(r.gambling or 0)
+        }
+        for r in rows
+    ]
+
+@router.get("/api/companies/{company_id}/analysis")
+def company_level_analysis(company_id: int, months: int = Query(COMPANY_WINDOW_MONTHS, ge=1, le=120), db: Session = Depends(get_db)):
+    """
+    Score, insights and graph for a company over its latest `months` stored
+    months, merged from every statement uploaded for it so far.
+    """
+    if not db.query(Company.id).filter(Company.id == company_id).first():
+        raise HTTPException(status_code=404, detail="Company not found")
+    result = company_analysis(db, company_id, months)
+    if result is None:
+        raise HTTPException(status_code=404, detail="No monthly history stored for this company")
+    return result
@@ -1,13 +1,23 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from typing import List
-import json
-from app.services.ocr import process_pdfs
-from app.database import SessionLocal, Company, Analysis
+import asyncio
+import logging
+from app.services.ocr import process_pdfs, process_spooled
+from app.services.spool import UploadTooLarge, spool_uploads, remove_spooled
+from app.services.progress import ProgressReporter, sse_event
+from app.services.storage import save_analysis_async
+from app.services.jobs import enqueue_job, job_spool_dir
+from app.services.ocr_backends import OCR_BREAKER_COOLDOWN_SECONDS
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Strong references to pipelines still running after their client disconnected
+_background_tasks = set()
 
 @router.post("/api/upload")
-async def upload_files(files: List[UploadFile] = File(...)):
+async def upload_files(files: List[UploadFile] = File(...), mode: str = Query("sync", pattern="^(sync|job)$")):
     """
     Endpoint to upload PDF bank statements.
     Processing involves:
@@ -15,6 +25,9 @@ async def upload_files(files: List[UploadFile] = File(...)):
     2. Sending to LlamaParse (OCR)
     3. Extracting and Aggregating data
     4. Returning JSON for frontend visualization
+
+    With mode=job the files are only spooled and queued; the response is a
+    job id to poll at /api/jobs/{job_id} while a worker runs steps 2-4.
     """
     if not files:
         raise HTTPException(status_code=400, detail="No files uploaded")
@@ -22,46 +35,85 @@ async def upload_files(files: List[UploadFile] = File(...)):
     # Filter for PDFs if needed, but for now allow generic file handling by the service
     # (LlamaParse supports multiple formats, but prompt says PDF bank statements)
     
-    # (LlamaParse supports multiple formats, but prompt says PDF bank statements)
-    
     try:
-        result = await process_pdfs(files)
+        if mode == "job":
+            spooled = await spool_uploads(files, directory=job_spool_dir())
+            job_id = enqueue_job(spooled)
+            return JSONResponse(status_code=202, content={"job_id": job_id, "status": "queued"})
+
+        progress = ProgressReporter(total_files=len(files))
+        result = await process_pdfs(files, progress=progress)
+
+        # Every file hit an OCR outage: tell the client to come back rather than return an empty analysis
+        file_errors = result.get("file_errors") or []
+        if result.get("status") != "success" and file_errors and all(e["retryable"] for e in file_errors):
+            raise HTTPException(
+                status_code=503,
+                detail="OCR service is temporarily unavailable. Please retry shortly.",
+                headers={"Retry-After": str(max(1, int(OCR_BREAKER_COOLDOWN_SECONDS)))}
+            )
         
         # Save to Database
         if result.get("status") == "success":
-            db = SessionLocal()
-            try:
-                # 1. Company Handling
-                name = result.get("entity_name", "Unknown Company")
-                company = db.query(Company).filter(Company.name == name).first()
-                if not company:
-                    company = Company(name=name, ssm_number="Unknown") # Populate SSM if we extract it later
-                    db.add(company)
-                    db.commit()
-                    db.refresh(company)
-                
-                # 2. Analysis Record
-                summary = result.get("summary", {})
-                analysis = Analysis(
-                    company_id=company.id,
-                    score=int(summary.get("score", 0)),
-                    risk_level=summary.get("risk_level", "Unknown"),
-                    total_inflow=float(summary.get("total_inflow", 0.0)),
-                    total_outflow=float(summary.get("total_outflow", 0.0)),
-                    raw_json_results=json.dumps(result) # Store full payload for re-render
-                )
-                db.add(analysis)
-                db.commit()
-                db.refresh(analysis)
-                
+            with progress.stage("saving"):
+                analysis_id = await save_analysis_async(result)
+            if analysis_id is not None:
                 # Append ID to result so frontend knows it matches a DB record
-                result["id"] = analysis.id
-                
-            except Exception as db_e:
-                print(f"Database Error: {db_e}")
-            finally:
-                db.close()
+                result["id"] = analysis_id
 
         return result
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.exception("Upload failed")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/api/upload/stream")
+async def upload_files_stream(files: List[UploadFile] = File(...)):
+    """
+    Same pipeline as /api/upload, reported as Server-Sent Events.
+    Emits stage_started / stage_completed / stage_failed for each stage
+    (spooling, metadata, ocr, extraction, deduplication, analytics, saving) with timings and
+    running counts, then a final `result` event carrying the full payload.
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="No files uploaded")
+
+    queue: asyncio.Queue = asyncio.Queue()
+    progress = ProgressReporter(sink=queue.put_nowait, total_files=len(files))
+
+    # Spool while the request body is still open; these events are flushed first
+    try:
+        spooled = await spool_uploads(files, progress=progress)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    async def run_pipeline():
+        try:
+            result = await process_spooled(spooled, progress=progress)
+            if result.get("status") == "success":
+                with progress.stage("saving"):
+                    analysis_id = await save_analysis_async(result)
+                if analysis_id is not None:
+                    result["id"] = analysis_id
+            progress.emit("result", result=result)
+        except Exception as e:
+            logger.exception("Streamed upload failed")
+            progress.emit("error", detail=str(e))
+        finally:
+            remove_spooled(spooled)
+
+    async def event_stream():
+        # The task is not tied to the connection: a client that drops still gets its analysis saved
+        task = asyncio.create_task(run_pipeline())
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+        while True:
+            event = await queue.get()
+            yield sse_event(event)
+            if event["event"] in ("result", "error"):
+                break
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
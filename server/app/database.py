@@ -1,12 +1,70 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, Text
+import os
+from sqlalchemy import create_engine, event, Column, Integer, String, Float, DateTime, Date, Boolean, ForeignKey, Text, LargeBinary, Index, text
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from datetime import datetime
 import json
 
 DATABASE_URL = "sqlite:///./sme_copilot.db"
+ASYNC_DATABASE_URL = DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# Pool sizing (per engine). SQLite serialises writers, but WAL lets readers run alongside them
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",     # readers and the writer no longer block each other
+    "synchronous": "NORMAL",   # durable with WAL; fsync only at checkpoints
+    "busy_timeout": DB_BUSY_TIMEOUT_MS, # wait for the write lock instead of failing with "database is locked"
+    "cache_size": -64000,      # 64 MB page cache per connection
+    "temp_store": "MEMORY",
+}
+
+def apply_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+def create_sqlite_engine(url: str = DATABASE_URL, tuned: bool = True):
+    """
+    Sync engine. `tuned=False` gives the previous defaults (rollback journal,
+    default pool); only the benchmarks use it.
+    """
+    if not tuned:
+        return create_engine(url, connect_args={"check_same_thread": False})
+    sync_engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT
+    )
+    event.listen(sync_engine, "connect", apply_pragmas)
+    return sync_engine
+
+def create_async_sqlite_engine(url: str = ASYNC_DATABASE_URL):
+    """
+    aiosqlite engine: queries run on the driver's thread, so awaiting them
+    never blocks the event loop. Same pragmas and pool sizing as the sync engine.
+    """
+    async_engine = create_async_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT
+    )
+    event.listen(async_engine.sync_engine, "connect", apply_pragmas)
+    return async_engine
+
+engine = create_sqlite_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+async_engine = create_async_sqlite_engine()
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 class Company(Base):
@@ -14,11 +72,16 @@ class Company(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
+    key = Column(String, nullable=True) # company_key(name): the identity uploads are matched on
     ssm_number = Column(String, index=True, nullable=True) # Optional for now
     created_at = Column(DateTime, default=datetime.utcnow)
     
     analyses = relationship("Analysis", back_populates="company")
 
+    __table_args__ = (
+        Index("ux_companies_key", "key", unique=True),
+    )
+
 class Analysis(Base):
     __tablename__ = "analyses"
     
@@ -31,20 +94,189 @@ class Analysis(Base):
     total_inflow = Column(Float)
     total_outflow = Column(Float)
     
-    # Store full JSON result for re-rendering
-    # SQLite doesn't have native JSON type in older versions, so we store as Text
-    raw_json_results = Column(Text) 
+    # Legacy: full JSON result for re-rendering. New analyses leave this empty
+    # and store their payload in analysis_sections instead.
+    raw_json_results = Column(Text, nullable=True) 
     
     created_at = Column(DateTime, default=datetime.utcnow)
     
     company = relationship("Company", back_populates="analyses")
 
+    # History is paged newest-first on (created_at, id); one index per filter
+    __table_args__ = (
+        Index("ix_analyses_created_id", "created_at", "id"),
+        Index("ix_analyses_company_created", "company_id", "created_at", "id"),
+        Index("ix_analyses_risk_created", "risk_level", "created_at", "id"),
+        Index("ix_analyses_score_created", "score", "created_at", "id"),
+    )
+
+class AnalysisCount(Base):
+    __tablename__ = "analysis_counts"
+    
+    # Number of analyses per (company, risk level), kept in step with inserts
+    # and deletes so history totals never need a COUNT(*) over analyses
+    company_id = Column(Integer, ForeignKey("companies.id"), primary_key=True)
+    risk_level = Column(String, primary_key=True)
+    count = Column(Integer, default=0)
+
+class AnalysisSection(Base):
+    __tablename__ = "analysis_sections"
+    
+    # One row per payload section: summary, graph, transactions, raw_markdown
+    analysis_id = Column(Integer, ForeignKey("analyses.id"), primary_key=True)
+    name = Column(String, primary_key=True)
+    codec = Column(String) # "json" or "json+zlib"
+    data = Column(LargeBinary)
+    raw_size = Column(Integer) # Uncompressed bytes, for monitoring the compression ratio
+
+class Transaction(Base):
+    __tablename__ = "transactions"
+    
+    id = Column(Integer, primary_key=True)
+    analysis_id = Column(Integer, ForeignKey("analyses.id"), index=True)
+    company_id = Column(Integer, ForeignKey("companies.id"))
+    
+    date = Column(Date, nullable=True) # Parsed; NULL when OCR produced an unreadable date
+    raw_date = Column(String)
+    description = Column(String)
+    inflow = Column(Float, default=0.0)
+    outflow = Column(Float, default=0.0)
+    
+    # Red flags (same keyword rules as compute_financial_analysis)
+    is_return = Column(Boolean, default=False)
+    is_gambling = Column(Boolean, default=False)
+
+    # Whether the row counts towards the company's stored months (a later
+    # statement may supersede it or repeat it); NULL until first folded
+    counted = Column(Boolean, nullable=True)
+
+    __table_args__ = (
+        Index("ix_transactions_company_date", "company_id", "date"),
+        Index("ix_transactions_company_counted", "company_id", "date", sqlite_where=text("counted = 1")),
+        Index("ix_transactions_company_unfolded", "company_id", sqlite_where=text("counted IS NULL")),
+        Index("ix_transactions_date", "date"),
+        Index("ix_transactions_return_date", "is_return", "date"),
+        Index("ix_transactions_gambling_date", "is_gambling", "date"),
+    )
+
+class CompanyMonth(Base):
+    __tablename__ = "company_months"
+    
+    # Running per-company totals for one calendar month, merged in as
+    # statements arrive; company scores are recomputed from these rows
+    company_id = Column(Integer, ForeignKey("companies.id"), primary_key=True)
+    month = Column(String, primary_key=True) # "YYYY-MM"
+    inflow = Column(Float, default=0.0)
+    outflow = Column(Float, default=0.0)
+    transactions = Column(Integer, default=0)
+    returns = Column(Integer, default=0)
+    gambling = Column(Integer, default=0)
+    analysis_id = Column(Integer, ForeignKey("analyses.id"), nullable=True) # Analysis that last supplied the month
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class CompanyMonthPayer(Base):
+    __tablename__ = "company_month_payers"
+    
+    # Inflow per normalised payer and month, for concentration over any window
+    company_id = Column(Integer, ForeignKey("companies.id"), primary_key=True)
+    month = Column(String, primary_key=True)
+    payer = Column(String, primary_key=True)
+    inflow = Column(Float, default=0.0)
+
+class Job(Base):
+    __tablename__ = "jobs"
+    
+    id = Column(String, primary_key=True) # uuid4 hex, handed to clients
+    status = Column(String, default="queued", index=True) # queued, running, succeeded, failed
+    
+    # Spooled input files as JSON: [{filename, path, sha256, size}]
+    payload = Column(Text)
+    
+    # Lease: a running job whose lease has expired is reclaimed by another worker
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    available_at = Column(DateTime, default=datetime.utcnow) # retry backoff
+    
+    analysis_id = Column(Integer, ForeignKey("analyses.id"), nullable=True)
+    result_json = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_jobs_claim", "status", "available_at"),
+    )
+
 def init_db():
+    create_tables()
+    _migrate_company_keys()
+    ensure_transaction_counted_column()
+    # create_all skips indexes of tables that already exist
+    for index in list(Analysis.__table__.indexes) + list(Transaction.__table__.indexes):
+        index.create(bind=engine, checkfirst=True)
+    _seed_analysis_counts()
+
+def ensure_company_key_column():
+    with engine.begin() as conn:
+        columns = [row[1] for row in conn.exec_driver_sql("PRAGMA table_info(companies)")]
+        if columns and "key" not in columns: # No columns: the table is yet to be created
+            conn.exec_driver_sql("ALTER TABLE companies ADD COLUMN key VARCHAR")
+
+def ensure_transaction_counted_column():
+    with engine.begin() as conn:
+        columns = [row[1] for row in conn.exec_driver_sql("PRAGMA table_info(transactions)")]
+        if columns and "counted" not in columns:
+            conn.exec_driver_sql("ALTER TABLE transactions ADD COLUMN counted BOOLEAN")
+
+def create_tables():
+    """
+    Creates every missing table. Tables that already exist are left as they
+    are, columns and indexes included; the ensure_* helpers and init_db add those.
+    """
     Base.metadata.create_all(bind=engine)
 
+def _migrate_company_keys():
+    """
+    Databases created before companies had a normalized key get the column.
+    Filling it merges companies, so it is left to merge_companies.py (after
+    a --dry-run review) rather than done silently at startup; until then
+    startup fails, since the unique index cannot be built.
+    """
+    ensure_company_key_column()
+    with engine.connect() as conn:
+        unkeyed = conn.execute(text("SELECT COUNT(*) FROM companies WHERE key IS NULL")).scalar()
+    if unkeyed:
+        raise RuntimeError(
+            f"{unkeyed} companies have no normalized key yet. Review the merges this implies with "
+            f"`python merge_companies.py --dry-run`, then run `python merge_companies.py` before starting."
+        )
+    for index in Company.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+def _seed_analysis_counts():
+    """
+    Fills analysis_counts from existing analyses the first time it is created.
+    """
+    with engine.begin() as conn:
+        if conn.execute(text("SELECT 1 FROM analysis_counts LIMIT 1")).first():
+            return
+        conn.execute(text(
+            "INSERT INTO analysis_counts (company_id, risk_level, count) "
+            "SELECT company_id, risk_level, COUNT(*) FROM analyses "
+            "WHERE company_id IS NOT NULL AND risk_level IS NOT NULL "
+            "GROUP BY company_id, risk_level"
+        ))
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as session:
+        yield session
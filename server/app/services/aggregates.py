@@ -0,0 +1,433 @@
+import os
+import statistics
+import calendar
+import numpy as np
+import pandas as pd
+from collections import Counter
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import bindparam, func, insert, true, update
+from app.database import CompanyMonth, CompanyMonthPayer, Transaction
+
+# Months of stored history a company's score is computed over
+COMPANY_WINDOW_MONTHS = int(os.getenv("COMPANY_WINDOW_MONTHS", "12"))
+
+MONTH_FIELDS = ("inflow", "outflow", "transactions", "returns", "gambling")
+
+def risk_level_for(score: int) -> str:
+    if score >= 80: return "Low Risk Profile"
+    if score >= 50: return "Moderate Risk"
+    return "High Risk"
+
+def top_payer_totals(payers: List[Dict[str, Any]], limit: int = 3) -> List[Tuple[str, float]]:
+    """
+    Sums per-month payer rows ({month, payer, inflow}) across months and
+    returns the largest `limit` as (payer, inflow), biggest first.
+    """
+    totals: Dict[str, float] = {}
+    for row in payers:
+        totals[row["payer"]] = totals.get(row["payer"], 0.0) + row["inflow"]
+    ranked = sorted((item for item in totals.items() if item[1] > 0), key=lambda item: (-item[1], item[0]))
+    return ranked[:limit]
+
+def score_months(months: List[Dict[str, Any]], top_payers: List[Tuple[str, float]]):
+    """
+    Score, risk level, graph data and insights from monthly aggregates
+    (oldest first) and the top payers by inflow. Works on one row per month,
+    so its cost does not depend on how many transactions the months hold.
+    Returns (monthly_summary, global_summary) like compute_financial_analysis.
+    """
+    inflows = [m["inflow"] for m in months]
+    total_inflow = sum(inflows)
+    total_outflow = sum(m["outflow"] for m in months)
+
+    graph_data = [
+        {
+            "month": datetime.strptime(m["month"], "%Y-%m").strftime("%b"),
+            "inflow": round(m["inflow"], 2),
+            "outflow": round(m["outflow"], 2)
+        }
+        for m in months
+    ]
+
+    # SCORING ALGORITHM
+    # 1. Cash Flow Health (40pts): Inflow > Outflow
+    score = 50 # Base
+    if total_inflow > total_outflow * 1.1: score += 20
+    elif total_inflow > total_outflow: score += 10
+    else: score -= 10
+
+    # 2. Stability (30pts): Variance of inflow
+    # Low variance = good
+    if len(months) > 1:
+        inflow_mean = total_inflow / len(months)
+        cv = statistics.stdev(inflows) / inflow_mean if inflow_mean > 0 else 1
+        if cv < 0.2: score += 20
+        elif cv < 0.5: score += 10
+    else:
+        score += 10 # Neutral if not enough data
+
+    # 3. Growth (30pts): Last month > First month
+    if len(months) >= 2:
+        first_m, last_m = inflows[0], inflows[-1]
+        if last_m > first_m * 1.1: score += 20
+        elif last_m > first_m: score += 10
+
+    score = max(0, min(100, score)) # Clamp
+
+    insights = []
+
+    # 4. CONCENTRATION RISK
+    payers = []
+    if total_inflow > 0 and top_payers:
+        top_1_name, top_1_amt = top_payers[0]
+        concentration_ratio = (top_1_amt / total_inflow) * 100
+        payers = [
+            {"name": name, "amount": round(amount, 2), "percentage": round((amount / total_inflow) * 100, 1)}
+            for name, amount in top_payers[:3]
+        ]
+
+        if concentration_ratio > 40:
+            score -= 15
+            insights.append({
+                "type": "warning",
+                "title": "High Customer Concentration",
+                "text": f"{(concentration_ratio):.1f}% of revenue comes from a single source: {top_1_name}."
+            })
+        elif concentration_ratio > 20:
+            insights.append({
+                "type": "neutral",
+                "title": "Moderate Concentration",
+                "text": f"Top customer contributes {(concentration_ratio):.1f}% of revenue."
+            })
+
+    # 5. RED FLAGS
+    red_flags = []
+    returns = sum(m["returns"] for m in months)
+    if returns:
+        score -= (returns * 5) # Heavy penalty
+        red_flags.append(f"Detected {returns} instances of Returned/Dishonoured transactions.")
+        insights.append({
+            "type": "negative",
+            "title": "Operational Red Flags",
+            "text": f"Found {returns} transactions indicating bounced cheques or reversals."
+        })
+
+    if any(m["gambling"] for m in months):
+        score -= 20
+        red_flags.append("transactions related to Gambling/Casinos detected.")
+        insights.append({
+            "type": "negative",
+            "title": "High Risk Spend",
+            "text": "Transactions related to gambling or high-risk activities detected."
+        })
+
+    # Growth Insight
+    if len(months) >= 2:
+        growth = ((inflows[-1] - inflows[0]) / inflows[0]) * 100 if inflows[0] > 0 else 0
+        if growth > 5:
+            insights.append({
+                "type": "positive",
+                "title": "Revenue Growth",
+                "text": f"Revenue grew by {int(growth)}% compares to the start of the period."
+            })
+        elif growth < -5:
+            insights.append({
+                "type": "negative",
+                "title": "Declining Revenue",
+                "text": f"Revenue dropped by {abs(int(growth))}% over the analysis period."
+            })
+
+    # Cash Flow Insight
+    ratio = total_outflow / total_inflow if total_inflow > 0 else 0
+    if ratio > 0.95:
+        insights.append({
+            "type": "warning",
+            "title": "High Burn Rate",
+            "text": "Outflow is nearly equal to or exceeds inflow. Monitoring required."
+        })
+    else:
+        insights.append({
+            "type": "positive",
+            "title": "Healthy Margins",
+            "text": "Business maintains a healthy surplus of cash flow."
+        })
+
+    score = max(0, min(100, score)) # Clamp
+
+    return {
+        "graph_data": graph_data,
+        "insights": insights,
+        "top_payers": payers,
+        "red_flags": red_flags
+    }, {
+        "total_inflow": round(total_inflow, 2),
+        "total_outflow": round(total_outflow, 2),
+        "score": int(score),
+        "risk_level": risk_level_for(score)
+    }
+
+# "= 1" rather than "IS 1", so SQLite can use the partial index on counted rows
+IS_COUNTED = Transaction.counted == true()
+
+def _no_outcome() -> Dict[str, Any]:
+    return {"matched_transactions": 0, "months_merged": [], "months_replaced": []}
+
+def fold_statement(kept: List[int], batch: List[int], span: Tuple[Any, Any], prints: List[Any], days: np.ndarray) -> Tuple[List[int], str, int]:
+    """
+    Folds one statement's rows in a month (`batch`) into the rows counted for
+    it so far (`kept`); both are positions into `prints` / `days`. If the
+    statement's period (`span`: first and last date) spans every counted row,
+    it replaces them, as a fuller or re-uploaded statement. Otherwise its rows
+    are added, less those matching a counted row on date, amounts and
+    description (each counted row matches once), so statements sent as they
+    arrive build the month up without counting anything twice.
+
+    Returns (counted rows, "added" | "replaced" | "merged", rows matched).
+    """
+    if not kept:
+        return list(batch), "added", 0
+    start, end = span
+    if start <= days[kept].min() and end >= days[kept].max():
+        return list(batch), "replaced", 0
+    available = Counter(prints[i] for i in kept)
+    added = []
+    for i in batch:
+        if available[prints[i]] > 0:
+            available[prints[i]] -= 1
+        else:
+            added.append(i)
+    return kept + added, "merged", len(batch) - len(added)
+
+def _record(outcome: Dict[str, Any], month: str, how: str, matched: int) -> None:
+    outcome["matched_transactions"] += matched
+    if how != "added":
+        outcome[f"months_{how}"].append(month)
+
+def _month_labels(df: pd.DataFrame) -> pd.Series:
+    """"YYYY-MM" per row, formatted once per distinct month rather than per row."""
+    months, codes = np.unique(df["dt"].to_numpy(dtype="datetime64[M]"), return_inverse=True)
+    return pd.Series(np.datetime_as_string(months, unit="M").astype(object)[codes], index=df.index, dtype=object)
+
+def _set_counted(db, ids: List[int], counted: bool) -> None:
+    if ids:
+        stmt = update(Transaction.__table__).where(Transaction.__table__.c.id == bindparam("row_id")).values(counted=counted)
+        db.execute(stmt, [{"row_id": i} for i in ids])
+
+def _write_months(db, company_id: int, months: Optional[List[str]], aggregates: Dict[str, Any], source: Dict[str, int]) -> int:
+    """
+    Replaces the stored months (all, or just `months`) with `aggregates`;
+    `source` gives the newest analysis contributing to each month.
+    """
+    month_filter = [CompanyMonth.company_id == company_id]
+    payer_filter = [CompanyMonthPayer.company_id == company_id]
+    if months is not None:
+        month_filter.append(CompanyMonth.month.in_(months))
+        payer_filter.append(CompanyMonthPayer.month.in_(months))
+    db.query(CompanyMonthPayer).filter(*payer_filter).delete(synchronize_session=False)
+    db.query(CompanyMonth).filter(*month_filter).delete(synchronize_session=False)
+    if not aggregates["months"]:
+        return 0
+    now = datetime.utcnow()
+    db.execute(insert(CompanyMonth), [
+        dict({field: m[field] for field in MONTH_FIELDS}, company_id=company_id, month=m["month"],
+             analysis_id=int(source[m["month"]]), updated_at=now)
+        for m in aggregates["months"]
+    ])
+    if aggregates["payers"]:
+        db.execute(insert(CompanyMonthPayer), [dict(p, company_id=company_id) for p in aggregates["payers"]])
+    return len(aggregates["months"])
+
+def _month_range(months: List[str]) -> List[Any]:
+    """Date bounds covering `months` ("YYYY-MM"), for the (company_id, date) indexes."""
+    year, month = map(int, max(months).split("-"))
+    return [Transaction.date >= datetime.strptime(min(months), "%Y-%m").date(),
+            Transaction.date <= date(year, month, calendar.monthrange(year, month)[1])]
+
+def _stored_rows(db, company_id: int, months: Optional[List[str]], *criteria) -> pd.DataFrame:
+    """The company's scorable transactions (all, or in `months`), with a parsed "dt" column."""
+    from app.services.ocr import scorable_rows
+
+    filters = [Transaction.company_id == company_id, Transaction.date.isnot(None), *criteria]
+    if months is not None:
+        filters += _month_range(months)
+    rows = db.query(
+        Transaction.id, Transaction.analysis_id, Transaction.date, Transaction.description, Transaction.inflow, Transaction.outflow
+    ).filter(*filters).all()
+    df = pd.DataFrame(rows, columns=["id", "analysis_id", "date", "description", "inflow", "outflow"])
+    df["dt"] = pd.to_datetime(df["date"])
+    df = scorable_rows(df)
+    if months is not None:
+        df = df[_month_labels(df).isin(months)]
+    return df.reset_index(drop=True)
+
+def _sources(counted: pd.DataFrame) -> Dict[str, int]:
+    return {month: int(analysis_id) for month, analysis_id in counted.groupby(_month_labels(counted))["analysis_id"].max().items()}
+
+def merge_company_months(db, company_id: int, analysis_id: int, rows: List[Dict[str, Any]],
+                         aggregates: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Folds a new analysis's transaction rows (before they are inserted) into
+    the company's stored months, in the caller's transaction, as
+    fold_statement does. Which months are new, replaced or merged is read
+    from the date span of their counted rows alone; only months that need
+    a row-level merge have their counted rows loaded. Sets each row's
+    "counted", un-counts stored rows it supersedes and rewrites the months,
+    taking the analysis's own monthly `aggregates` (from
+    compute_financial_analysis), when given, for months it alone supplies.
+
+    Returns how it merged: rows already counted for the company (left out of
+    its months), and the months it was merged into or replaced.
+    """
+    from app.services.dedupe import stored_fingerprints
+    from app.services.ocr import scorable_rows, monthly_aggregates
+
+    outcome = _no_outcome()
+    for row in rows:
+        row["counted"] = False
+    if db.query(Transaction.id).filter(Transaction.company_id == company_id, Transaction.counted.is_(None)).first():
+        rebuild_company_months(db, company_id) # Rows saved before folding existed
+
+    new = pd.DataFrame({
+        "analysis_id": analysis_id,
+        "date": [row["date"] for row in rows],
+        "description": [row["description"] for row in rows],
+        "inflow": [row["inflow"] for row in rows],
+        "outflow": [row["outflow"] for row in rows],
+        "position": range(len(rows))
+    })
+    new["dt"] = pd.to_datetime(new["date"])
+    new = scorable_rows(new)
+    if new.empty:
+        return outcome
+    new_months = _month_labels(new)
+    months = sorted(new_months.unique().tolist())
+    days = new["dt"].to_numpy(dtype="datetime64[D]")
+    span = (days.min(), days.max())
+
+    month = func.strftime('%Y-%m', Transaction.date)
+    counted_spans = {
+        m: (np.datetime64(first, "D"), np.datetime64(last, "D"))
+        for m, first, last in db.query(month, func.min(Transaction.date), func.max(Transaction.date))
+        .filter(Transaction.company_id == company_id, IS_COUNTED, *_month_range(months)).group_by(month)
+    }
+    merged = []
+    for m in months:
+        if m in counted_spans:
+            first, last = counted_spans[m]
+            if span[0] <= first and span[1] >= last:
+                outcome["months_replaced"].append(m)
+            else:
+                merged.append(m)
+
+    # A replaced month un-counts everything it had
+    for m in outcome["months_replaced"]:
+        db.query(Transaction).filter(Transaction.company_id == company_id, IS_COUNTED, *_month_range([m])).update(
+            {Transaction.counted: False}, synchronize_session=False)
+
+    counted = new[~new_months.isin(merged)]
+    sources = {m: analysis_id for m in months}
+    recount = {"months": [], "payers": []}
+    if merged:
+        stored = _stored_rows(db, company_id, merged, IS_COUNTED)
+        df = pd.concat([stored, new[new_months.isin(merged)]], ignore_index=True)
+        prints = stored_fingerprints(df)
+        df_days = df["dt"].to_numpy(dtype="datetime64[D]")
+        is_new = df["position"].notna().to_numpy()
+        keep = np.zeros(len(df), dtype=bool)
+        for m, positions in df.groupby(_month_labels(df)).indices.items():
+            kept, how, matched = fold_statement(positions[~is_new[positions]].tolist(), positions[is_new[positions]].tolist(), span, prints, df_days)
+            keep[kept] = True
+            _record(outcome, m, how, matched)
+        counted = pd.concat([counted, df[is_new & keep]])
+        recount = monthly_aggregates(df[keep])
+        sources.update(_sources(df[keep]))
+
+    for position in counted["position"].tolist():
+        rows[int(position)]["counted"] = True
+    if aggregates is None:
+        aggregates = monthly_aggregates(counted[~_month_labels(counted).isin(merged)])
+    aggregates = {
+        key: sorted([item for item in aggregates[key] if item["month"] in sources and item["month"] not in merged] + recount[key],
+                    key=lambda item: item["month"])
+        for key in ("months", "payers")
+    }
+    _write_months(db, company_id, months, aggregates, sources)
+    return outcome
+
+def rebuild_company_months(db, company_id: int, months: Optional[List[str]] = None) -> int:
+    """
+    Recomputes a company's stored months (all of them, or just `months`)
+    from every stored row, folding its analyses in the order they were saved,
+    exactly as merging them one by one did, and resets the rows' "counted".
+    Used when analyses are deleted or companies merged, and to backfill.
+    The caller commits. Returns the months written.
+    """
+    from app.services.dedupe import stored_fingerprints
+    from app.services.ocr import monthly_aggregates
+
+    if months is not None and not months:
+        return 0
+    df = _stored_rows(db, company_id, months)
+    if months is None:
+        # Rows with no usable date never count
+        db.query(Transaction).filter(Transaction.company_id == company_id).update({Transaction.counted: False}, synchronize_session=False)
+    if df.empty:
+        return _write_months(db, company_id, months, {"months": [], "payers": []}, {})
+
+    # Statement periods over all of each analysis's rows, not just these
+    # months (the same date bounds as scorable_rows)
+    ids = df["analysis_id"].unique().tolist()
+    spans = {
+        analysis_id: (np.datetime64(start, "D"), np.datetime64(end, "D"))
+        for analysis_id, start, end in db.query(Transaction.analysis_id, func.min(Transaction.date), func.max(Transaction.date)).filter(
+            Transaction.analysis_id.in_(ids), Transaction.date >= date(2001, 1, 1), Transaction.date < date(datetime.now().year + 2, 1, 1)
+        ).group_by(Transaction.analysis_id)
+    }
+    prints = stored_fingerprints(df)
+    days = df["dt"].to_numpy(dtype="datetime64[D]")
+    analysis_ids = df["analysis_id"].to_numpy()
+    counted = np.zeros(len(df), dtype=bool)
+    for positions in df.groupby(_month_labels(df)).indices.values():
+        kept: List[int] = []
+        for analysis_id in np.unique(analysis_ids[positions]).tolist():
+            batch = positions[analysis_ids[positions] == analysis_id].tolist()
+            kept, _, _ = fold_statement(kept, batch, spans[analysis_id], prints, days)
+        counted[kept] = True
+
+    _set_counted(db, [int(i) for i in df.loc[counted, "id"]], True)
+    _set_counted(db, [int(i) for i in df.loc[~counted, "id"]], False)
+    return _write_months(db, company_id, months, monthly_aggregates(df[counted]), _sources(df[counted]))
+
+def company_analysis(db, company_id: int, window: int = COMPANY_WINDOW_MONTHS) -> Optional[Dict[str, Any]]:
+    """
+    Company-level score over its latest `window` stored months, recomputed
+    from the aggregates alone: one small read per table, however many
+    statements were uploaded to build them. None if nothing is stored yet.
+    """
+    rows = (db.query(CompanyMonth)
+            .filter(CompanyMonth.company_id == company_id)
+            .order_by(CompanyMonth.month.desc())
+            .limit(max(1, window))
+            .all())
+    if not rows:
+        return None
+    months = [dict({field: getattr(r, field) for field in MONTH_FIELDS}, month=r.month, analysis_id=r.analysis_id) for r in reversed(rows)]
+
+    total = func.sum(CompanyMonthPayer.inflow)
+    top_payers = (db.query(CompanyMonthPayer.payer, total)
+                  .filter(CompanyMonthPayer.company_id == company_id, CompanyMonthPayer.month >= months[0]["month"])
+                  .group_by(CompanyMonthPayer.payer)
+                  .having(total > 0)
+                  .order_by(total.desc(), CompanyMonthPayer.payer)
+                  .limit(3)
+                  .all())
+
+    monthly_summary, summary = score_months(months, [(payer, amount) for payer, amount in top_payers])
+    return {
+        "company_id": company_id,
+        "period": {"start": months[0]["month"], "end": months[-1]["month"], "months": len(months)},
+        "summary": summary,
+        "months": [dict(m, inflow=round(m["inflow"], 2), outflow=round(m["outflow"], 2)) for m in months],
+        **monthly_summary
+    }
@@ -0,0 +1,118 @@
+import numpy as np
+from typing import Any, Dict, List, Optional
+
+# Per-row confidence in the extracted amounts
+CONFIDENCE_VERIFIED = 1.0   # the stated balances around the row agree with its amount
+CONFIDENCE_UNVERIFIED = 0.8 # no stated balance on either side to check against
+CONFIDENCE_BREAK = 0.3      # the balance chain breaks at this row
+
+# Balances are compared in whole cents, so rounding never reads as a break
+TOLERANCE_CENTS = 1
+MAX_REPORTED_BREAKS = 20
+
+def _cents(values: List[Any]) -> np.ndarray:
+    return np.rint(np.array(values, dtype=float) * 100)
+
+def check_continuity(inflow: np.ndarray, outflow: np.ndarray, balance: np.ndarray) -> Dict[str, Any]:
+    """
+    Vectorized running-balance check over cent arrays (balance NaN where the
+    statement shows none). Each stated balance is predicted from the previous
+    stated one plus the net amounts in between (prefix sums), in both row
+    orders: oldest first, and newest first as some banks print. The order
+    with fewer breaks wins.
+
+    Returns the per-row confidence, the number of links checked, the rows
+    where the chain breaks, their expected balances, and the order used.
+    """
+    n = len(balance)
+    confidence = np.full(n, CONFIDENCE_UNVERIFIED)
+    stated_mask = ~np.isnan(balance)
+    anchors = np.flatnonzero(stated_mask)
+    if len(anchors) < 2:
+        return {"confidence": confidence, "checked": 0, "break_rows": np.array([], dtype=int), "expected": np.array([]), "order": None}
+
+    delta = inflow - outflow
+    cum = np.cumsum(delta)
+    prev, cur = anchors[:-1], anchors[1:]
+    stated_prev, stated = balance[prev], balance[cur]
+
+    # Oldest first: balance[cur] = balance[prev] + delta[prev+1 .. cur]
+    forward = stated_prev + (cum[cur] - cum[prev])
+    # Newest first: balance[prev] = balance[cur] + delta[prev .. cur-1]
+    backward = stated_prev - (cum[cur] - delta[cur] - cum[prev] + delta[prev])
+
+    forward_bad = np.abs(forward - stated) > TOLERANCE_CENTS
+    backward_bad = np.abs(backward - stated) > TOLERANCE_CENTS
+    newest_first = backward_bad.sum() < forward_bad.sum()
+    bad, expected = (backward_bad, backward) if newest_first else (forward_bad, forward)
+
+    # Rows whose amounts each link sums over: (prev, cur] oldest first, [prev, cur)
+    # newest first. A running count of stated balances gives every row its link.
+    rows = np.arange(n)
+    up_to = np.cumsum(stated_mask)
+    if newest_first:
+        link = up_to - 1
+        covered = (rows >= anchors[0]) & (rows < anchors[-1])
+    else:
+        link = up_to - stated_mask - 1
+        covered = (rows > anchors[0]) & (rows <= anchors[-1])
+    link = np.clip(link, 0, len(cur) - 1)
+    confidence[covered] = np.where(bad[link[covered]], CONFIDENCE_BREAK, CONFIDENCE_VERIFIED)
+
+    return {
+        "confidence": confidence,
+        "checked": len(cur),
+        "break_rows": cur[bad],
+        "expected": expected[bad],
+        "order": "newest_first" if newest_first else "oldest_first"
+    }
+
+def verify_balances(transactions: List[Dict[str, Any]], filename: str) -> Optional[Dict[str, Any]]:
+    """
+    Checks one statement's running balance and sets each transaction's
+    "confidence". Returns a report, with a warning sentence when the chain
+    breaks (an OCR misread or an edited row), or None if the statement has
+    no balance column.
+    """
+    if not transactions:
+        return None
+    balances = [t.get('balance') for t in transactions]
+    if all(b is None for b in balances):
+        for t in transactions:
+            t['confidence'] = CONFIDENCE_UNVERIFIED
+        return None
+
+    result = check_continuity(
+        _cents([t.get('inflow', 0.0) for t in transactions]),
+        _cents([t.get('outflow', 0.0) for t in transactions]),
+        _cents([np.nan if b is None else b for b in balances])
+    )
+    for t, c in zip(transactions, result["confidence"].tolist()):
+        t['confidence'] = c
+
+    break_rows = result["break_rows"].tolist()
+    report = {
+        "filename": filename,
+        "checked": result["checked"],
+        "breaks": len(break_rows),
+        "order": result["order"],
+        "rows": [
+            {
+                "row": i,
+                "date": transactions[i].get('date'),
+                "description": transactions[i].get('description'),
+                "stated": balances[i],
+                "expected": round(expected / 100, 2)
+            }
+            for i, expected in zip(break_rows[:MAX_REPORTED_BREAKS], result["expected"].tolist())
+        ],
+        "warning": None
+    }
+    if break_rows:
+        first = report["rows"][0]
+        report["warning"] = (
+            f"Running balance does not add up at {len(break_rows)} row(s) in {filename} "
+            f"(first on {first['date']}: stated {first['stated']:,.2f}, expected {first['expected']:,.2f}). "
+            f"Possible OCR misread or edited transactions."
+        )
+    return report
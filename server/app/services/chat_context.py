@@ -0,0 +1,125 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Optional
+from app.database import Analysis
+from app.services.payload import load_payload
+from app.services.retrieval import build_search_index
+from app.services.intents import load_facts
+
+CONTEXT_CACHE_SIZE = int(os.getenv("CHAT_CONTEXT_CACHE_SIZE", "32"))
+ANSWER_CACHE_SIZE = int(os.getenv("CHAT_ANSWER_CACHE_SIZE", "1024"))
+
+# Structured fields sent with every prompt; small compared with the statement text
+SUMMARY_KEYS = ["entity_name", "summary", "graph_data", "top_payers", "red_flags", "fraud_warnings"]
+
+_SPACE_RE = re.compile(r'\s+')
+
+class LRUCache:
+    """
+    Bounded, thread-safe least-recently-used mapping with hit/miss counters.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def discard_where(self, predicate) -> None:
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+@dataclass
+class ChatContext:
+    analysis_id: int
+    version: str # Changes whenever the stored analysis is replaced
+    summary: Dict[str, Any]
+    index: Dict[str, Any]
+    facts: Dict[str, Any] # Exact figures for the local answer engine
+
+context_cache = LRUCache(CONTEXT_CACHE_SIZE) # analysis id -> ChatContext
+answer_cache = LRUCache(ANSWER_CACHE_SIZE)   # (analysis id, version, question) -> answer
+
+def load_context(db, analysis_id: Optional[int] = None) -> Optional[ChatContext]:
+    """
+    Parsed chat context for an analysis (the newest one when no id is given).
+    Only the (id, created_at) row is read per call; the payload is decoded
+    once and then served from the LRU cache until the analysis changes.
+    Analyses stored before the search index existed get one built from
+    their raw markdown.
+    """
+    query = db.query(Analysis.id, Analysis.created_at)
+    if analysis_id is None:
+        row = query.order_by(Analysis.created_at.desc()).first()
+    else:
+        row = query.filter(Analysis.id == analysis_id).first()
+    if not row:
+        return None
+
+    version = row.created_at.isoformat()
+    cached = context_cache.get(row.id)
+    if cached and cached.version == version:
+        return cached
+
+    analysis = db.query(Analysis).filter(Analysis.id == row.id).first()
+    data = load_payload(db, analysis, ["summary", "graph", "search"])
+    index = data.get("search_index")
+    if not index:
+        markdown = load_payload(db, analysis, ["raw_markdown"]).get("raw_markdown", "")
+        index = build_search_index([("statement", 1, markdown)])
+
+    context = ChatContext(
+        analysis_id=row.id,
+        version=version,
+        summary={key: data[key] for key in SUMMARY_KEYS if key in data},
+        index=index,
+        facts=load_facts(db, row.id)
+    )
+    context_cache.put(row.id, context)
+    return context
+
+def answer_key(context: ChatContext, question: str):
+    """
+    Questions differing only in case, spacing or trailing punctuation share an answer.
+    """
+    normalised = _SPACE_RE.sub(' ', question.strip().lower()).rstrip('?!. ')
+    return (context.analysis_id, context.version, normalised)
+
+def invalidate_analysis(analysis_id: int) -> None:
+    """
+    Drops the cached context and answers of an analysis, e.g. after deletion.
+    """
+    context_cache.discard_where(lambda key: key == analysis_id)
+    answer_cache.discard_where(lambda key: key[0] == analysis_id)
@@ -0,0 +1,55 @@
+import threading
+from typing import Dict, Any, Optional
+
+class ChatMetrics:
+    """
+    Running totals for chat requests: how much context the prompts carry
+    compared with the full statement text, where the time goes, and how
+    many questions the local answer engine handled without the LLM.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.prompt_chars = 0
+        self.source_chars = 0
+        self.retrieval_ms = 0.0
+        self.llm_ms = 0.0
+        self.questions = 0
+        self.local_answers: Dict[str, int] = {} # intent -> questions answered without the LLM
+
+    def record(self, prompt_chars: int, source_chars: int, retrieval_ms: float, llm_ms: float) -> None:
+        with self._lock:
+            self.requests += 1
+            self.prompt_chars += prompt_chars
+            self.source_chars += source_chars
+            self.retrieval_ms += retrieval_ms
+            self.llm_ms += llm_ms
+
+    def record_question(self, intent: Optional[str]) -> None:
+        """Counts a question and, if the local engine answered it, its intent."""
+        with self._lock:
+            self.questions += 1
+            if intent:
+                self.local_answers[intent] = self.local_answers.get(intent, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n = self.requests or 1
+            return {
+                "requests": self.requests,
+                "avg_prompt_chars": round(self.prompt_chars / n),
+                "avg_source_chars": round(self.source_chars / n),
+                # Share of the statement text that no longer goes into prompts
+                "prompt_reduction": round(1 - self.prompt_chars / self.source_chars, 3) if self.source_chars else 0.0,
+                "avg_retrieval_ms": round(self.retrieval_ms / n, 1),
+                "avg_llm_ms": round(self.llm_ms / n, 1),
+                "local_answers": {
+                    "questions": self.questions,
+                    "hits": sum(self.local_answers.values()),
+                    "hit_rate": round(sum(self.local_answers.values()) / self.questions, 3) if self.questions else 0.0,
+                    "by_intent": dict(self.local_answers)
+                }
+            }
+
+chat_metrics = ChatMetrics()
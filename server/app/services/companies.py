@@ -0,0 +1,100 @@
+import re
+from datetime import datetime
+from typing import Any, Dict, List
+from sqlalchemy import func, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.database import Company, Analysis, AnalysisCount, Transaction
+from app.services.aggregates import rebuild_company_months
+
+_NON_ALNUM_RE = re.compile(r'[^A-Z0-9]+')
+
+# Spellings of the same legal form fold onto one token; different forms
+# (private "Sdn Bhd" vs public "Bhd") stay different companies
+SUFFIX_ALIASES = [
+    (re.compile(r'\b(?:SENDIRIAN|SDN) (?:BERHAD|BHD)\b'), 'SDN BHD'),
+    (re.compile(r'\bBERHAD\b'), 'BHD'),
+]
+
+# "Maybank (M) Berhad" is "Maybank (Malaysia) Berhad". Only the bracketed
+# form right before the suffix counts: a bare M is part of the name
+# ("M & M Trading", "Syarikat M Sdn Bhd").
+COUNTRY_ALIAS_RE = re.compile(r'\(\s*(?:M|MSIA)\s*\)\s*(?=(?:SDN|SENDIRIAN|BHD|BERHAD)\b)')
+
+UNKNOWN_KEY = "UNKNOWN"
+
+def company_key(name: str) -> str:
+    """
+    Identity used to match companies across statements: upper case, '&' as
+    AND, punctuation and extra spacing removed, legal suffixes spelled one way.
+    "MegaMart Sdn. Bhd." and "MEGAMART SENDIRIAN BERHAD" give "MEGAMART SDN BHD".
+    """
+    key = COUNTRY_ALIAS_RE.sub(' MALAYSIA ', (name or "").upper())
+    key = _NON_ALNUM_RE.sub(' ', key.replace('&', ' AND ')).strip()
+    for pattern, replacement in SUFFIX_ALIASES:
+        key = pattern.sub(replacement, key)
+    return key or UNKNOWN_KEY
+
+def upsert_company(db, name: str) -> int:
+    """
+    Returns the id of the company matching `name`, inserting it if needed, in
+    one INSERT .. ON CONFLICT statement. Concurrent saves of the same company
+    cannot create duplicates. The caller commits.
+    """
+    stmt = sqlite_insert(Company).values(
+        name=name, key=company_key(name), ssm_number="Unknown", created_at=datetime.utcnow() # Populate SSM if we extract it later
+    )
+    # A no-op update (rather than DO NOTHING) makes RETURNING yield the existing row
+    stmt = stmt.on_conflict_do_update(index_elements=[Company.key], set_={"key": stmt.excluded.key})
+    return db.execute(stmt.returning(Company.id)).scalar_one()
+
+def merge_duplicate_companies(db, dry_run: bool = False) -> List[Dict[str, Any]]:
+    """
+    Recomputes every company key from its name and folds companies sharing a
+    key into the oldest one: analyses and transactions are re-pointed, history
+    counters and monthly aggregates rebuilt and the duplicates deleted. Returns one entry per merged
+    group. The caller commits.
+    """
+    groups: Dict[str, List[Any]] = {}
+    companies = db.query(Company.id, Company.name).order_by(Company.id).all()
+    for row in companies:
+        groups.setdefault(company_key(row.name), []).append(row)
+
+    merges = []
+    for key, rows in groups.items():
+        if len(rows) < 2:
+            continue
+        keep, duplicates = rows[0], [r.id for r in rows[1:]]
+        group_ids = [keep.id] + duplicates
+        analyses = db.query(func.count(Analysis.id)).filter(Analysis.company_id.in_(duplicates)).scalar()
+        merges.append({
+            "key": key,
+            "kept": {"id": keep.id, "name": keep.name},
+            "merged": [{"id": r.id, "name": r.name} for r in rows[1:]],
+            "analyses_moved": analyses
+        })
+        if dry_run:
+            continue
+
+        db.query(Analysis).filter(Analysis.company_id.in_(duplicates)).update({Analysis.company_id: keep.id}, synchronize_session=False)
+        db.query(Transaction).filter(Transaction.company_id.in_(duplicates)).update({Transaction.company_id: keep.id}, synchronize_session=False)
+        db.query(AnalysisCount).filter(AnalysisCount.company_id.in_(group_ids)).delete(synchronize_session=False)
+        db.execute(text(
+            "INSERT INTO analysis_counts (company_id, risk_level, count) "
+            "SELECT company_id, risk_level, COUNT(*) FROM analyses "
+            "WHERE company_id = :company_id AND risk_level IS NOT NULL "
+            "GROUP BY risk_level"
+        ), {"company_id": keep.id})
+        for company_id in group_ids:
+            rebuild_company_months(db, company_id)
+        db.query(Company).filter(Company.id.in_(duplicates)).delete(synchronize_session=False)
+
+    if not dry_run:
+        # Clear changed keys first so the unique index never sees a transient clash
+        survivors = {rows[0].id: key for key, rows in groups.items()}
+        stale = [company_id for company_id, stored in db.query(Company.id, Company.key)
+                 if stored != survivors[company_id]]
+        if stale:
+            db.query(Company).filter(Company.id.in_(stale)).update({Company.key: None}, synchronize_session=False)
+            for company_id in stale:
+                db.query(Company).filter(Company.id == company_id).update({Company.key: survivors[company_id]}, synchronize_session=False)
+    return merges
@@ -0,0 +1,135 @@
+import re
+import threading
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Tried in order; day-first layouts come before month-first ones, matching
+# the dayfirst=True behaviour the analytics always assumed
+CANDIDATE_FORMATS = [
+    '%d/%m/%y', '%d/%m/%Y', '%d-%m-%y', '%d-%m-%Y', '%d.%m.%y', '%d.%m.%Y',
+    '%d %b %Y', '%d %b %y', '%d-%b-%Y', '%d-%b-%y', '%d %B %Y',
+    '%Y-%m-%d', '%Y/%m/%d',
+    '%m/%d/%y', '%m/%d/%Y',
+]
+
+# A format must parse at least this share of the sample to be adopted
+MIN_SAMPLE_MATCH = 0.8
+SAMPLE_SIZE = 50
+
+_DIGIT_RE = re.compile(r'\d')
+_ALPHA_RE = re.compile(r'[A-Za-z]')
+
+# Layout signature -> inferred format. A numeric day/month layout is only
+# cached once a statement settles its order (a day above 12), so one
+# month-first upload never decides how later day-first ones are read.
+_format_cache: Dict[str, str] = {}
+_cache_lock = threading.Lock()
+
+def layout_signature(value: str) -> str:
+    """
+    Shape of a date string, e.g. '05/02/24' -> '00/00/00', '5 Feb 2024' -> '0 aaa 0000'.
+    Statements from the same layout share a signature.
+    """
+    return _ALPHA_RE.sub('a', _DIGIT_RE.sub('0', value.strip()))
+
+def infer_date_format(sample: List[str]) -> Optional[str]:
+    """
+    Picks the first candidate format that parses the most of the sample
+    (and at least MIN_SAMPLE_MATCH of it). Returns None if none qualifies.
+    """
+    sample = [s.strip() for s in sample if s and s.strip()][:SAMPLE_SIZE]
+    if not sample:
+        return None
+
+    best_format, best_hits = None, 0
+    for fmt in CANDIDATE_FORMATS:
+        hits = 0
+        for value in sample:
+            try:
+                datetime.strptime(value, fmt)
+                hits += 1
+            except ValueError:
+                pass
+        if hits > best_hits:
+            best_format, best_hits = fmt, hits
+        if hits == len(sample):
+            break
+
+    if best_hits / len(sample) < MIN_SAMPLE_MATCH:
+        return None
+    return best_format
+
+def swap_day_month(fmt: str) -> Optional[str]:
+    """
+    The same layout with numeric day and month swapped ('%d/%m/%Y' ->
+    '%m/%d/%Y'), or None when the order cannot be confused: month names,
+    or year-first layouts, which are never year-day-month in practice.
+    """
+    if fmt.startswith('%d') and '%m' in fmt:
+        return fmt.replace('%d', '%_').replace('%m', '%d').replace('%_', '%m')
+    if fmt.startswith('%m') and '%d' in fmt:
+        return fmt.replace('%m', '%_').replace('%d', '%m').replace('%_', '%d')
+    return None
+
+def _parsed_count(values: List[str], fmt: str) -> int:
+    return int(pd.to_datetime(pd.Series(values, dtype=object), format=fmt, errors='coerce').notna().sum())
+
+def format_for_layout(signature: str, values: List[str]) -> Optional[str]:
+    """
+    Format for one layout group, cached per signature. Only successful
+    inferences are cached, so an unlucky sample never pins a layout to the
+    slow path. For numeric day/month layouts the group's own values decide
+    the order: whichever of the two orders reads more of them wins, and if
+    both read all of them (no day above 12) the group returns None and is
+    parsed day-first, as before formats were inferred.
+    """
+    with _cache_lock:
+        fmt = _format_cache.get(signature)
+    fmt = fmt or infer_date_format(values)
+    if not fmt:
+        return None
+
+    swapped = swap_day_month(fmt)
+    if swapped:
+        hits, swapped_hits = _parsed_count(values, fmt), _parsed_count(values, swapped)
+        if hits == swapped_hits:
+            return None # These dates alone cannot tell day from month
+        if swapped_hits > hits:
+            fmt = swapped
+
+    with _cache_lock:
+        _format_cache[signature] = fmt
+    return fmt
+
+def parse_dates(dates: pd.Series) -> pd.Series:
+    """
+    Parses a column of statement dates in vectorized calls. Distinct values are
+    grouped by layout signature; each group is parsed with its cached (or
+    freshly inferred) explicit format, and only values that format cannot
+    read fall back to generic day-first parsing.
+    """
+    codes, uniques = pd.factorize(dates)
+    if len(uniques) == 0:
+        return pd.Series(pd.NaT, index=dates.index, dtype='datetime64[ns]')
+
+    unique_values = pd.Series([str(u).strip() for u in uniques], dtype=object)
+    signatures = unique_values.map(layout_signature)
+    parsed = pd.Series(pd.NaT, index=unique_values.index, dtype='datetime64[ns]')
+
+    for signature, group in unique_values.groupby(signatures):
+        fmt = format_for_layout(signature, group.tolist())
+        if fmt:
+            values = pd.to_datetime(group, format=fmt, errors='coerce')
+            # Stragglers the format cannot read get the generic parser
+            failed = values.isna()
+            if failed.any():
+                values[failed] = pd.to_datetime(group[failed], dayfirst=True, errors='coerce', format='mixed')
+        else:
+            values = pd.to_datetime(group, dayfirst=True, errors='coerce', format='mixed')
+        parsed[group.index] = values
+
+    # Missing values have code -1, which indexes the trailing NaT
+    values = np.append(parsed.to_numpy(), np.datetime64('NaT'))
+    return pd.Series(values[codes], index=dates.index)
@@ -0,0 +1,131 @@
+import re
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+import numpy as np
+import pandas as pd
+from app.services.dates import parse_dates
+from app.services.keywords import map_unique
+from app.services.spool import SpooledFile
+
+_NON_ALNUM_RE = re.compile(r'[^A-Z0-9]+')
+
+# (day number or raw date, inflow cents, outflow cents, description, balance cents)
+Fingerprint = Tuple
+
+# Stands in for a missing or unreadable amount (e.g. no balance column)
+NO_AMOUNT = -(2 ** 62)
+
+def normalise_description(description: Any) -> str:
+    """Upper case, punctuation and spacing collapsed. Unlike payer grouping, digits (references) are kept."""
+    return _NON_ALNUM_RE.sub(' ', str(description or '').upper()).strip()
+
+def _cents_column(values: List[Any]) -> List[int]:
+    """Amounts as integer cents in one vectorized pass; NO_AMOUNT where unreadable."""
+    numbers = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype=float)
+    return np.where(np.isnan(numbers), NO_AMOUNT, np.rint(numbers * 100)).astype('int64').tolist()
+
+def unique_files(files: List[SpooledFile]) -> Tuple[List[SpooledFile], List[Dict[str, str]]]:
+    """
+    Drops files whose bytes (sha256) repeat an earlier file in the same
+    request, before any OCR is spent on them. Returns (kept, duplicates).
+    """
+    first: Dict[str, str] = {}
+    kept, duplicates = [], []
+    for f in files:
+        if f.sha256 in first:
+            duplicates.append({"filename": f.filename, "duplicate_of": first[f.sha256]})
+        else:
+            first[f.sha256] = f.filename
+            kept.append(f)
+    return kept, duplicates
+
+def fingerprint_transactions(transactions: List[Dict[str, Any]]) -> Tuple[List[Fingerprint], pd.Series]:
+    """
+    One fingerprint per transaction plus the parsed dates. Dates are parsed
+    in one vectorized call and descriptions normalised once per distinct
+    value; the running balance is included when the extraction found one.
+    """
+    if not transactions:
+        return [], pd.Series([], dtype='datetime64[ns]')
+    dt = parse_dates(pd.Series([t.get('date') for t in transactions], dtype=object))
+    # Days since the epoch rather than formatted strings; unreadable dates fall back to the raw text
+    days = dt.to_numpy(dtype='datetime64[D]').astype('int64').tolist()
+    valid = dt.notna().tolist()
+    descriptions = map_unique(pd.Series([t.get('description') for t in transactions], dtype=object), normalise_description)
+    inflows, outflows, balances = (_cents_column([t.get(key) for t in transactions]) for key in ('inflow', 'outflow', 'balance'))
+    prints = [
+        (day if ok else str(t.get('date')).strip(), inflow, outflow, desc, balance)
+        for day, ok, desc, inflow, outflow, balance, t in zip(days, valid, descriptions.tolist(), inflows, outflows, balances, transactions)
+    ]
+    return prints, dt
+
+def dedupe_transactions(file_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Removes transactions repeated across the request's statements (e.g. a
+    monthly statement uploaded with the quarterly one covering it), in place
+    on each file result's "transactions", in linear time.
+
+    A fingerprint is kept as many times as it occurs in the single statement
+    that has it most often, so genuinely repeated transactions within one
+    statement survive; copies beyond that, in later files, are dropped.
+    Also reports statement periods that overlap. Returns the report.
+    """
+    report = {"removed_transactions": 0, "removed_by_file": {}, "overlapping_periods": []}
+    if sum(1 for r in file_results if r["transactions"]) < 2:
+        return report # A single statement cannot overlap another
+    sizes = [len(r["transactions"]) for r in file_results]
+    everything = [t for r in file_results for t in r["transactions"]]
+    prints, dt = fingerprint_transactions(everything)
+
+    allowed: Counter = Counter()
+    per_file: List[List[Fingerprint]] = []
+    periods = []
+    offset = 0
+    for r, size in zip(file_results, sizes):
+        file_prints = prints[offset:offset + size]
+        file_dt = dt.iloc[offset:offset + size].dropna()
+        offset += size
+        per_file.append(file_prints)
+        for fp, n in Counter(file_prints).items():
+            if n > allowed[fp]:
+                allowed[fp] = n
+        if not file_dt.empty:
+            periods.append((file_dt.min(), file_dt.max(), r["filename"]))
+
+    used: Counter = Counter()
+    removed_by_file: Dict[str, int] = {}
+    for r, file_prints in zip(file_results, per_file):
+        kept = []
+        for t, fp in zip(r["transactions"], file_prints):
+            if used[fp] < allowed[fp]:
+                used[fp] += 1
+                kept.append(t)
+        if len(kept) < len(r["transactions"]):
+            removed_by_file[r["filename"]] = len(r["transactions"]) - len(kept)
+            r["transactions"] = kept
+
+    # Pairwise within the request; a request holds a handful of statements
+    periods.sort()
+    overlaps = []
+    for i, (start, end, name) in enumerate(periods):
+        for other_start, other_end, other in periods[i + 1:]:
+            if other_start > end:
+                break
+            overlaps.append({
+                "files": [name, other],
+                "start": other_start.date().isoformat(),
+                "end": min(end, other_end).date().isoformat()
+            })
+
+    report.update(removed_transactions=sum(removed_by_file.values()), removed_by_file=removed_by_file, overlapping_periods=overlaps)
+    return report
+
+def stored_fingerprints(df: pd.DataFrame) -> List[Fingerprint]:
+    """
+    Fingerprints of transactions-table rows (parsed "dt", amounts and
+    description). The balance is not stored, so it stands in as NO_AMOUNT.
+    """
+    days = df["dt"].to_numpy(dtype='datetime64[D]').astype('int64').tolist()
+    descriptions = map_unique(df["description"], normalise_description).tolist()
+    inflows, outflows = _cents_column(df["inflow"].tolist()), _cents_column(df["outflow"].tolist())
+    return [(day, inflow, outflow, desc, NO_AMOUNT) for day, inflow, outflow, desc in zip(days, inflows, outflows, descriptions)]
@@ -0,0 +1,58 @@
+import os
+import time
+import threading
+from typing import Dict, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from app.database import AnalysisCount
+
+# How long a COUNT(*) for score/date filters is reused before re-running it
+COUNT_CACHE_TTL = float(os.getenv("HISTORY_COUNT_TTL_SECONDS", "30"))
+COUNT_CACHE_MAX_KEYS = 256
+
+_count_cache: Dict[Tuple, Tuple[float, int]] = {}
+_cache_lock = threading.Lock()
+count_cache_stats = {"hits": 0, "misses": 0}
+
+def adjust_count(db, company_id: int, risk_level: str, delta: int) -> None:
+    """
+    Adds `delta` to the (company, risk level) counter as part of the caller's
+    transaction, so the counter commits or rolls back with the analysis row.
+    """
+    stmt = insert(AnalysisCount).values(company_id=company_id, risk_level=risk_level, count=delta)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["company_id", "risk_level"],
+        set_={"count": AnalysisCount.count + delta}
+    ))
+
+def counter_total(db, company_id: Optional[int] = None, risk_level: Optional[str] = None) -> int:
+    """
+    Total analyses for company/risk filters, summed from the counter table
+    (one row per company and risk level) instead of counting analyses.
+    """
+    query = db.query(func.coalesce(func.sum(AnalysisCount.count), 0))
+    if company_id is not None:
+        query = query.filter(AnalysisCount.company_id == company_id)
+    if risk_level is not None:
+        query = query.filter(AnalysisCount.risk_level == risk_level)
+    return int(query.scalar())
+
+def cached_count(key: Tuple, count_query) -> int:
+    """
+    Runs `count_query` at most once per COUNT_CACHE_TTL for the same filter key.
+    Used for score and date filters, which the counters cannot answer.
+    """
+    now = time.monotonic()
+    with _cache_lock:
+        hit = _count_cache.get(key)
+        fresh = bool(hit) and now - hit[0] < COUNT_CACHE_TTL
+        count_cache_stats["hits" if fresh else "misses"] += 1
+    if fresh:
+        return hit[1]
+    total = count_query.scalar()
+    with _cache_lock:
+        if len(_count_cache) >= COUNT_CACHE_MAX_KEYS:
+            for stale in [k for k, (at, _) in _count_cache.items() if now - at >= COUNT_CACHE_TTL]:
+                del _count_cache[stale]
+        _count_cache[key] = (now, total)
+    return total
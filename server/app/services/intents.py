@@ -0,0 +1,244 @@
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+from sqlalchemy import func
+from app.database import Transaction
+from app.services.ocr import normalise_payer
+
+# Questions asking for judgement or explanation always go to the LLM
+OPEN_ENDED_RE = re.compile(r'\b(why|explain|should|recommend|advice|advise|suggest|compare|trend|improve|risky|opinion|assess|mean|means|affect|impact|how can|how to|what if'
+                           r'|how (?:is|was|are|were|do|does|did)|calculated|computed|derived|determined|based on)\b')
+
+MONTHS = ['january', 'february', 'march', 'april', 'may', 'june', 'july',
+          'august', 'september', 'october', 'november', 'december']
+MONTH_NUMBERS = {m[:3]: i for i, m in enumerate(MONTHS, start=1)}
+# "may" is usually the verb ("May I know..."); it names the month only before
+# a year or after in/for/of/during
+_MAY = r'(?:(?<=\bin )|(?<=\bfor )|(?<=\bof )|(?<=\bduring ))may|may(?=\s+20\d{2}\b)'
+MONTH_RE = re.compile(r'\b(' + '|'.join(_MAY if m == 'may' else m[:3] + (m[3:] and f'(?:{m[3:]})?') for m in MONTHS) + r')\b')
+YEAR_RE = re.compile(r'\b(20\d{2})\b')
+NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10}
+
+AMOUNT_QUESTION_RE = re.compile(r'\b(total|how much|sum|what (?:was|were|is|are) (?:the|my|our))\b')
+INFLOW_RE = re.compile(r'\b(inflows?|deposits?|credits?(?! score)|income|revenue|came in|received|money in)\b')
+OUTFLOW_RE = re.compile(r'\b(outflows?|expenses?|spending|spent|debits?|withdrawals?|paid out|money out)\b')
+NET_RE = re.compile(r'\bnet\b|\bsurplus\b|\bdeficit\b')
+TOP_PAYERS_RE = re.compile(r'\btop\s+(\d+|' + '|'.join(NUMBER_WORDS) + r')?\s*(payers?|customers?|clients?|sources?)\b'
+                           r'|\b(biggest|largest|top) (payer|customer|client)\b')
+RETURNS_RE = re.compile(r'\b(bounced?|returned?|dishonou?red|reversals?|insufficient funds)\b')
+GAMBLING_RE = re.compile(r'\b(gambling|casinos?|betting|bets)\b')
+COUNT_RE = re.compile(r'\b(how many|number of|count|any)\b')
+SCORE_RE = re.compile(r'\b(credit score|risk score|score|risk level|risk profile|risk rating)\b')
+TXN_COUNT_RE = re.compile(r'\b(how many|number of|count of) transactions\b')
+LARGEST_RE = re.compile(r'\b(largest|biggest|highest)\s+(single\s+)?(deposit|credit|inflow|payment|debit|outflow|withdrawal|expense|transaction)s?\b')
+
+# Qualifiers that narrow a question. A handler that does not apply one
+# returns None, so the LLM answers rather than the unqualified figure.
+PERIOD_RE = re.compile(r'\b(quarters?|q[1-4]|weeks?|weekly|days?|daily|years?|yearly|annual|half|ytd|last|past|previous|recent|latest|since|between|until|before|after)\b')
+THRESHOLD_RE = re.compile(r'\b(above|over|below|under|more than|less than|greater than|larger than|bigger than|smaller than|at least|at most|exceed\w*)\b|\brm\s*\d')
+COUNTERPARTY_RE = re.compile(r'\b(?:from|to|by|on)\s+(?:(?:the|this|my|our|all|whole|entire)\s+)?([a-z][\w&.-]*)')
+# Words after from/to/on that do not name a counterparty or category
+NEUTRAL_WORDS = {"date", "statement", "statements", "period", "analysis", "account", "document", "file", "files", "months", "month", "now"}
+
+TOP_PAYERS_LIMIT = 10
+LARGEST_LIMIT = 5
+
+def rm(amount: float) -> str:
+    return f"RM {amount:,.2f}"
+
+def load_facts(db, analysis_id: int) -> Dict[str, Any]:
+    """
+    Exact figures for one analysis, aggregated in SQL over the transactions
+    table. Empty for analyses whose transactions were never stored.
+    """
+    scope = Transaction.analysis_id == analysis_id
+    count = db.query(func.count(Transaction.id)).filter(scope).scalar()
+    if not count:
+        return {}
+
+    month = func.strftime('%Y-%m', Transaction.date)
+    monthly = db.query(
+        month, func.sum(Transaction.inflow), func.sum(Transaction.outflow), func.count(Transaction.id)
+    ).filter(scope, Transaction.date.isnot(None)).group_by(month).order_by(month).all()
+
+    def flagged(column):
+        return db.query(func.count(Transaction.id), func.sum(Transaction.outflow), func.sum(Transaction.inflow)).filter(scope, column.is_(True)).one()
+
+    # Payers are grouped on the same normalised name as the analysis
+    payers: Dict[str, float] = {}
+    for description, inflow in db.query(Transaction.description, func.sum(Transaction.inflow)).filter(
+        scope, Transaction.inflow > 0
+    ).group_by(Transaction.description):
+        name = normalise_payer(description)
+        payers[name] = payers.get(name, 0.0) + inflow
+    total_inflow = sum(payers.values())
+
+    def largest(column):
+        rows = db.query(Transaction.raw_date, Transaction.description, column).filter(
+            scope, column > 0
+        ).order_by(column.desc(), Transaction.id).limit(LARGEST_LIMIT).all()
+        return [{"date": date, "description": description, "amount": round(amount, 2)} for date, description, amount in rows]
+
+    returns, gambling = flagged(Transaction.is_return), flagged(Transaction.is_gambling)
+    return {
+        "transactions": count,
+        "monthly": [{"month": m, "inflow": round(i or 0.0, 2), "outflow": round(o or 0.0, 2), "transactions": n} for m, i, o, n in monthly],
+        "returns": {"count": returns[0], "outflow": round(returns[1] or 0.0, 2), "inflow": round(returns[2] or 0.0, 2)},
+        "gambling": {"count": gambling[0], "outflow": round(gambling[1] or 0.0, 2), "inflow": round(gambling[2] or 0.0, 2)},
+        "top_payers": [
+            {"name": name, "amount": round(amount, 2), "percentage": round(amount / total_inflow * 100, 1) if total_inflow else 0.0}
+            for name, amount in sorted(payers.items(), key=lambda p: -p[1])[:TOP_PAYERS_LIMIT]
+        ],
+        "largest_inflows": largest(Transaction.inflow),
+        "largest_outflows": largest(Transaction.outflow)
+    }
+
+def _months_asked(question: str) -> List[Tuple[int, Optional[str]]]:
+    """
+    (month number, year or None) for each month named in the question.
+    """
+    years = YEAR_RE.findall(question)
+    year = years[0] if len(years) == 1 else None
+    return [(MONTH_NUMBERS[found[:3]], year) for found in MONTH_RE.findall(question)]
+
+def _qualifiers(question: str) -> Set[str]:
+    """
+    The qualifiers a question narrows its figure by: "month", "period"
+    (quarter, range, a year on its own), "counterparty" (a payer, payee or
+    category) and "threshold" (an amount bound).
+    """
+    found = set()
+    if MONTH_RE.search(question):
+        found.add("month")
+    elif YEAR_RE.search(question):
+        found.add("period")
+    if PERIOD_RE.search(question):
+        found.add("period")
+    if THRESHOLD_RE.search(question):
+        found.add("threshold")
+    for word in COUNTERPARTY_RE.findall(question):
+        if word not in NEUTRAL_WORDS and not MONTH_RE.fullmatch(word) and not YEAR_RE.fullmatch(word):
+            found.add("counterparty")
+    return found
+
+def _month_rows(summary: Dict[str, Any], facts: Dict[str, Any], month: int, year: Optional[str]) -> List[Dict[str, Any]]:
+    if facts.get("monthly"):
+        return [row for row in facts["monthly"]
+                if int(row["month"][5:]) == month and (year is None or row["month"][:4] == year)]
+    # No stored transactions: the chart data has month names but no year
+    label = MONTHS[month - 1][:3].title()
+    return [{"month": label, "inflow": row["inflow"], "outflow": row["outflow"]}
+            for row in summary.get("graph_data", []) if row.get("month") == label and year is None]
+
+def _amounts(question: str, summary: Dict[str, Any], facts: Dict[str, Any]) -> Optional[str]:
+    wants_in, wants_out, wants_net = INFLOW_RE.search(question), OUTFLOW_RE.search(question), NET_RE.search(question)
+    if not (wants_in or wants_out or wants_net):
+        return None
+    if not (AMOUNT_QUESTION_RE.search(question) or wants_net):
+        return None
+    if _qualifiers(question) - {"month"}:
+        return None
+
+    def lines(label: str, inflow: float, outflow: float) -> List[str]:
+        out = []
+        if wants_in or wants_net:
+            out.append(f"- **Total inflow{label}**: {rm(inflow)}")
+        if wants_out or wants_net:
+            out.append(f"- **Total outflow{label}**: {rm(outflow)}")
+        if wants_net:
+            out.append(f"- **Net cash flow{label}**: {rm(inflow - outflow)}")
+        return out
+
+    months = _months_asked(question)
+    if not months:
+        s = summary.get("summary", {})
+        return "\n".join(lines("", s.get("total_inflow", 0.0), s.get("total_outflow", 0.0)))
+
+    answer = []
+    for month, year in months:
+        rows = _month_rows(summary, facts, month, year)
+        if not rows:
+            return None # Month outside the statement period: let the LLM explain
+        for row in rows:
+            answer.extend(lines(f" ({row['month']})", row["inflow"], row["outflow"]))
+    return "\n".join(answer)
+
+def _top_payers(question: str, summary: Dict[str, Any], facts: Dict[str, Any]) -> Optional[str]:
+    match = TOP_PAYERS_RE.search(question)
+    if not match or _qualifiers(question):
+        return None
+    if match.group(3):
+        n = 1 # "biggest customer"
+    elif match.group(1):
+        n = int(NUMBER_WORDS.get(match.group(1), match.group(1)))
+    else:
+        n = 3 if match.group(2).endswith('s') else 1
+    payers = facts.get("top_payers") or summary.get("top_payers", [])
+    if n > len(payers) and not facts.get("top_payers"):
+        return None
+    if not payers:
+        return "- No inflows from identifiable payers were found."
+    return "\n".join(f"{i}. **{p['name']}**: {rm(p['amount'])} ({p['percentage']}% of inflow)"
+                     for i, p in enumerate(payers[:n], start=1))
+
+def _flag_count(question: str, summary: Dict[str, Any], facts: Dict[str, Any]) -> Optional[str]:
+    if not facts or not COUNT_RE.search(question) or _qualifiers(question):
+        return None
+    for key, pattern, label in (("returns", RETURNS_RE, "returned/dishonoured transactions"),
+                                ("gambling", GAMBLING_RE, "gambling-related transactions")):
+        if pattern.search(question):
+            stats = facts[key]
+            if not stats["count"]:
+                return f"- No {label} were found."
+            return (f"- **{stats['count']}** {label}\n"
+                    f"- Outflow involved: {rm(stats['outflow'])}\n"
+                    f"- Inflow involved: {rm(stats['inflow'])}")
+    return None
+
+def _score(question: str, summary: Dict[str, Any], facts: Dict[str, Any]) -> Optional[str]:
+    if not SCORE_RE.search(question) or _qualifiers(question):
+        return None
+    s = summary.get("summary", {})
+    return f"- **Score**: {s.get('score', 0)}/100\n- **Risk level**: {s.get('risk_level', 'Unknown')}"
+
+def _transaction_count(question: str, summary: Dict[str, Any], facts: Dict[str, Any]) -> Optional[str]:
+    if not facts or not TXN_COUNT_RE.search(question) or _qualifiers(question):
+        return None
+    return f"- **{facts['transactions']}** transactions in this analysis"
+
+def _largest(question: str, summary: Dict[str, Any], facts: Dict[str, Any]) -> Optional[str]:
+    match = LARGEST_RE.search(question)
+    if not facts or not match or _qualifiers(question):
+        return None
+    kind = match.group(3)
+    if kind == "transaction":
+        rows = sorted(facts["largest_inflows"] + facts["largest_outflows"], key=lambda r: -r["amount"])[:1]
+    else:
+        rows = facts["largest_inflows" if kind in ("deposit", "credit", "inflow") else "largest_outflows"][:1]
+    if not rows:
+        return None
+    r = rows[0]
+    return f"- **{rm(r['amount'])}** on {r['date']}: {r['description']}"
+
+# Tried in order; the first handler that produces an answer wins
+INTENTS = [
+    ("top_payers", _top_payers),
+    ("flag_count", _flag_count),
+    ("largest_transaction", _largest),
+    ("transaction_count", _transaction_count),
+    ("cash_flow", _amounts),
+    ("score", _score),
+]
+
+def answer_locally(question: str, summary: Dict[str, Any], facts: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """
+    Returns (intent, markdown answer) for quantitative questions that the
+    stored analysis answers exactly, or None to fall back to the LLM.
+    """
+    q = question.lower()
+    if OPEN_ENDED_RE.search(q):
+        return None
+    for name, handler in INTENTS:
+        answer = handler(q, summary, facts)
+        if answer:
+            return name, answer
+    return None
@@ -0,0 +1,257 @@
+import os
+import json
+import uuid
+import random
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional
+from sqlalchemy import or_, and_
+from app.database import SessionLocal, AsyncSessionLocal, Job
+from app.services.spool import SpooledFile, remove_spooled
+from app.services.progress import ProgressReporter
+from app.services.telemetry import registry, job_id_var
+
+logger = logging.getLogger(__name__)
+
+jobs_finished = registry.counter("sme_jobs_finished_total", "Job attempts finished by a worker, by outcome", ["status"])
+
+# Spooled job inputs must outlive the request, so they go to a shared directory
+JOB_SPOOL_DIR = os.getenv("JOB_SPOOL_DIR", "job_files")
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Base delay before a failed job is retried; doubles per attempt
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "5"))
+
+def job_spool_dir() -> str:
+    os.makedirs(JOB_SPOOL_DIR, exist_ok=True)
+    return JOB_SPOOL_DIR
+
+def enqueue_job(spooled: List[SpooledFile]) -> str:
+    """
+    Records a queued job for already-spooled files and returns its id.
+    """
+    db = SessionLocal()
+    try:
+        job = Job(
+            id=uuid.uuid4().hex,
+            status="queued",
+            payload=json.dumps([vars(f) for f in spooled]),
+            max_attempts=JOB_MAX_ATTEMPTS,
+            available_at=datetime.utcnow()
+        )
+        db.add(job)
+        db.commit()
+        # Logged with the request id, linking the upload request to the job's own logs
+        logger.info("Queued job %s with %d file(s)", job.id, len(spooled))
+        return job.id
+    finally:
+        db.close()
+
+def claim_job(worker_id: str, lease_seconds: int = JOB_LEASE_SECONDS) -> Optional[Dict[str, Any]]:
+    """
+    Claims the oldest runnable job: queued and past its backoff, or running
+    with an expired lease (its worker died). The conditional UPDATE makes the
+    claim atomic when several workers race for the same row.
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+
+        # Jobs whose worker died on the final attempt are not retried again
+        db.query(Job).filter(
+            Job.status == "running", Job.lease_expires_at < now, Job.attempts >= Job.max_attempts
+        ).update({Job.status: "failed", Job.error: "Lease expired on final attempt", Job.lease_expires_at: None}, synchronize_session=False)
+        db.commit()
+
+        runnable = or_(
+            and_(Job.status == "queued", Job.available_at <= now),
+            and_(Job.status == "running", Job.lease_expires_at < now)
+        )
+        candidates = db.query(Job.id).filter(runnable).order_by(Job.created_at).limit(5).all()
+        for (job_id,) in candidates:
+            claimed = db.query(Job).filter(Job.id == job_id, runnable).update({
+                Job.status: "running",
+                Job.lease_owner: worker_id,
+                Job.lease_expires_at: now + timedelta(seconds=lease_seconds),
+                Job.attempts: Job.attempts + 1,
+                Job.updated_at: now
+            }, synchronize_session=False)
+            db.commit()
+            if claimed == 1:
+                job = db.query(Job).filter(Job.id == job_id).first()
+                return {"id": job.id, "attempts": job.attempts, "max_attempts": job.max_attempts, "payload": json.loads(job.payload)}
+        return None
+    finally:
+        db.close()
+
+def extend_lease(job_id: str, worker_id: str, lease_seconds: int = JOB_LEASE_SECONDS) -> bool:
+    """
+    Heartbeat: pushes the lease forward. Returns False if the job was lost to another worker.
+    """
+    db = SessionLocal()
+    try:
+        updated = db.query(Job).filter(Job.id == job_id, Job.lease_owner == worker_id, Job.status == "running").update({
+            Job.lease_expires_at: datetime.utcnow() + timedelta(seconds=lease_seconds)
+        }, synchronize_session=False)
+        db.commit()
+        return updated == 1
+    finally:
+        db.close()
+
+def mark_succeeded(db, job_id: str, worker_id: str, result: Dict[str, Any], analysis_id: Optional[int]) -> bool:
+    """
+    Marks the job succeeded in the caller's transaction. Returns False,
+    changing nothing, if the job is no longer this worker's (its lease
+    expired and another worker claimed it).
+    """
+    updated = db.query(Job).filter(Job.id == job_id, Job.lease_owner == worker_id, Job.status == "running").update({
+        Job.status: "succeeded",
+        Job.result_json: json.dumps(result),
+        Job.analysis_id: analysis_id,
+        Job.lease_expires_at: None,
+        Job.error: None
+    }, synchronize_session=False)
+    return updated == 1
+
+def complete_job(job_id: str, worker_id: str, result: Dict[str, Any], analysis_id: Optional[int]) -> bool:
+    """
+    mark_succeeded in its own transaction, for jobs that save nothing.
+    """
+    db = SessionLocal()
+    try:
+        completed = mark_succeeded(db, job_id, worker_id, result, analysis_id)
+        db.commit()
+        return completed
+    finally:
+        db.close()
+
+def fail_job(job_id: str, worker_id: str, error: str, retryable: bool = True) -> str:
+    """
+    Puts the job back in the queue with jittered exponential backoff, or marks
+    it failed once its attempts are exhausted (or at once if the error is not
+    `retryable`). Returns the new status.
+    """
+    db = SessionLocal()
+    try:
+        job = db.query(Job).filter(Job.id == job_id, Job.lease_owner == worker_id, Job.status == "running").first()
+        if not job:
+            return "lost"
+        if not retryable or job.attempts >= job.max_attempts:
+            job.status = "failed"
+        else:
+            delay = JOB_RETRY_BASE_SECONDS * (2 ** (job.attempts - 1))
+            job.status = "queued"
+            job.available_at = datetime.utcnow() + timedelta(seconds=delay * random.uniform(0.5, 1.5))
+        job.error = error
+        job.lease_owner = None
+        job.lease_expires_at = None
+        db.commit()
+        return job.status
+    finally:
+        db.close()
+
+def get_job(job_id: str) -> Optional[Job]:
+    db = SessionLocal()
+    try:
+        return db.query(Job).filter(Job.id == job_id).first()
+    finally:
+        db.close()
+
+class JobLost(RuntimeError):
+    """The worker's lease on a job lapsed and another worker now owns it."""
+
+class JobRejected(RuntimeError):
+    """The job's input cannot succeed however often it is retried (e.g. every file is unreadable)."""
+
+async def save_and_complete(job_id: str, worker_id: str, result: Dict[str, Any]) -> int:
+    """
+    Saves the job's analysis and marks the job succeeded in one transaction,
+    guarded on the lease. If another worker has taken the job over, nothing
+    is saved and JobLost is raised, so a job never stores two analyses.
+    """
+    from app.services.storage import prepare_analysis, write_analysis_with_history, add_saved_views
+
+    prepared = await asyncio.to_thread(prepare_analysis, result)
+
+    def write(db) -> int:
+        saved = write_analysis_with_history(db, prepared)
+        add_saved_views(result, saved)
+        result["id"] = saved["id"]
+        if not mark_succeeded(db, job_id, worker_id, result, saved["id"]):
+            raise JobLost(job_id)
+        return saved["id"]
+
+    async with AsyncSessionLocal() as session:
+        try:
+            analysis_id = await session.run_sync(write)
+            await session.commit()
+        except BaseException:
+            await session.rollback()
+            raise
+    return analysis_id
+
+def job_files(payload: List[Dict[str, Any]]) -> List[SpooledFile]:
+    return [SpooledFile(**item) for item in payload]
+
+async def run_job(job: Dict[str, Any], worker_id: str) -> str:
+    """
+    Executes one claimed job: pipeline, persistence and bookkeeping.
+    A heartbeat keeps the lease alive while OCR is in flight; if the lease
+    is lost the attempt is abandoned without saving, and the inputs are
+    left to the job's new owner. `worker_id` must be unique per slot.
+    """
+    # Imported here so the API process does not need the pipeline to enqueue
+    from app.services.ocr import process_spooled
+
+    files = job_files(job["payload"])
+    job_id_var.set(job["id"]) # Each worker slot runs in its own task, so this only tags this job's logs and spans
+    progress = ProgressReporter(total_files=len(files))
+
+    work = asyncio.create_task(process_spooled(files, progress=progress))
+    lost = asyncio.Event()
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            if not await asyncio.to_thread(extend_lease, job["id"], worker_id):
+                lost.set()
+                work.cancel()
+                return
+
+    beat = asyncio.create_task(heartbeat())
+    try:
+        result = await work
+        # Repeats of a PDF in the job are read once, so only the distinct files can fail
+        read = len(files) - len(result.get("deduplication", {}).get("duplicate_files", []))
+        file_errors = result.get("file_errors", [])
+        if not result["transactions"] and len(file_errors) == read:
+            error = "; ".join(f"{e['filename']}: {e['error']}" for e in file_errors)
+            # Worth another attempt only if some file hit an outage rather than being unreadable
+            raise RuntimeError(error) if any(e["retryable"] for e in file_errors) else JobRejected(error)
+        if result.get("status") == "success":
+            # Renewing the lease confirms the job is still ours and covers the save
+            if not await asyncio.to_thread(extend_lease, job["id"], worker_id):
+                raise JobLost(job["id"])
+            with progress.stage("saving"):
+                await save_and_complete(job["id"], worker_id, result)
+        elif not await asyncio.to_thread(complete_job, job["id"], worker_id, result, None):
+            raise JobLost(job["id"])
+        status = "succeeded"
+    except (asyncio.CancelledError, JobLost) as e:
+        if isinstance(e, asyncio.CancelledError) and not lost.is_set():
+            raise # The worker itself is shutting down
+        logger.warning("Job %s: lease lost to another worker, attempt abandoned", job["id"])
+        status = "lost"
+    except Exception as e:
+        logger.error("Job %s failed (attempt %s): %s", job["id"], job["attempts"], e)
+        status = await asyncio.to_thread(fail_job, job["id"], worker_id, str(e), not isinstance(e, JobRejected))
+    finally:
+        beat.cancel()
+        work.cancel()
+    jobs_finished.inc(status=status)
+
+    # Inputs are kept while a retry is pending or another worker owns the job
+    if status in ("succeeded", "failed"):
+        remove_spooled(files)
+    return status
@@ -0,0 +1,51 @@
+import re
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, List, Any
+
+def map_unique(values: pd.Series, func: Callable[[Any], Any]) -> pd.Series:
+    """
+    Applies `func` once per distinct value and broadcasts the results back
+    with a vectorized take. Statements repeat the same descriptions over and
+    over, so this is far cheaper than a row-wise apply.
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    mapped = np.array([func(u) for u in uniques], dtype=object)
+    return pd.Series(mapped[codes], index=values.index)
+
+class KeywordMatcher:
+    """
+    Case-insensitive substring matcher for several keyword categories at once.
+    Patterns are compiled once and each distinct description is matched a
+    single time; hits are broadcast back to every row as boolean masks.
+    """
+
+    def __init__(self, categories: Dict[str, List[str]]):
+        self.categories = list(categories)
+        self.patterns = {
+            name: re.compile('|'.join(re.escape(k.upper()) for k in keywords))
+            for name, keywords in categories.items()
+        }
+
+    def masks(self, texts: pd.Series) -> Dict[str, pd.Series]:
+        """
+        Returns one boolean Series per category, aligned with `texts`.
+        """
+        codes, uniques = pd.factorize(texts, use_na_sentinel=False)
+        upper = [str(u).upper() for u in uniques]
+        result = {}
+        for name, pattern in self.patterns.items():
+            hits = np.fromiter((pattern.search(u) is not None for u in upper), dtype=bool, count=len(upper))
+            result[name] = pd.Series(hits[codes], index=texts.index)
+        return result
+
+# Statement table header keywords, shared by the OCR markdown and text layer parsers
+DATE_KEYWORDS = ['date', 'txn date', 'posting date']
+AMOUNT_KEYWORDS = ['amount', 'debit', 'credit', 'withdrawal', 'deposit', 'balance']
+DESC_KEYWORDS = ['description', 'details', 'particulars', 'transaction']
+
+RISK_KEYWORDS = ['RETURN', 'REVERSAL', 'DISHONOURED', 'INSUFFICIENT', 'FEE', 'PENALTY']
+GAMBLING_KEYWORDS = ['GENTING', 'CASINO', 'BET', 'MAGNUM', 'TOTO']
+
+# Compiled once; one match per distinct description for both categories
+RED_FLAG_MATCHER = KeywordMatcher({"returns": RISK_KEYWORDS, "gambling": GAMBLING_KEYWORDS})
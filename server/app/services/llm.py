@@ -0,0 +1,125 @@
+import os
+import asyncio
+import hashlib
+import threading
+from typing import AsyncIterator, Optional
+from app.services.telemetry import registry
+
+# "gemini" (default) or "stub" for offline, deterministic load tests
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-flash-latest")
+# Pause between stub tokens, to mimic model latency in load tests
+STUB_TOKEN_DELAY_MS = float(os.getenv("LLM_STUB_DELAY_MS", "0"))
+
+llm_tokens = registry.counter("sme_llm_tokens_total", "LLM tokens by backend and kind (prompt or completion)", ["backend", "kind"])
+llm_bytes = registry.counter("sme_llm_bytes_total", "Prompt bytes sent to (out) and response bytes received from (in) the LLM", ["backend", "direction"])
+
+def record_usage(backend: str, prompt: str, response: str, prompt_tokens: Optional[int] = None, completion_tokens: Optional[int] = None) -> None:
+    """
+    Counts one model call. Token counts come from the backend when it reports
+    them, otherwise whitespace-separated words stand in.
+    """
+    llm_tokens.inc(prompt_tokens if prompt_tokens is not None else len(prompt.split()), backend=backend, kind="prompt")
+    llm_tokens.inc(completion_tokens if completion_tokens is not None else len(response.split()), backend=backend, kind="completion")
+    llm_bytes.inc(len(prompt.encode("utf-8")), backend=backend, direction="out")
+    llm_bytes.inc(len(response.encode("utf-8")), backend=backend, direction="in")
+
+def _usage(response):
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "prompt_token_count", None), getattr(usage, "candidates_token_count", None)
+
+class LLMNotConfigured(RuntimeError):
+    """Raised when the selected backend is missing its credentials."""
+
+class GeminiBackend:
+    """
+    Gemini client, configured once. Calls go through the async API so the
+    event loop keeps serving other requests during the model round trip.
+    """
+    name = "gemini"
+
+    def __init__(self, api_key: str, model_name: str = GEMINI_MODEL):
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+
+    async def generate(self, prompt: str) -> str:
+        response = await self.model.generate_content_async(prompt)
+        record_usage(self.name, prompt, response.text, *_usage(response))
+        return response.text
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        response = await self.model.generate_content_async(prompt, stream=True)
+        parts = []
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                continue # Chunks without text parts (e.g. the final finish_reason)
+            if text:
+                parts.append(text)
+                yield text
+        # Usage arrives with the last chunk
+        record_usage(self.name, prompt, "".join(parts), *_usage(response))
+
+class StubBackend:
+    """
+    Local backend that answers instantly (or after LLM_STUB_DELAY_MS per token)
+    with text derived only from the prompt, so identical prompts always get
+    identical answers. No network access.
+    """
+    name = "stub"
+
+    def __init__(self, token_delay_ms: float = STUB_TOKEN_DELAY_MS):
+        self.token_delay = token_delay_ms / 1000
+
+    def _answer(self, prompt: str) -> str:
+        question = prompt.rsplit("USER QUESTION:", 1)[-1].split("INSTRUCTIONS:", 1)[0].strip()
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+        return (
+            f"**Stub answer** to: {question}\n\n"
+            f"- Prompt size: {len(prompt)} characters\n"
+            f"- Prompt digest: `{digest}`"
+        )
+
+    async def generate(self, prompt: str) -> str:
+        return "".join([token async for token in self.stream(prompt)])
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        answer = self._answer(prompt)
+        for i, token in enumerate(answer.split(" ")):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield token if i == 0 else " " + token
+        record_usage(self.name, prompt, answer)
+
+_client = None
+_client_lock = threading.Lock()
+
+def create_backend(name: str = LLM_BACKEND):
+    if name == "stub":
+        return StubBackend()
+    if name == "gemini":
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise LLMNotConfigured("Gemini API Key not configured.")
+        return GeminiBackend(api_key)
+    raise LLMNotConfigured(f"Unknown LLM_BACKEND '{name}'")
+
+def get_llm():
+    """
+    Process-wide LLM client, created on first use and reused afterwards.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = create_backend()
+        return _client
+
+def set_llm(client: Optional[object]) -> None:
+    """
+    Replaces the process-wide client (None resets it to LLM_BACKEND on next use).
+    """
+    global _client
+    with _client_lock:
+        _client = client
@@ -1,70 +1,116 @@
 import os
-import tempfile
+import io
+import asyncio
+import logging
 import pandas as pd
 import re
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Iterator
 from fastapi import UploadFile
-from llama_parse import LlamaParse
 from datetime import datetime
 from pypdf import PdfReader
+from app.services.spool import SpooledFile, spool_uploads, remove_spooled
+from app.services.progress import ProgressReporter
+from app.services.keywords import RED_FLAG_MATCHER, map_unique, DATE_KEYWORDS, AMOUNT_KEYWORDS, DESC_KEYWORDS
+from app.services.dates import parse_dates
+from app.services.ocr_cache import ocr_cache, cache_key
+from app.services.text_layer import extract_text_layer, write_page_subset, TEXT_LAYER_VERSION
+from app.services.retrieval import build_search_index
+from app.services.ocr_backends import create_ocr_client, OCRUnavailable
+from app.services.telemetry import registry
+from app.services.aggregates import score_months, top_payer_totals
+from app.services.dedupe import unique_files, dedupe_transactions
+from app.services.balances import verify_balances
 
-# Initialize LlamaParse
-parser = LlamaParse(
-    result_type="markdown",
-    verbose=True,
-)
+logger = logging.getLogger(__name__)
 
-async def process_pdfs(files: List[UploadFile]) -> Dict[str, Any]:
+pages_by_source = registry.counter("sme_statement_pages_total", "Statement pages read, by source (text_layer or ocr)", ["source"])
+
+# Settings that change the OCR output; part of the cache key
+PARSER_SETTINGS = {
+    "result_type": "markdown",
+}
+
+# Read digitally generated PDFs from their own text layer before using remote OCR
+TEXT_LAYER_ENABLED = os.getenv("OCR_TEXT_LAYER", "1") == "1"
+
+# Remote OCR behind a rate limiter, timeouts, retries and a circuit breaker
+ocr_client = create_ocr_client(PARSER_SETTINGS)
+
+CACHE_SETTINGS = {
+    **PARSER_SETTINGS,
+    "text_layer": TEXT_LAYER_VERSION if TEXT_LAYER_ENABLED else None,
+    # Other backends get their own entries; LlamaParse keeps the existing ones
+    **({"backend": ocr_client.name} if ocr_client.name != "llamaparse" else {}),
+}
+
+# Upper bound on files processed at the same time (each holds one OCR round trip open)
+MAX_CONCURRENT_FILES = int(os.getenv("OCR_MAX_CONCURRENCY", "4"))
+
+async def process_pdfs(files: List[UploadFile], max_concurrency: int = MAX_CONCURRENT_FILES, progress: Optional[ProgressReporter] = None) -> Dict[str, Any]:
+    """
+    Streams the uploads to disk, then runs the pipeline on the spooled files.
+    Raises UploadTooLarge before any OCR work if a size limit is exceeded.
+    """
+    progress = progress or ProgressReporter(total_files=len(files))
+    spooled = await spool_uploads(files, progress=progress)
+    try:
+        return await process_spooled(spooled, max_concurrency=max_concurrency, progress=progress)
+    finally:
+        remove_spooled(spooled)
+
+async def process_spooled(files: List[SpooledFile], max_concurrency: int = MAX_CONCURRENT_FILES, progress: Optional[ProgressReporter] = None) -> Dict[str, Any]:
+    progress = progress or ProgressReporter(total_files=len(files))
     all_transactions = []
     full_raw_markdown = ""
+    pages = [] # (filename, page number, markdown) for the chat search index
     
     # Metadata extraction
     detected_name = "Unknown Company"
     name_found = False
     fraud_warnings = []
+    file_errors = []
+    balance_checks = []
 
-    for file in files:
-        suffix = os.path.splitext(file.filename)[1]
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            content = await file.read()
-            tmp.write(content)
-            tmp_path = tmp.name
+    # The same PDF twice in one request is only read once
+    files, duplicate_files = unique_files(files)
+    for duplicate in duplicate_files:
+        progress.counts["files_done"] += 1
+        progress.emit("file_skipped", file=duplicate["filename"], reason="duplicate", duplicate_of=duplicate["duplicate_of"])
 
-            tmp_path = tmp.name
+    # Files run concurrently, bounded by the semaphore. A failing file is
+    # reported in its own result and never cancels its siblings.
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
 
-        try:
-            # Step 1: Forensics (Metadata Check)
-            metadata_alerts = check_metadata(tmp_path)
-            if metadata_alerts:
-                fraud_warnings.extend(metadata_alerts)
+    async def run_bounded(file: SpooledFile) -> Dict[str, Any]:
+        async with semaphore:
+            return await process_single_file(file, progress)
 
-            # Step 2: OCR
-            documents = await parser.aload_data(tmp_path)
-            
-            for doc in documents:
-                text = doc.text
-                full_raw_markdown += text + "\n\n"
-                
-                # Attempt name extraction from the first file/page
-                if not name_found:
-                    possible_name = extract_entity_name(text)
-                    if possible_name:
-                        detected_name = possible_name
-                        name_found = True
-                
-                # Step 2: Extraction
-                transactions = extract_transactions_robust(text)
-                all_transactions.extend(transactions)
+    file_results = await asyncio.gather(*(run_bounded(f) for f in files))
 
-        except Exception as e:
-            print(f"Error processing file {file.filename}: {e}")
-        finally:
-            if os.path.exists(tmp_path):
-                os.remove(tmp_path)
+    # Overlapping statements repeat transactions; keep one copy before anything is summed
+    with progress.stage("deduplication"):
+        deduplication = dict(duplicate_files=duplicate_files, **dedupe_transactions(file_results))
+    progress.counts["transactions"] -= deduplication["removed_transactions"]
+
+    # Merge in upload order so the output matches the sequential path
+    for file_result in file_results:
+        fraud_warnings.extend(file_result["warnings"])
+        for page_no, text in enumerate(file_result["documents"], start=1):
+            full_raw_markdown += text + "\n\n"
+            pages.append((file_result["filename"], page_no, text))
+        if not name_found and file_result["entity_name"]:
+            detected_name = file_result["entity_name"]
+            name_found = True
+        all_transactions.extend(file_result["transactions"])
+        if file_result["balance_check"]:
+            balance_checks.append(file_result["balance_check"])
+        if file_result["error"]:
+            file_errors.append({"filename": file_result["filename"], "error": file_result["error"], "retryable": file_result["retryable"]})
 
     # Step 3: Analytics & Scoring
     if not all_transactions:
+        progress.emit("stage_skipped", stage="analytics", reason="no transactions")
         # Fallback if parsing failed completely, return empty structure but with error hint
         return {
             "status": "partial_success",
@@ -74,16 +120,26 @@ async def process_pdfs(files: List[UploadFile]) -> Dict[str, Any]:
             "graph_data": [],
             "insights": [],
             "entity_name": detected_name,
+            "file_errors": file_errors,
+            "deduplication": deduplication,
+            "balance_checks": balance_checks,
+            "timings": progress.timings,
             "raw_markdown": full_raw_markdown
         }
 
-    # Sort
-    try:
-        all_transactions.sort(key=lambda x: pd.to_datetime(x.get('date', ''), dayfirst=True, errors='coerce') or pd.Timestamp.min)
-    except:
-        pass
+    with progress.stage("analytics"):
+        # Dates are parsed once here; sorting and analytics share the column
+        frame = build_transaction_frame(all_transactions)
+
+        # Sort (unparseable dates first, as with the old Timestamp.min key)
+        frame = frame.sort_values('dt', kind='stable', na_position='first')
+        all_transactions = [all_transactions[i] for i in frame.index]
+        frame = frame.reset_index(drop=True)
 
-    monthly_summary, global_summary = compute_financial_analysis(all_transactions)
+        monthly_summary, global_summary = compute_financial_analysis(all_transactions, frame=frame)
+
+    with progress.stage("indexing"):
+        search_index = build_search_index(pages)
     
     return {
         "status": "success",
@@ -94,10 +150,119 @@ async def process_pdfs(files: List[UploadFile]) -> Dict[str, Any]:
         "insights": monthly_summary['insights'],
         "top_payers": monthly_summary.get('top_payers', []),
         "red_flags": monthly_summary.get('red_flags', []),
-        "fraud_warnings": list(set(fraud_warnings)),
-        "raw_markdown": full_raw_markdown.strip()
+        "fraud_warnings": list(dict.fromkeys(fraud_warnings)),
+        "file_errors": file_errors,
+        "deduplication": deduplication,
+        "balance_checks": balance_checks,
+        "timings": progress.timings,
+        "raw_markdown": full_raw_markdown.strip(),
+        "search_index": search_index,
+        "aggregates": monthly_summary.get("aggregates")
     }
 
+async def process_single_file(file: SpooledFile, progress: Optional[ProgressReporter] = None) -> Dict[str, Any]:
+    """
+    Runs forensics, OCR and extraction for one spooled file.
+    Errors are caught here so that partial output is kept, as in the sequential loop.
+    """
+    progress = progress or ProgressReporter()
+    result = {
+        "filename": file.filename,
+        "warnings": [],
+        "documents": [],
+        "entity_name": None,
+        "transactions": [],
+        "balance_check": None,
+        "error": None,
+        "retryable": False
+    }
+
+    try:
+        # Step 1: Forensics (Metadata Check), off the event loop
+        with progress.stage("metadata", file.filename):
+            metadata_alerts = await asyncio.to_thread(check_metadata, file.path)
+            if metadata_alerts:
+                result["warnings"].extend(metadata_alerts)
+
+        # Step 2: OCR (served from the cache when this exact file was seen before)
+        with progress.stage("ocr", file.filename):
+            key = cache_key(file.sha256, CACHE_SETTINGS)
+            texts = await asyncio.to_thread(ocr_cache.get, key)
+            if texts is None:
+                texts = await load_documents(file.path)
+                await asyncio.to_thread(ocr_cache.put, key, texts)
+
+        with progress.stage("extraction", file.filename):
+            for text in texts:
+                result["documents"].append(text)
+
+                # Attempt name extraction from the first page that yields one
+                if not result["entity_name"]:
+                    possible_name = extract_entity_name(text)
+                    if possible_name:
+                        result["entity_name"] = possible_name
+
+                # Step 2: Extraction
+                transactions = extract_transactions_robust(text)
+                result["transactions"].extend(transactions)
+                progress.counts["transactions"] += len(transactions)
+
+        # Step 3: Running balance continuity, over the whole statement in printed order
+        with progress.stage("verification", file.filename):
+            check = verify_balances(result["transactions"], file.filename)
+            if check:
+                result["balance_check"] = check
+                if check["warning"]:
+                    result["warnings"].append(check["warning"])
+
+    except Exception as e:
+        logger.error("Error processing file %s: %s", file.filename, e)
+        result["error"] = str(e)
+        result["retryable"] = isinstance(e, OCRUnavailable)
+    finally:
+        progress.counts["files_done"] += 1
+        progress.emit("file_completed", file=file.filename, error=result["error"])
+
+    return result
+
+async def load_documents(file_path: str) -> List[str]:
+    """
+    Returns the markdown of each document in the file. Pages with a usable
+    text layer are rebuilt locally; only scanned pages, or pages the local
+    engine could not parse, are sent to the OCR backend.
+    """
+    pages = None
+    if TEXT_LAYER_ENABLED and file_path.lower().endswith('.pdf'):
+        try:
+            pages = await asyncio.to_thread(extract_text_layer, file_path)
+        except Exception as e:
+            logger.warning("Text layer unavailable for %s, using OCR: %s", file_path, e)
+
+    missing = [i for i, page in enumerate(pages or []) if page is None]
+    if not pages or len(missing) == len(pages):
+        texts = await ocr_client.load(file_path)
+        pages_by_source.inc(len(texts), source="ocr")
+        return texts
+    pages_by_source.inc(len(pages) - len(missing), source="text_layer")
+    if not missing:
+        return pages
+
+    subset_path = await asyncio.to_thread(write_page_subset, file_path, missing)
+    try:
+        remote = await ocr_client.load(subset_path)
+    finally:
+        os.remove(subset_path)
+    pages_by_source.inc(len(remote), source="ocr")
+
+    # Remote output takes the place of the first page it covers
+    texts = []
+    for idx, page in enumerate(pages):
+        if idx == missing[0]:
+            texts.extend(remote)
+        if page is not None:
+            texts.append(page)
+    return texts
+
 def check_metadata(file_path: str) -> List[str]:
     """
     Scans PDF metadata for known editing tools.
@@ -131,7 +296,7 @@ def check_metadata(file_path: str) -> List[str]:
                 alerts.append(warning)
                 
     except Exception as e:
-        print(f"Metadata check failed: {e}")
+        logger.warning("Metadata check failed for %s: %s", file_path, e)
         
     return alerts
 
@@ -151,307 +316,235 @@ def extract_entity_name(text: str) -> str:
                 return line.split(':')[-1].strip()
     return "MegaMart Sdn Bhd" # Fallback/Default
 
-def extract_transactions_robust(markdown_text: str) -> List[Dict[str, Any]]:
+CURRENCY_CLEAN_RE = re.compile(r'[^\d\.\-]')
+# Keywords never contain '|', so matching the raw line equals matching any cell.
+# Matched against the lowered line: case-insensitive alternations are much slower.
+DATE_HEADER_RE = re.compile('|'.join(map(re.escape, DATE_KEYWORDS)))
+AMOUNT_HEADER_RE = re.compile('|'.join(map(re.escape, AMOUNT_KEYWORDS)))
+
+def parse_currency(val: str) -> float:
+    if not val: return 0.0
+    clean = CURRENCY_CLEAN_RE.sub('', val)
+    try: return float(clean)
+    except: return 0.0
+
+def parse_balance(val: str) -> Optional[float]:
     """
-    More robust definition of table extraction.
-    Searches for headers that resemble standard bank statement columns.
+    A stated balance, or None when the cell is blank or unreadable. Overdrawn
+    balances ("DR", a leading or trailing '-', brackets) come back negative.
     """
-    lines = markdown_text.split('\n')
-    
-    # Potential header keywords
-    date_keywords = ['date', 'txn date', 'posting date']
-    amount_keywords = ['amount', 'debit', 'credit', 'withdrawal', 'deposit', 'balance']
-    desc_keywords = ['description', 'details', 'particulars', 'transaction']
-    
-    transactions = []
-    
-    # 1. Identify Table Block
-    # Look for lines starting with |
-    table_lines = [line.strip() for line in lines if line.strip().startswith('|') and line.strip().endswith('|')]
-    
-    if not table_lines:
-        return []
-        
-    # 2. Find Header
-    header_idx = -1
-    headers = []
-    
-    for i, line in enumerate(table_lines):
-        # clean content
-        row_content = [c.strip().lower() for c in line.split('|')[1:-1]]
-        # Check if this row has at least one Date keyword AND one Amount keyword
-        has_date = any(k in cell for cell in row_content for k in date_keywords)
-        has_amnt = any(k in cell for cell in row_content for k in amount_keywords)
-        
-        if has_date and has_amnt:
-            header_idx = i
-            headers = [c.strip() for c in line.split('|')[1:-1]] # Keep original case for keys if needed, but let's normalize
-            break
-            
-    if header_idx == -1:
-        # Fallback: assume first line is header if it has pipes
-        if len(table_lines) > 2:
-            header_idx = 0
-            headers = [c.strip() for c in table_lines[0].split('|')[1:-1]]
-        else:
-            return []
+    try: return float(val.replace(',', '')) # Plain "12,345.67", the usual case
+    except (AttributeError, ValueError): pass
+    clean = CURRENCY_CLEAN_RE.sub('', val or '')
+    try: amount = float(clean.strip('-'))
+    except ValueError: return None
+    if '-' in clean or '(' in val or 'DR' in val.upper():
+        return -amount
+    return amount
+
+def split_row(line: str) -> List[str]:
+    return [c.strip() for c in line[1:-1].split('|')]
+
+def is_header_line(line: str) -> bool:
+    # A header has at least one Date keyword AND one Amount keyword
+    lower = line.lower()
+    return DATE_HEADER_RE.search(lower) is not None and AMOUNT_HEADER_RE.search(lower) is not None
 
-    # Map headers to standard keys
+def map_headers(headers: List[str]) -> Dict[str, int]:
+    """
+    Maps header cells to standard keys (date, debit, credit, amount, balance, description).
+    """
     header_map = {}
     for idx, h in enumerate(headers):
         h_lower = h.lower()
-        if any(k in h_lower for k in date_keywords):
+        if any(k in h_lower for k in DATE_KEYWORDS):
             header_map['date'] = idx
         elif any(k in h_lower for k in ['debit', 'withdrawal', 'out']):
             header_map['debit'] = idx
         elif any(k in h_lower for k in ['credit', 'deposit', 'in']):
             header_map['credit'] = idx
+        elif 'balance' in h_lower:
+            header_map['balance'] = idx
         elif any(k in h_lower for k in ['amount']):
             header_map['amount'] = idx
-        elif any(k in h_lower for k in desc_keywords):
+        elif any(k in h_lower for k in DESC_KEYWORDS):
             header_map['description'] = idx
+    return header_map
+
+def parse_row(cells: List[str], header_map: Dict[str, int]) -> Optional[Dict[str, Any]]:
+    txn = {}
+    # Get Date
+    txn['date'] = cells[header_map['date']]
+    
+    # Get Description
+    if 'description' in header_map:
+        txn['description'] = cells[header_map['description']]
+    else:
+        # Fallback: join all non-date/non-amount columns
+        excludes = list(header_map.values())
+        desc_parts = [c for i, c in enumerate(cells) if i not in excludes]
+        txn['description'] = " ".join(desc_parts)
+
+    # Get Amount
+    inflow = 0.0
+    outflow = 0.0
+
+    if 'credit' in header_map and 'debit' in header_map:
+        inflow = parse_currency(cells[header_map['credit']])
+        outflow = parse_currency(cells[header_map['debit']])
+    elif 'amount' in header_map:
+        # Heuristic: If there is a 'sign' column or we need to infer
+        # Usually 'amount' + 'cr/dr' indicator column exists in some, but simplistic here:
+        # If negative, outflow.
+        raw = cells[header_map['amount']]
+        val = parse_currency(raw)
+        # Sometimes banks use () for negative or - sign
+        if '(' in raw or '-' in raw:
+            outflow = abs(val)
+        else:
+            inflow = val
             
-    # If no 'date' found, abort
-    if 'date' not in header_map:
-        return []
-        
-    # 3. Parse Rows
-    for line in table_lines[header_idx+1:]:
+    # Only add valid financial txns
+    if inflow > 0 or outflow > 0:
+        txn['inflow'] = inflow
+        txn['outflow'] = outflow
+        if 'balance' in header_map:
+            txn['balance'] = parse_balance(cells[header_map['balance']])
+        return txn
+    return None
+
+def iter_transactions(markdown_text: str) -> Iterator[Dict[str, Any]]:
+    """
+    Single-pass streaming parser over every pipe table in the markdown.
+    Each table block (consecutive pipe lines) gets its own header map; a
+    header repeated inside a block (one per page) re-maps the columns, and a
+    headerless block with the same width as the previous table continues it.
+    """
+    header_map = None
+    width = 0
+    last_table = None # (header_map, width) of the previous block
+    block_start = True
+
+    for raw_line in io.StringIO(markdown_text):
+        line = raw_line.strip()
+        if not (line.startswith('|') and line.endswith('|')):
+            # Any non-table line closes the current block
+            if header_map is not None:
+                last_table = (header_map, width)
+            header_map = None
+            block_start = True
+            continue
         if '---' in line: continue
-        
-        cells = [c.strip() for c in line.split('|')[1:-1]]
-        if len(cells) != len(headers): continue
-        
-        txn = {}
-        # Get Date
-        txn['date'] = cells[header_map['date']]
-        
-        # Get Description
-        if 'description' in header_map:
-            txn['description'] = cells[header_map['description']]
-        else:
-            # Fallback: join all non-date/non-amount columns
-            excludes = list(header_map.values())
-            desc_parts = [c for i, c in enumerate(cells) if i not in excludes]
-            txn['description'] = " ".join(desc_parts)
-
-        # Get Amount
-        inflow = 0.0
-        outflow = 0.0
-        
-        def parse_curr(val):
-            if not val: return 0.0
-            clean = re.sub(r'[^\d\.\-]', '', val)
-            try: return float(clean)
-            except: return 0.0
-
-        if 'credit' in header_map and 'debit' in header_map:
-            inflow = parse_curr(cells[header_map['credit']])
-            outflow = parse_curr(cells[header_map['debit']])
-        elif 'amount' in header_map:
-            # Heuristic: If there is a 'sign' column or we need to infer
-            # Usually 'amount' + 'cr/dr' indicator column exists in some, but simplistic here:
-            # If negative, outflow.
-            val = parse_curr(cells[header_map['amount']])
-            # Sometimes banks use () for negative or - sign
-            if '(' in cells[header_map['amount']] or '-' in cells[header_map['amount']]:
-                outflow = abs(val)
+
+        cells = split_row(line)
+
+        if is_header_line(line):
+            candidate = map_headers(cells)
+            header_map = candidate if 'date' in candidate else None
+            width = len(cells)
+            block_start = False
+            continue
+
+        if block_start:
+            block_start = False
+            if last_table and len(cells) == last_table[1]:
+                # Continuation of the previous table on a new page
+                header_map, width = last_table
             else:
-                inflow = val
-                
-        # Only add valid financial txns
-        if inflow > 0 or outflow > 0:
-            txn['inflow'] = inflow
-            txn['outflow'] = outflow
-            transactions.append(txn)
-            
-    return transactions
+                # Fallback: assume the first row of the block is its header
+                candidate = map_headers(cells)
+                header_map = candidate if 'date' in candidate else None
+                width = len(cells)
+                continue
 
-def compute_financial_analysis(transactions: List[Dict[str, Any]]):
+        if header_map is None or len(cells) != width: continue
+
+        txn = parse_row(cells, header_map)
+        if txn is not None:
+            yield txn
+
+def extract_transactions_robust(markdown_text: str) -> List[Dict[str, Any]]:
+    """
+    More robust definition of table extraction.
+    Searches for headers that resemble standard bank statement columns.
+    """
+    return list(iter_transactions(markdown_text))
+
+DIGITS_RE = re.compile(r'\d+')
+
+def normalise_payer(description: Any) -> str:
+    return DIGITS_RE.sub('', str(description)).strip().upper()
+
+def build_transaction_frame(transactions: List[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    DataFrame of the transactions with a parsed `dt` column (see services/dates).
+    """
     df = pd.DataFrame(transactions)
-    if df.empty:
-        return {"graph_data": [], "insights": []}, {"total_inflow": 0, "total_outflow": 0, "score": 0}
-        
-    # Ensure datetime
-    df['dt'] = pd.to_datetime(df['date'], dayfirst=True, errors='coerce')
-    df = df.dropna(subset=['dt'])
-    
+    if not df.empty:
+        df['dt'] = parse_dates(df['date'])
+    return df
+
+def scorable_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rows with a usable date: parsed, and within 2000 to next year.
+    """
+    # Unparsed dates have a NaN year, which fails both bounds
+    years = df['dt'].dt.year
     current_month = datetime.now()
     # Filter 2000-2030 to avoid OCR noise dates
-    df = df[(df['dt'].dt.year > 2000) & (df['dt'].dt.year <= current_month.year + 1)]
+    return df[(years > 2000) & (years <= current_month.year + 1)]
 
-    # Aggregates
-    df['month_str'] = df['dt'].dt.strftime('%b')
-    df['month_sort'] = df['dt'].dt.to_period('M')
-    
-    monthly_grp = df.groupby('month_sort').agg({
-        'inflow': 'sum',
-        'outflow': 'sum',
-        'month_str': 'first'
-    }).reset_index()
-    
-    monthly_grp = monthly_grp.sort_values('month_sort')
-    
-    total_inflow = df['inflow'].sum()
-    total_outflow = df['outflow'].sum()
-    
-    # Build Graph Data
-    graph_data = []
-    for _, row in monthly_grp.iterrows():
-        graph_data.append({
-            "month": row['month_str'],
-            "inflow": round(row['inflow'], 2),
-            "outflow": round(row['outflow'], 2)
-        })
-
-    # SCORING ALGORITHM
-    # 1. Cash Flow Health (40pts): Inflow > Outflow
-    score = 50 # Base
-    if total_inflow > total_outflow * 1.1: score += 20
-    elif total_inflow > total_outflow: score += 10
-    else: score -= 10
-    
-    # 2. Stability (30pts): Variance of inflow
-    # Low variance = good
-    if len(monthly_grp) > 1:
-        inflow_std = monthly_grp['inflow'].std()
-        inflow_mean = monthly_grp['inflow'].mean()
-        cv = inflow_std / inflow_mean if inflow_mean > 0 else 1
-        if cv < 0.2: score += 20
-        elif cv < 0.5: score += 10
-    else:
-        score += 10 # Neutral if not enough data
-        
-    # 3. Growth (30pts): Last month > First month
-    if len(monthly_grp) >= 2:
-        first_m = monthly_grp.iloc[0]['inflow']
-        last_m = monthly_grp.iloc[-1]['inflow']
-        if last_m > first_m * 1.1: score += 20
-        elif last_m > first_m: score += 10
-    
-    score = max(0, min(100, score)) # Clamp
-    
-    # RISK CATEGORY
-    if score >= 80: risk_level = "Low Risk Profile"
-    elif score >= 50: risk_level = "Moderate Risk"
-    else: risk_level = "High Risk"
+def monthly_aggregates(df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Per-month totals of a date-filtered transaction frame: inflow, outflow,
+    row and red-flag counts, plus inflow per normalised payer. Plain Python
+    values, so they can be stored and merged into a company's history.
+    """
+    if df.empty:
+        return {"months": [], "payers": []}
+    # Rows are binned by month with integer codes and bincount; a pandas
+    # groupby costs more than the sums themselves at statement sizes
+    uniques, codes = np.unique(df['dt'].to_numpy(dtype='datetime64[M]'), return_inverse=True)
+    labels = np.datetime_as_string(uniques, unit='M').tolist()
+    n = len(uniques)
+    inflow = df['inflow'].to_numpy(dtype=float)
+    flags = RED_FLAG_MATCHER.masks(df['description'])
 
-    # INSIGHTS
-    insights = []
-    
-    # 4. CONCENTRATION RISK
-    top_payers = []
-    if not df.empty and total_inflow > 0:
-        inflow_txns = df[df['inflow'] > 0].copy()
-        if not inflow_txns.empty:
-            # Simple cleaning of description to group similar payers
-            inflow_txns['payer'] = inflow_txns['description'].apply(lambda x: re.sub(r'\d+', '', str(x)).strip().upper())
-            
-            payer_stats = inflow_txns.groupby('payer').agg({'inflow': 'sum'}).sort_values('inflow', ascending=False)
-            
-            top_1_amt = payer_stats.iloc[0]['inflow']
-            top_1_name = payer_stats.index[0]
-            concentration_ratio = (top_1_amt / total_inflow) * 100
-            
-            # Get Top 3 for display
-            top_3 = payer_stats.head(3)
-            for name, row in top_3.iterrows():
-                top_payers.append({"name": name, "amount": round(row['inflow'], 2), "percentage": round((row['inflow']/total_inflow)*100, 1)})
-            
-            if concentration_ratio > 40:
-                score -= 15
-                insights.append({
-                    "type": "warning",
-                    "title": "High Customer Concentration",
-                    "text": f"{(concentration_ratio):.1f}% of revenue comes from a single source: {top_1_name}."
-                })
-            elif concentration_ratio > 20:
-                insights.append({
-                    "type": "neutral",
-                    "title": "Moderate Concentration",
-                    "text": f"Top customer contributes {(concentration_ratio):.1f}% of revenue."
-                })
-
-    # 5. RED FLAGS
-    red_flags = []
-    risk_keywords = ['RETURN', 'REVERSAL', 'DISHONOURED', 'INSUFFICIENT', 'FEE', 'PENALTY']
-    gambling_keywords = ['GENTING', 'CASINO', 'BET', 'MAGNUM', 'TOTO']
-    
-    def check_keywords(text, keywords):
-        text = str(text).upper()
-        return any(k in text for k in keywords)
-
-    # Check for bounced cheques/returns
-    returns = df[df['description'].apply(lambda x: check_keywords(x, risk_keywords))]
-    if not returns.empty:
-        count = len(returns)
-        score -= (count * 5) # Heavy penalty
-        red_flags.append(f"Detected {count} instances of Returned/Dishonoured transactions.")
-        insights.append({
-            "type": "negative",
-            "title": "Operational Red Flags",
-            "text": f"Found {count} transactions indicating bounced cheques or reversals."
-        })
-
-    # Check for Gambling/High Risk
-    gambling = df[df['description'].apply(lambda x: check_keywords(x, gambling_keywords))]
-    if not gambling.empty:
-        score -= 20
-        red_flags.append("transactions related to Gambling/Casinos detected.")
-        insights.append({
-            "type": "negative",
-            "title": "High Risk Spend",
-            "text": "Transactions related to gambling or high-risk activities detected."
-        })
+    def total(values) -> List[float]:
+        return np.bincount(codes, weights=values, minlength=n).tolist()
 
-    
-    # Growth Insight
-    if len(monthly_grp) >= 2:
-        growth = ((monthly_grp.iloc[-1]['inflow'] - monthly_grp.iloc[0]['inflow']) / monthly_grp.iloc[0]['inflow']) * 100 if monthly_grp.iloc[0]['inflow'] > 0 else 0
-        if growth > 5:
-            insights.append({
-                "type": "positive",
-                "title": "Revenue Growth",
-                "text": f"Revenue grew by {int(growth)}% compares to the start of the period."
-            })
-        elif growth < -5:
-            insights.append({
-                "type": "negative",
-                "title": "Declining Revenue",
-                "text": f"Revenue dropped by {abs(int(growth))}% over the analysis period."
-            })
-            
-    # Cash Flow Insight
-    ratio = total_outflow / total_inflow if total_inflow > 0 else 0
-    if ratio > 0.95:
-         insights.append({
-                "type": "warning",
-                "title": "High Burn Rate",
-                "text": "Outflow is nearly equal to or exceeds inflow. Monitoring required."
-            })
-    else:
-         insights.append({
-                "type": "positive",
-                "title": "Healthy Margins",
-                "text": "Business maintains a healthy surplus of cash flow."
-            })
+    months = [
+        {"month": label, "inflow": i, "outflow": o, "transactions": int(count), "returns": int(returns), "gambling": int(gambling)}
+        for label, i, o, count, returns, gambling in zip(
+            labels, total(inflow), total(df['outflow'].to_numpy(dtype=float)), np.bincount(codes, minlength=n).tolist(),
+            total(flags['returns'].to_numpy()), total(flags['gambling'].to_numpy()))
+    ]
 
-    score = max(0, min(100, score)) # Clamp
-    
-    # RISK CATEGORY
-    if score >= 80: risk_level = "Low Risk Profile"
-    elif score >= 50: risk_level = "Moderate Risk"
-    else: risk_level = "High Risk"
+    payers = []
+    inflow_mask = inflow > 0
+    if inflow_mask.any():
+        # Simple cleaning of description to group similar payers
+        names = map_unique(df.loc[inflow_mask, 'description'], normalise_payer)
+        payer_codes, payer_names = pd.factorize(np.asarray(names, dtype=object), sort=True)
+        keys = codes[inflow_mask] * len(payer_names) + payer_codes
+        present, key_codes = np.unique(keys, return_inverse=True)
+        sums = np.bincount(key_codes, weights=inflow[inflow_mask]).tolist()
+        payers = [
+            {"month": labels[key // len(payer_names)], "payer": payer_names[key % len(payer_names)], "inflow": amount}
+            for key, amount in zip(present.tolist(), sums)
+        ]
+    return {"months": months, "payers": payers}
 
-    return {
-        "graph_data": graph_data, 
-        "insights": insights,
-        "top_payers": top_payers,
-        "red_flags": red_flags
-    }, {
-        "total_inflow": round(total_inflow, 2),
-        "total_outflow": round(total_outflow, 2),
-        "score": int(score),
-        "risk_level": risk_level
-    }
+def compute_financial_analysis(transactions: List[Dict[str, Any]], frame: Optional[pd.DataFrame] = None):
+    # Reuse the caller's frame when dates were already parsed
+    df = frame if frame is not None else build_transaction_frame(transactions)
+    if df.empty:
+        return {"graph_data": [], "insights": []}, {"total_inflow": 0, "total_outflow": 0, "score": 0}
+
+    df = scorable_rows(df)
 
+    # Scored from monthly aggregates, the same way stored company history is
+    aggregates = monthly_aggregates(df)
+    monthly_summary, global_summary = score_months(aggregates["months"], top_payer_totals(aggregates["payers"]))
+    monthly_summary["aggregates"] = aggregates
+    return monthly_summary, global_summary
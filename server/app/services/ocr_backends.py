@@ -0,0 +1,271 @@
+import os
+import time
+import random
+import asyncio
+import hashlib
+from typing import Any, Dict, List, Optional
+from app.services.telemetry import registry
+
+# "llamaparse" (default) or "fixture" to serve local markdown instead of calling the service
+OCR_BACKEND = os.getenv("OCR_BACKEND", "llamaparse")
+
+# Token bucket shared by every OCR call in the process
+OCR_RATE_PER_SECOND = float(os.getenv("OCR_RATE_PER_SECOND", "2"))
+OCR_RATE_BURST = int(os.getenv("OCR_RATE_BURST", "4"))
+
+OCR_TIMEOUT_SECONDS = float(os.getenv("OCR_TIMEOUT_SECONDS", "180"))
+OCR_MAX_RETRIES = int(os.getenv("OCR_MAX_RETRIES", "3"))
+OCR_RETRY_BASE_SECONDS = float(os.getenv("OCR_RETRY_BASE_SECONDS", "1"))
+
+# Consecutive failures that open the breaker, and how long it stays open
+OCR_BREAKER_THRESHOLD = int(os.getenv("OCR_BREAKER_THRESHOLD", "5"))
+OCR_BREAKER_COOLDOWN_SECONDS = float(os.getenv("OCR_BREAKER_COOLDOWN_SECONDS", "30"))
+
+OCR_FIXTURE_DIR = os.getenv("OCR_FIXTURE_DIR", os.path.join(os.path.dirname(__file__), "..", "..", "fixtures", "ocr"))
+OCR_FIXTURE_LATENCY_MS = float(os.getenv("OCR_FIXTURE_LATENCY_MS", "0"))
+
+# Separates pages inside a fixture file
+FIXTURE_PAGE_BREAK = "\n<!-- page -->\n"
+
+ocr_pages = registry.counter("sme_ocr_pages_total", "Pages returned by the OCR backend", ["backend"])
+ocr_bytes = registry.counter("sme_ocr_bytes_total", "File bytes sent to the OCR backend (in) and markdown bytes returned (out)", ["backend", "direction"])
+ocr_call_seconds = registry.histogram("sme_ocr_call_duration_seconds", "Duration of each OCR backend attempt", ["backend", "status"])
+
+class OCRUnavailable(RuntimeError):
+    """Raised when the OCR service is throttling, timing out or the breaker is open. Worth retrying later."""
+
+class OCRFailed(RuntimeError):
+    """Raised when the service rejects the file itself (corrupt, unsupported). Retrying will not help."""
+
+class TransientOCRError(RuntimeError):
+    """A backend call that failed in a way another attempt may not."""
+
+# HTTP statuses that mean the service, not the file, is at fault
+TRANSIENT_STATUS = {408, 425, 429}
+
+try:
+    # Connect, read and protocol errors of the HTTP client the OCR SDK uses
+    from httpx import TransportError
+    TRANSPORT_ERRORS = (TransportError,)
+except ImportError:
+    TRANSPORT_ERRORS = ()
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Whether a backend error is worth another attempt: timeouts, connection
+    errors, throttling and 5xx responses. Clients often wrap the HTTP error
+    in a generic exception, so the whole cause chain is inspected.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, (TransientOCRError, TimeoutError, asyncio.TimeoutError, ConnectionError)):
+            return True
+        status = getattr(getattr(error, "response", None), "status_code", None)
+        if status is not None and (status in TRANSIENT_STATUS or status >= 500):
+            return True
+        if isinstance(error, TRANSPORT_ERRORS):
+            return True
+        # LlamaParse reports a job that outlived its polling budget only by message
+        if "timeout" in str(error).lower():
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+class TokenBucket:
+    """
+    Allows `rate` calls per second on average with bursts of up to `capacity`.
+    Callers wait (without blocking the event loop) until a token is free.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    async def acquire(self) -> float:
+        """Takes one token; returns the seconds spent waiting for it."""
+        if self.rate <= 0:
+            return 0.0
+        # Reserve synchronously (no await in between), so concurrent callers
+        # queue up behind each other; a negative balance is the backlog
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        delay = -self.tokens / self.rate
+        await asyncio.sleep(delay)
+        return delay
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures and rejects calls for
+    `cooldown` seconds; then lets a single trial call through (half-open).
+    A success closes it again, a failure re-opens it.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half_open"
+
+    def before_call(self) -> None:
+        state = self.state
+        if state == "open" or (state == "half_open" and self.trial_running):
+            retry_in = max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+            raise OCRUnavailable(f"OCR service unavailable (circuit open, retry in {retry_in:.0f}s)")
+        if state == "half_open":
+            self.trial_running = True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.trial_running = False
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+class LlamaParseBackend:
+    """LlamaParse cloud OCR. The client is created on first use."""
+    name = "llamaparse"
+
+    def __init__(self, settings: Dict[str, Any]):
+        self.settings = settings
+        self._parser = None
+
+    async def load(self, path: str) -> List[str]:
+        if self._parser is None:
+            from llama_parse import LlamaParse
+            # By default the client prints failures and returns no documents
+            self._parser = LlamaParse(**self.settings, verbose=False, ignore_errors=False)
+        documents = await self._parser.aload_data(path)
+        if not documents and os.path.getsize(path):
+            raise TransientOCRError("OCR service returned no documents")
+        return [doc.text for doc in documents]
+
+class FixtureBackend:
+    """
+    Offline stand-in that serves markdown from OCR_FIXTURE_DIR: `<file stem>.md`
+    or `<sha256 of the file>.md` when present (uploads are spooled under
+    temporary names, so the hash is what identifies them), otherwise
+    `default.md`. Pages are separated by FIXTURE_PAGE_BREAK. An optional
+    latency mimics the remote round trip for load tests.
+    """
+    name = "fixture"
+
+    def __init__(self, directory: str = OCR_FIXTURE_DIR, latency_ms: float = OCR_FIXTURE_LATENCY_MS):
+        self.directory = directory
+        self.latency = latency_ms / 1000
+
+    def _fixture_for(self, path: str) -> str:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        for name in (stem, digest):
+            candidate = os.path.join(self.directory, f"{name}.md")
+            if os.path.exists(candidate):
+                return candidate
+        return os.path.join(self.directory, "default.md")
+
+    async def load(self, path: str) -> List[str]:
+        fixture = await asyncio.to_thread(self._fixture_for, path)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        with open(fixture, encoding="utf-8") as f:
+            return [page.strip() for page in f.read().split(FIXTURE_PAGE_BREAK) if page.strip()]
+
+class ResilientOCR:
+    """
+    Wraps a backend with a rate limiter, per-call timeout, jittered
+    exponential retries and a circuit breaker. Exhausted retries and an open
+    breaker both surface as OCRUnavailable instead of an empty result. Only
+    transient errors (see is_transient) are retried and count towards the
+    breaker; anything else is raised at once as OCRFailed.
+    """
+
+    def __init__(self, backend, rate: float = OCR_RATE_PER_SECOND, burst: int = OCR_RATE_BURST,
+                 timeout: float = OCR_TIMEOUT_SECONDS, max_retries: int = OCR_MAX_RETRIES,
+                 retry_base: float = OCR_RETRY_BASE_SECONDS):
+        self.backend = backend
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(OCR_BREAKER_THRESHOLD, OCR_BREAKER_COOLDOWN_SECONDS)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.counts = {"calls": 0, "retries": 0, "timeouts": 0, "failures": 0, "rejected": 0, "permanent": 0}
+        self.rate_wait_s = 0.0
+
+    @property
+    def name(self) -> str:
+        return self.backend.name
+
+    async def load(self, path: str) -> List[str]:
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.counts["retries"] += 1
+                # Full jitter keeps concurrent retries from arriving in lockstep
+                await asyncio.sleep(random.uniform(0, self.retry_base * (2 ** (attempt - 1))))
+            try:
+                self.breaker.before_call()
+            except OCRUnavailable:
+                self.counts["rejected"] += 1
+                raise
+            self.rate_wait_s += await self.bucket.acquire()
+            self.counts["calls"] += 1
+            start = time.perf_counter()
+            try:
+                texts = await asyncio.wait_for(self.backend.load(path), self.timeout)
+            except asyncio.TimeoutError:
+                self.counts["timeouts"] += 1
+                last_error = f"timed out after {self.timeout:g}s"
+            except Exception as e:
+                last_error = str(e) or type(e).__name__
+                if not is_transient(e):
+                    ocr_call_seconds.observe(time.perf_counter() - start, backend=self.name, status="error")
+                    self.counts["permanent"] += 1
+                    # The service answered, so it is not down; this file is at fault
+                    self.breaker.record_success()
+                    raise OCRFailed(f"OCR rejected the file: {last_error}") from e
+            else:
+                self.breaker.record_success()
+                ocr_call_seconds.observe(time.perf_counter() - start, backend=self.name, status="ok")
+                ocr_pages.inc(len(texts), backend=self.name)
+                ocr_bytes.inc(os.path.getsize(path), backend=self.name, direction="in")
+                ocr_bytes.inc(sum(len(t.encode("utf-8")) for t in texts), backend=self.name, direction="out")
+                return texts
+            ocr_call_seconds.observe(time.perf_counter() - start, backend=self.name, status="error")
+            self.counts["failures"] += 1
+            self.breaker.record_failure()
+        raise OCRUnavailable(f"OCR failed after {self.max_retries + 1} attempts: {last_error}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            **self.counts,
+            "rate_limit_wait_s": round(self.rate_wait_s, 2),
+            "breaker": self.breaker.state
+        }
+
+def create_ocr_client(settings: Dict[str, Any], name: str = OCR_BACKEND) -> ResilientOCR:
+    if name == "fixture":
+        return ResilientOCR(FixtureBackend())
+    if name == "llamaparse":
+        return ResilientOCR(LlamaParseBackend(settings))
+    raise ValueError(f"Unknown OCR_BACKEND '{name}'")
@@ -0,0 +1,108 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import List, Dict, Any, Optional
+
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", "ocr_cache.db")
+# Total markdown bytes kept before least-recently-used entries are evicted
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+def cache_key(content_hash: str, settings: Dict[str, Any]) -> str:
+    """
+    Content-addressed key: SHA-256 of the file bytes plus the parser settings,
+    so changing the OCR configuration never serves stale markdown.
+    """
+    payload = content_hash + "|" + json.dumps(settings, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class OCRCache:
+    """
+    SQLite-backed store of OCR markdown (one list of page texts per document),
+    with size-based LRU eviction and hit/miss counters.
+    """
+
+    def __init__(self, path: str = OCR_CACHE_PATH, max_bytes: int = OCR_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # Shared by the API, job workers and bulk ingest processes: WAL plus a
+        # busy timeout keeps concurrent writers from failing with "database is locked"
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS ocr_cache (
+                key TEXT PRIMARY KEY,
+                documents TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_accessed REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_ocr_cache_last_accessed ON ocr_cache (last_accessed)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[List[str]]:
+        with self._lock:
+            row = self._conn.execute("SELECT documents FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE ocr_cache SET last_accessed = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, documents: List[str]) -> None:
+        if not documents:
+            return # Nothing read; leave the file to be OCR'd again next time
+        payload = json.dumps(documents)
+        size = len(payload.encode("utf-8"))
+        if size > self.max_bytes:
+            return # Would evict everything else and still not fit
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_cache (key, documents, size, created_at, last_accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, size, now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Walk from least recently used until we are back under budget
+        for key, size in self._conn.execute("SELECT key, size FROM ocr_cache ORDER BY last_accessed ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM ocr_cache WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": entries,
+            "size_bytes": total,
+            "max_bytes": self.max_bytes
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM ocr_cache")
+            self._conn.commit()
+
+ocr_cache = OCRCache()
@@ -0,0 +1,97 @@
+import json
+import zlib
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+from app.database import Analysis, AnalysisSection
+
+# Result keys stored in their own section; every other key goes to "summary"
+SECTION_KEYS = {
+    "graph": ["graph_data"],
+    "transactions": ["transactions"],
+    "raw_markdown": ["raw_markdown"],
+    "search": ["search_index"],
+}
+SECTIONS = ["summary"] + list(SECTION_KEYS)
+
+# Internal sections: only written when present and never returned unless asked for
+OPTIONAL_SECTIONS = {"search"}
+DEFAULT_SECTIONS = [name for name in SECTIONS if name not in OPTIONAL_SECTIONS]
+
+# Sections smaller than this stay plain JSON; compressing them costs more than it saves
+COMPRESS_MIN_BYTES = 1024
+ZLIB_LEVEL = 6
+
+def split_payload(result: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    sectioned = {key: name for name, keys in SECTION_KEYS.items() for key in keys}
+    parts = {name: {} for name in SECTIONS}
+    for key, value in result.items():
+        parts[sectioned.get(key, "summary")][key] = value
+    return {name: part for name, part in parts.items() if part or name not in OPTIONAL_SECTIONS}
+
+def encode_section(value: Dict[str, Any]) -> Tuple[str, bytes, int]:
+    """
+    Returns (codec, stored bytes, uncompressed size).
+    """
+    raw = json.dumps(value, separators=(",", ":")).encode("utf-8")
+    if len(raw) < COMPRESS_MIN_BYTES:
+        return "json", raw, len(raw)
+    return "json+zlib", zlib.compress(raw, ZLIB_LEVEL), len(raw)
+
+def decode_section(codec: str, data: bytes) -> Dict[str, Any]:
+    if codec == "json+zlib":
+        data = zlib.decompress(data)
+    return json.loads(data)
+
+def encode_sections(result: Dict[str, Any]) -> List[Tuple[str, str, bytes, int]]:
+    """
+    Returns (name, codec, stored bytes, uncompressed size) per section. Pure
+    CPU work, so callers can run it off the event loop before opening a session.
+    """
+    return [(name, *encode_section(value)) for name, value in split_payload(result).items()]
+
+def add_sections(db, analysis_id: int, encoded: List[Tuple[str, str, bytes, int]]) -> None:
+    """
+    Adds one AnalysisSection row per encoded section. The caller commits.
+    """
+    for name, codec, data, raw_size in encoded:
+        db.add(AnalysisSection(analysis_id=analysis_id, name=name, codec=codec, data=data, raw_size=raw_size))
+
+def save_sections(db, analysis_id: int, result: Dict[str, Any]) -> None:
+    add_sections(db, analysis_id, encode_sections(result))
+
+def parse_fields(fields: Optional[str]) -> Optional[set]:
+    """
+    Parses a `fields=summary,graph` projection. None means the default sections.
+    Raises ValueError on unknown section names.
+    """
+    if not fields:
+        return None
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(SECTIONS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}. Valid: {', '.join(SECTIONS)}")
+    return requested
+
+def load_payload(db, analysis: Analysis, sections: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    Rebuilds the stored result from the requested sections only; sections
+    that were not asked for are neither read nor decompressed. Analyses saved
+    before sectioned storage fall back to their raw_json_results blob.
+    """
+    wanted = set(sections) if sections is not None else set(DEFAULT_SECTIONS)
+    rows = db.query(AnalysisSection.name, AnalysisSection.codec, AnalysisSection.data).filter(
+        AnalysisSection.analysis_id == analysis.id,
+        AnalysisSection.name.in_(wanted)
+    ).all()
+
+    if not rows and analysis.raw_json_results:
+        data = json.loads(analysis.raw_json_results)
+        if sections is None:
+            return data # Legacy blobs never held internal sections
+        return {k: v for name, part in split_payload(data).items() if name in wanted for k, v in part.items()}
+
+    payload = {}
+    for name in SECTIONS: # Stable key order: summary first
+        for row in rows:
+            if row.name == name:
+                payload.update(decode_section(row.codec, row.data))
+    return payload
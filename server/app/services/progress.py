@@ -0,0 +1,51 @@
+import json
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, Optional
+from app.services.telemetry import record_span
+
+ProgressSink = Callable[[Dict[str, Any]], None]
+
+def sse_event(data: Dict[str, Any]) -> str:
+    """Formats an event dict as one Server-Sent Events message."""
+    return f"event: {data['event']}\ndata: {json.dumps(data)}\n\n"
+
+class ProgressReporter:
+    """
+    Collects per-stage timings for one pipeline run and, when a sink is
+    attached, emits an event as each stage starts, completes or fails.
+    Every event carries the running counts (files done, transactions so far).
+    """
+
+    def __init__(self, sink: Optional[ProgressSink] = None, total_files: int = 0):
+        self.sink = sink
+        self.started = time.perf_counter()
+        self.counts = {"total_files": total_files, "files_done": 0, "transactions": 0}
+        self.timings: Dict[str, float] = {} # stage -> accumulated ms
+
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self.started) * 1000, 1)
+
+    def emit(self, event: str, **data: Any) -> None:
+        if self.sink is None:
+            return
+        self.sink({"event": event, "t_ms": self.elapsed_ms(), **self.counts, **data})
+
+    @contextmanager
+    def stage(self, name: str, filename: Optional[str] = None):
+        self.emit("stage_started", stage=name, file=filename)
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.emit("stage_failed", stage=name, file=filename, elapsed_ms=self._record(name, start, "error", filename), error=str(e))
+            raise
+        self.emit("stage_completed", stage=name, file=filename, elapsed_ms=self._record(name, start, "ok", filename))
+
+    def _record(self, name: str, start: float, status: str, filename: Optional[str]) -> float:
+        seconds = time.perf_counter() - start
+        # Every stage is also a span in the process-wide latency histograms
+        record_span(name, seconds, status, file=filename)
+        elapsed = round(seconds * 1000, 1)
+        self.timings[name] = round(self.timings.get(name, 0.0) + elapsed, 1)
+        return elapsed
@@ -0,0 +1,133 @@
+import os
+import re
+import math
+from collections import Counter
+from typing import List, Dict, Any, Tuple
+
+# Chunking limits: prose is merged up to CHUNK_MAX_CHARS, tables are cut every
+# TABLE_ROWS_PER_CHUNK rows and each piece repeats the table header
+CHUNK_MAX_CHARS = 1200
+TABLE_ROWS_PER_CHUNK = 25
+
+# Okapi BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+CHAT_TOP_K = int(os.getenv("CHAT_TOP_K", "6"))
+
+TOKEN_RE = re.compile(r'[a-z0-9]+(?:\.[0-9]+)?')
+THOUSANDS_RE = re.compile(r'(?<=\d),(?=\d{3})')
+SEPARATOR_RE = re.compile(r'^\|?[\s:|-]+\|?$')
+
+Page = Tuple[str, int, str] # (filename, page number, markdown)
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase word and amount tokens; '1,500.00' and '1500.00' give the same token.
+    """
+    return TOKEN_RE.findall(THOUSANDS_RE.sub('', text.lower()))
+
+def _blocks(text: str):
+    """
+    Splits a page into ("table", lines) and ("text", paragraph) blocks.
+    """
+    table, paragraph = [], []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith('|'):
+            if paragraph:
+                yield "text", "\n".join(paragraph)
+                paragraph = []
+            table.append(stripped)
+            continue
+        if table:
+            yield "table", table
+            table = []
+        if stripped:
+            paragraph.append(stripped)
+        elif paragraph:
+            yield "text", "\n".join(paragraph)
+            paragraph = []
+    if table:
+        yield "table", table
+    if paragraph:
+        yield "text", "\n".join(paragraph)
+
+def chunk_page(filename: str, page: int, text: str) -> List[Dict[str, Any]]:
+    """
+    Chunks never cross a page or table boundary. Table chunks carry their
+    header row so each one still reads as a table on its own.
+    """
+    chunks = []
+    pending = ""
+
+    def flush_text():
+        nonlocal pending
+        if pending:
+            chunks.append({"file": filename, "page": page, "kind": "text", "text": pending})
+            pending = ""
+
+    for kind, block in _blocks(text):
+        if kind == "text":
+            if pending and len(pending) + len(block) + 2 > CHUNK_MAX_CHARS:
+                flush_text()
+            pending = f"{pending}\n\n{block}" if pending else block
+            continue
+
+        flush_text()
+        header = block[:2] if len(block) > 1 and SEPARATOR_RE.match(block[1]) else block[:1]
+        rows = block[len(header):] or [""]
+        for i in range(0, len(rows), TABLE_ROWS_PER_CHUNK):
+            body = "\n".join(header + rows[i:i + TABLE_ROWS_PER_CHUNK]).strip()
+            chunks.append({"file": filename, "page": page, "kind": "table", "text": body})
+    flush_text()
+    return chunks
+
+def build_search_index(pages: List[Page]) -> Dict[str, Any]:
+    """
+    Chunks every page and builds a BM25 inverted index over the chunks.
+    The result is plain JSON so it can be stored with the analysis.
+    """
+    chunks = [c for filename, page, text in pages for c in chunk_page(filename, page, text)]
+    postings: Dict[str, List[List[int]]] = {}
+    lengths = []
+    for i, chunk in enumerate(chunks):
+        counts = Counter(tokenize(chunk["text"]))
+        lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append([i, tf])
+
+    return {
+        "chunks": chunks,
+        "postings": postings,
+        "lengths": lengths,
+        "avg_length": (sum(lengths) / len(lengths)) if lengths else 0.0,
+        "source_chars": sum(len(text) for _, _, text in pages)
+    }
+
+def search(index: Dict[str, Any], query: str, k: int = CHAT_TOP_K) -> List[Dict[str, Any]]:
+    """
+    Top-k chunks by BM25 score, returned in document order. Falls back to the
+    first k chunks (statement header and opening rows) when nothing matches.
+    """
+    chunks = index.get("chunks", [])
+    if not chunks:
+        return []
+
+    n = len(chunks)
+    lengths = index["lengths"]
+    avg_length = index["avg_length"] or 1.0
+    scores: Dict[int, float] = {}
+    for term in set(tokenize(query)):
+        postings = index["postings"].get(term)
+        if not postings:
+            continue
+        idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+        for i, tf in postings:
+            norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * lengths[i] / avg_length)
+            scores[i] = scores.get(i, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+
+    if not scores:
+        return chunks[:k]
+    top = sorted(scores, key=lambda i: (-scores[i], i))[:k]
+    return [chunks[i] for i in sorted(top)]
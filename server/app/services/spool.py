@@ -0,0 +1,82 @@
+import os
+import asyncio
+import hashlib
+import tempfile
+from dataclasses import dataclass
+from typing import List, Optional
+from fastapi import UploadFile
+from app.services.progress import ProgressReporter
+
+# Bytes read from the request per iteration; peak memory per file stays at this size
+SPOOL_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_FILE_BYTES = int(os.getenv("UPLOAD_MAX_FILE_BYTES", str(50 * 1024 * 1024)))
+MAX_REQUEST_BYTES = int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", str(200 * 1024 * 1024)))
+
+class UploadTooLarge(ValueError):
+    """Raised while spooling when a file or the whole request exceeds its size limit."""
+
+@dataclass
+class SpooledFile:
+    """An upload written to disk, with its content hash computed on the way."""
+    filename: str
+    path: str
+    sha256: str
+    size: int
+
+def _write_chunk(tmp, digest, chunk: bytes) -> None:
+    digest.update(chunk)
+    tmp.write(chunk)
+
+async def spool_upload(file: UploadFile, directory: Optional[str] = None, budget: int = MAX_FILE_BYTES) -> SpooledFile:
+    """
+    Streams an upload to a temporary file in fixed-size chunks, hashing and
+    counting bytes as they pass; each write runs in a worker thread. The
+    partial file is removed if a limit is hit.
+    """
+    suffix = os.path.splitext(file.filename or "")[1]
+    limit = min(MAX_FILE_BYTES, budget)
+    digest = hashlib.sha256()
+    size = 0
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=directory) as tmp:
+        try:
+            while True:
+                chunk = await file.read(SPOOL_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > limit:
+                    raise UploadTooLarge(f"{file.filename} exceeds the upload size limit ({limit} bytes)")
+                # Hashing and the disk write run off the event loop; a slow disk
+                # would otherwise stall every other request for each chunk
+                await asyncio.to_thread(_write_chunk, tmp, digest, chunk)
+        except Exception:
+            tmp.close()
+            os.remove(tmp.name)
+            raise
+
+    return SpooledFile(filename=file.filename, path=tmp.name, sha256=digest.hexdigest(), size=size)
+
+async def spool_uploads(files: List[UploadFile], directory: Optional[str] = None, progress: Optional[ProgressReporter] = None) -> List[SpooledFile]:
+    """
+    Spools every file of a request, enforcing the per-request byte budget.
+    On failure, files already written are cleaned up before re-raising.
+    """
+    progress = progress or ProgressReporter()
+    spooled = []
+    remaining = MAX_REQUEST_BYTES
+    try:
+        for file in files:
+            with progress.stage("spooling", file.filename):
+                item = await spool_upload(file, directory=directory, budget=remaining)
+            spooled.append(item)
+            remaining -= item.size
+    except Exception:
+        remove_spooled(spooled)
+        raise
+    return spooled
+
+def remove_spooled(spooled: List[SpooledFile]) -> None:
+    for item in spooled:
+        if os.path.exists(item.path):
+            os.remove(item.path)
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import pandas as pd
+from typing import List, Dict, Any, Optional
+from sqlalchemy import insert
+from app.database import SessionLocal, AsyncSessionLocal, Analysis, Transaction
+from app.services.dates import parse_dates
+from app.services.keywords import RED_FLAG_MATCHER
+from app.services.payload import encode_sections, add_sections
+from app.services.history_counts import adjust_count
+from app.services.companies import upsert_company
+from app.services.aggregates import merge_company_months, company_analysis
+
+logger = logging.getLogger(__name__)
+
+def transaction_rows(transactions: List[Dict[str, Any]], analysis_id: int, company_id: int) -> List[Dict[str, Any]]:
+    """
+    Flattens pipeline transactions into `transactions` table rows, with the
+    parsed date and red-flag columns computed in one vectorized pass.
+    """
+    df = pd.DataFrame(transactions)
+    if df.empty:
+        return []
+
+    for col in ('date', 'description'):
+        if col not in df:
+            df[col] = ""
+    for col in ('inflow', 'outflow'):
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0.0) if col in df else 0.0
+
+    dt = parse_dates(df['date'])
+    flags = RED_FLAG_MATCHER.masks(df['description'])
+
+    rows = pd.DataFrame({
+        "analysis_id": analysis_id,
+        "company_id": company_id,
+        "date": dt.dt.date.astype(object).where(dt.notna(), None),
+        "raw_date": df['date'].astype(str),
+        "description": df['description'].astype(str),
+        "inflow": df['inflow'].astype(float),
+        "outflow": df['outflow'].astype(float),
+        "is_return": flags['returns'],
+        "is_gambling": flags['gambling'],
+    })
+    return rows.to_dict('records')
+
+def insert_transactions(db, transactions: List[Dict[str, Any]], analysis_id: int, company_id: int) -> int:
+    """
+    Bulk-inserts (executemany) the rows for one analysis. The caller commits.
+    """
+    rows = transaction_rows(transactions, analysis_id, company_id)
+    if rows:
+        db.execute(insert(Transaction), rows)
+    return len(rows)
+
+def prepare_analysis(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The CPU-bound half of saving: encodes the payload sections and builds the
+    transaction rows. Touches no database, so it can run in a worker thread.
+    """
+    # The search index is stored with the analysis but kept out of the result
+    # returned to clients; monthly aggregates only go to the company history
+    search_index = result.pop("search_index", None)
+    aggregates = result.pop("aggregates", None)
+    summary = result.get("summary", {})
+    return {
+        "company_name": result.get("entity_name", "Unknown Company"),
+        "aggregates": aggregates,
+        "analysis": {
+            "score": int(summary.get("score", 0)),
+            "risk_level": summary.get("risk_level", "Unknown"),
+            "total_inflow": float(summary.get("total_inflow", 0.0)),
+            "total_outflow": float(summary.get("total_outflow", 0.0))
+        },
+        "sections": encode_sections(dict(result, search_index=search_index) if search_index else result),
+        "rows": transaction_rows(result.get("transactions", []), None, None)
+    }
+
+def write_analysis(db, prepared: Dict[str, Any]) -> int:
+    """
+    Writes a prepared analysis in the caller's transaction: company upsert,
+    analysis record, payload sections, transactions, the history counter and
+    the company's monthly aggregates. Nothing is committed here, so it all
+    lands (or rolls back) together. Sets prepared["company_id"] and
+    prepared["history_matches"] (how the upload merged into the company's
+    stored months).
+    """
+    company_id = prepared["company_id"] = upsert_company(db, prepared["company_name"])
+    analysis = Analysis(company_id=company_id, **prepared["analysis"])
+    db.add(analysis)
+    db.flush() # Assigns analysis.id for the section and transaction rows
+
+    add_sections(db, analysis.id, prepared["sections"])
+    rows = prepared["rows"]
+    # Decides which rows count towards the company's months, before they are inserted
+    prepared["history_matches"] = merge_company_months(db, company_id, analysis.id, rows, prepared.get("aggregates"))
+    if rows:
+        for row in rows:
+            row["analysis_id"] = analysis.id
+            row["company_id"] = company_id
+        db.execute(insert(Transaction), rows)
+    adjust_count(db, company_id, analysis.risk_level, 1)
+    return analysis.id
+
+def write_analysis_with_history(db, prepared: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    write_analysis, then the company's score over its stored months (this
+    upload merged with earlier ones), read in the same transaction, and how
+    the upload merged into them.
+    """
+    analysis_id = write_analysis(db, prepared)
+    return {
+        "id": analysis_id,
+        "company_analysis": company_analysis(db, prepared["company_id"]),
+        "history_matches": prepared["history_matches"]
+    }
+
+def add_saved_views(result: Dict[str, Any], saved: Dict[str, Any]) -> None:
+    """Adds what was learned while saving to the result returned to the client."""
+    result["company_analysis"] = saved["company_analysis"]
+    if "deduplication" in result:
+        result["deduplication"]["history"] = saved["history_matches"]
+
+def save_analysis(result: Dict[str, Any]) -> Optional[int]:
+    """
+    Stores a successful pipeline result (company, analysis record, payload
+    sections and transactions) in one transaction. Returns the new analysis
+    id, or None if the write failed. Adds the company-level view
+    ("company_analysis") and how it merged into the stored months
+    (deduplication.history) to the result. Blocking; async code uses save_analysis_async.
+    """
+    prepared = prepare_analysis(result)
+    db = SessionLocal()
+    try:
+        saved = write_analysis_with_history(db, prepared)
+        db.commit()
+        add_saved_views(result, saved)
+        return saved["id"]
+    except Exception as db_e:
+        db.rollback()
+        logger.exception("Failed to save analysis: %s", db_e)
+        return None
+    finally:
+        db.close()
+
+async def save_analysis_async(result: Dict[str, Any], session_factory=AsyncSessionLocal) -> Optional[int]:
+    """
+    save_analysis for request handlers: encoding runs in a worker thread and
+    the writes go through the aiosqlite session, so the event loop is never
+    blocked on SQLite.
+    """
+    prepared = await asyncio.to_thread(prepare_analysis, result)
+    async with session_factory() as session:
+        try:
+            saved = await session.run_sync(write_analysis_with_history, prepared)
+            await session.commit()
+            add_saved_views(result, saved)
+            return saved["id"]
+        except Exception as db_e:
+            await session.rollback()
+            logger.exception("Failed to save analysis: %s", db_e)
+            return None
@@ -0,0 +1,241 @@
+import os
+import time
+import uuid
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s req=%(request_id)s job=%(job_id)s %(message)s"
+
+# Correlation ids attached to every log line and span; set per HTTP request and per job
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+job_id_var: ContextVar[Optional[str]] = ContextVar("job_id", default=None)
+
+# Seconds; covers sub-10ms stages up to multi-minute OCR calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# (label dict, value) pairs produced by a collector at scrape time
+Samples = Iterable[Tuple[Dict[str, str], float]]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Counter:
+    """Monotonic counter per label combination. inc() is one dict update under a lock."""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(str(labels.get(n, "")) for n in self.labelnames), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(v)}" for key, v in items]
+
+class Histogram:
+    """
+    Fixed-bucket histogram per label combination. observe() is a bisect plus
+    three increments under a lock; buckets are made cumulative only when rendered.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List] = {} # key -> [bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        lines = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, n in zip(list(self.buckets) + ["+Inf"], counts):
+                cumulative += n
+                le = 'le="+Inf"' if bound == "+Inf" else f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(round(total, 6))}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+class Collected:
+    """
+    Metric read from existing stats at scrape time (cache counters, OCR client
+    state), so the code being measured pays nothing extra.
+    """
+
+    def __init__(self, name: str, help: str, kind: str, collect: Callable[[], Samples]):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_labels(list(labels), list(labels.values()))} {_number(v)}" for labels, v in self.collect()]
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            # Re-registering (e.g. a module imported twice in tests) returns the existing metric
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def collected(self, name: str, help: str, kind: str, collect: Callable[[], Samples]) -> None:
+        with self._lock:
+            self._metrics[name] = Collected(name, help, kind, collect)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                samples = metric.render()
+            except Exception as e:
+                logger.warning("metric %s failed to collect: %s", metric.name, e)
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+logger = logging.getLogger(__name__)
+span_logger = logging.getLogger("app.spans")
+
+stage_seconds = registry.histogram(
+    "sme_stage_duration_seconds", "Time spent in each pipeline stage (spooling, metadata, ocr, extraction, analytics, indexing, saving, ...)",
+    ["stage", "status"]
+)
+http_requests = registry.counter("sme_http_requests_total", "HTTP requests by route and status code", ["method", "route", "status"])
+http_seconds = registry.histogram("sme_http_request_duration_seconds", "HTTP request latency, including streamed bodies", ["method", "route"])
+
+def record_span(stage: str, seconds: float, status: str = "ok", **attrs) -> None:
+    """
+    Records a finished span: one histogram observation, plus a log line
+    carrying the request/job ids when app.spans logs at INFO.
+    """
+    stage_seconds.observe(seconds, stage=stage, status=status)
+    if span_logger.isEnabledFor(logging.INFO):
+        extra = "".join(f" {k}={v}" for k, v in attrs.items() if v is not None)
+        span_logger.info("stage=%s status=%s ms=%.1f%s", stage, status, seconds * 1000, extra)
+
+@contextmanager
+def span(stage: str, **attrs):
+    """Times the enclosed block as one stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        record_span(stage, time.perf_counter() - start, "error", **attrs)
+        raise
+    record_span(stage, time.perf_counter() - start, "ok", **attrs)
+
+class ContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get() or "-"
+        record.job_id = job_id_var.get() or "-"
+        return True
+
+def configure_logging(level: str = LOG_LEVEL) -> None:
+    """
+    Sends the app.* loggers to stderr with request and job ids on every line.
+    Safe to call more than once.
+    """
+    app_logger = logging.getLogger("app")
+    app_logger.setLevel(level)
+    if not any(isinstance(f, ContextFilter) for h in app_logger.handlers for f in h.filters):
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        handler.addFilter(ContextFilter())
+        app_logger.addHandler(handler)
+        app_logger.propagate = False
+
+class RequestContextMiddleware:
+    """
+    ASGI middleware: assigns each HTTP request an id (the caller's
+    X-Request-ID when given), echoes it in the response headers and records
+    request count and latency per route template once the body has been sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex[:16]
+        token = request_id_var.set(request_id)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched") # Template, e.g. /api/analysis/{analysis_id}
+            http_requests.inc(method=scope["method"], route=route, status=status)
+            http_seconds.observe(time.perf_counter() - start, method=scope["method"], route=route)
+            request_id_var.reset(token)
@@ -0,0 +1,154 @@
+import re
+import logging
+import tempfile
+from typing import List, Optional, Tuple
+from pypdf import PdfReader, PdfWriter
+from app.services.keywords import DATE_KEYWORDS, AMOUNT_KEYWORDS, DESC_KEYWORDS
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the emitted markdown changes, so cached OCR output is invalidated
+TEXT_LAYER_VERSION = 1
+
+# Pages with less extractable text than this are treated as scanned images
+MIN_TEXT_CHARS = 20
+
+# Layout mode pads columns with runs of spaces; single spaces stay inside a cell
+CELL_RE = re.compile(r'\S+(?: \S+)*')
+DATE_RE = re.compile(r'^(\d{1,2}[/\-.]\d{1,2}[/\-.]\d{2,4}|\d{1,2} [A-Za-z]{3}(?: \d{2,4})?)\b')
+AMOUNT_RE = re.compile(r'^\(?-?[\d,]+\.\d{2}\)?(?: ?(?:CR|DR))?$', re.IGNORECASE)
+
+def _cells(line: str) -> List[Tuple[int, int, str]]:
+    return [(m.start(), m.end(), m.group()) for m in CELL_RE.finditer(line)]
+
+def _is_header(cells: List[Tuple[int, int, str]]) -> bool:
+    labels = [c[2].lower() for c in cells]
+    has_date = any(k in label for label in labels for k in DATE_KEYWORDS)
+    has_amnt = any(k in label for label in labels for k in AMOUNT_KEYWORDS)
+    return has_date and has_amnt
+
+class _Columns:
+    """
+    Column layout taken from a header row. Cells are assigned to the column
+    whose span (bounded by midpoints between header centres) holds their centre.
+    """
+
+    def __init__(self, header_cells: List[Tuple[int, int, str]]):
+        self.labels = [c[2] for c in header_cells]
+        centres = [(c[0] + c[1]) / 2 for c in header_cells]
+        self.bounds = [(a + b) / 2 for a, b in zip(centres, centres[1:])]
+        self.date_idx = next(i for i, l in enumerate(self.labels) if any(k in l.lower() for k in DATE_KEYWORDS))
+        self.desc_idx = next((i for i, l in enumerate(self.labels) if any(k in l.lower() for k in DESC_KEYWORDS) and i != self.date_idx), None)
+
+    def column_for(self, start: int, end: int) -> int:
+        centre = (start + end) / 2
+        for idx, bound in enumerate(self.bounds):
+            if centre < bound:
+                return idx
+        return len(self.labels) - 1
+
+    def parse_row(self, line: str) -> Optional[List[str]]:
+        stripped = line.lstrip()
+        match = DATE_RE.match(stripped)
+        if not match:
+            return None
+
+        row = [[] for _ in self.labels]
+        offset = len(line) - len(stripped)
+        row[self.date_idx].append(match.group(1))
+
+        rest_start = offset + match.end()
+        for start, end, text in _cells(line[rest_start:]):
+            start, end = start + rest_start, end + rest_start
+            if AMOUNT_RE.match(text):
+                col = self.column_for(start, end)
+            elif self.desc_idx is not None:
+                col = self.desc_idx
+            else:
+                col = self.column_for(start, end)
+            row[col].append(text)
+
+        return [" ".join(parts).replace('|', '/') for parts in row]
+
+    def header_markdown(self) -> List[str]:
+        return [
+            "| " + " | ".join(self.labels) + " |",
+            "|" + "|".join("---" for _ in self.labels) + "|"
+        ]
+
+def page_to_markdown(text: str, columns: Optional[_Columns]) -> Tuple[Optional[str], Optional[_Columns]]:
+    """
+    Rebuilds one page of layout text as markdown: preamble lines as plain text,
+    transaction rows as a pipe table. Returns (None, columns) when the page has
+    date-led rows that could not be placed in a table, so the caller can fall
+    back to remote OCR. The column layout is carried over to the next page for
+    statements that only print the header once.
+    """
+    preamble = []
+    rows = []
+    unplaced = 0
+
+    for line in text.split('\n'):
+        if not line.strip():
+            continue
+        cells = _cells(line)
+        if _is_header(cells):
+            columns = _Columns(cells)
+            continue
+        row = columns.parse_row(line) if columns else None
+        if row is not None:
+            rows.append(row)
+        elif DATE_RE.match(line.lstrip()):
+            unplaced += 1
+        elif not rows:
+            # Split layout-padded lines so each block reads as its own line
+            preamble.extend(c[2] for c in cells)
+
+    if unplaced and not rows:
+        return None, columns
+
+    parts = ["\n".join(preamble)] if preamble else []
+    if rows:
+        table = columns.header_markdown()
+        table.extend("| " + " | ".join(row) + " |" for row in rows)
+        parts.append("\n".join(table))
+    return "\n\n".join(parts), columns
+
+def extract_text_layer(file_path: str) -> List[Optional[str]]:
+    """
+    Extracts markdown for every page from the PDF's own text layer.
+    Pages that are scanned or could not be parsed are returned as None.
+    """
+    reader = PdfReader(file_path)
+    pages: List[Optional[str]] = []
+    columns = None
+
+    for page in reader.pages:
+        try:
+            text = page.extract_text(extraction_mode="layout") or ""
+        except Exception as e:
+            logger.warning("Text layer extraction failed: %s", e)
+            text = ""
+
+        if len(text.strip()) < MIN_TEXT_CHARS:
+            pages.append(None)
+            continue
+
+        markdown, columns = page_to_markdown(text, columns)
+        pages.append(markdown)
+
+    return pages
+
+def write_page_subset(file_path: str, page_indices: List[int]) -> str:
+    """
+    Copies the given pages into a new temporary PDF, so only those pages
+    are sent to remote OCR. The caller removes the returned file.
+    """
+    reader = PdfReader(file_path)
+    writer = PdfWriter()
+    for idx in page_indices:
+        writer.add_page(reader.pages[idx])
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
+        writer.write(tmp)
+        return tmp.name
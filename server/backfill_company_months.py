@@ -0,0 +1,39 @@
+import argparse
+from app.database import SessionLocal, Transaction, CompanyMonth, init_db
+from app.services.aggregates import rebuild_company_months
+
+def backfill(rebuild_all: bool = False, batch_size: int = 50):
+    """
+    Builds the company_months aggregates from the transactions table for
+    companies saved before they existed, merging each company's analyses
+    in the order they were saved. Companies that already have months are skipped
+    unless --all is given, so the migration can be re-run after an interruption.
+    """
+    init_db() # Creates the aggregate tables if missing
+    db = SessionLocal()
+    built = months = 0
+    try:
+        query = db.query(Transaction.company_id).filter(Transaction.company_id.isnot(None)).distinct()
+        if not rebuild_all:
+            query = query.filter(~Transaction.company_id.in_(db.query(CompanyMonth.company_id).distinct()))
+        pending = [company_id for (company_id,) in query.order_by(Transaction.company_id)]
+        print(f"{len(pending)} companies to backfill")
+
+        for i, company_id in enumerate(pending, start=1):
+            months += rebuild_company_months(db, company_id)
+            built += 1
+            if i % batch_size == 0:
+                db.commit()
+                print(f"  {i}/{len(pending)} companies, {months} months")
+        db.commit()
+    finally:
+        db.close()
+
+    print(f"Done: {built} companies, {months} months stored")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill per-company monthly aggregates from stored transactions.")
+    parser.add_argument("--all", action="store_true", help="rebuild every company, not only those without months")
+    parser.add_argument("--batch-size", type=int, default=50, help="companies per commit")
+    args = parser.parse_args()
+    backfill(args.all, args.batch_size)
@@ -0,0 +1,46 @@
+import argparse
+from sqlalchemy import exists
+from app.database import SessionLocal, Analysis, Transaction, init_db
+from app.services.storage import insert_transactions
+from app.services.payload import load_payload
+
+def backfill(batch_size: int = 100):
+    """
+    Explodes the transactions stored in each analysis payload (legacy
+    raw_json_results blob or payload section) into the `transactions` table. Analyses that already have rows are
+    skipped, so the migration can be re-run safely after an interruption.
+    """
+    init_db() # Creates the transactions table and its indexes if missing
+    db = SessionLocal()
+    migrated = skipped = inserted = 0
+    try:
+        pending = db.query(Analysis.id, Analysis.company_id).filter(
+            ~exists().where(Transaction.analysis_id == Analysis.id)
+        ).order_by(Analysis.id).all()
+        print(f"{len(pending)} analyses to backfill")
+
+        for i, (analysis_id, company_id) in enumerate(pending, start=1):
+            analysis = db.query(Analysis).filter(Analysis.id == analysis_id).first()
+            try:
+                transactions = load_payload(db, analysis, ["transactions"]).get("transactions", [])
+            except ValueError:
+                print(f"Skipping analysis {analysis_id}: corrupt JSON")
+                skipped += 1
+                continue
+
+            inserted += insert_transactions(db, transactions, analysis_id, company_id)
+            migrated += 1
+            if i % batch_size == 0:
+                db.commit()
+                print(f"  {i}/{len(pending)} analyses, {inserted} transactions")
+        db.commit()
+    finally:
+        db.close()
+
+    print(f"Done: {migrated} analyses migrated, {skipped} skipped, {inserted} transactions inserted")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill the transactions table from stored analysis JSON.")
+    parser.add_argument("--batch-size", type=int, default=100, help="analyses per commit")
+    args = parser.parse_args()
+    backfill(args.batch_size)
@@ -0,0 +1,188 @@
+"""
+Concurrent uploads against the previous database layer and the async/WAL one.
+
+  old: default engine (rollback journal, default pool); each save commits the
+       company and the analysis separately, inline on the event loop, as the
+       upload handler used to.
+  new: aiosqlite engine with WAL and the tuned pragmas; one transaction per
+       save via save_analysis_async.
+
+While the saves run, reader tasks keep fetching the first history page and a
+ticker measures how late the event loop wakes up (time it spends blocked).
+Each layer gets a fresh database file in a temporary directory.
+
+Run from the server directory:
+    python -m benchmarks.bench_db --uploads 40 --readers 8 --pages 20
+"""
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+from sqlalchemy import select, func
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app.database import Base, Company, Analysis, create_sqlite_engine, create_async_sqlite_engine
+from app.services.ocr import extract_transactions_robust, build_transaction_frame, compute_financial_analysis
+from app.services.retrieval import build_search_index
+from app.services.storage import prepare_analysis, write_analysis, save_analysis_async
+from benchmarks.bench_extraction import build_markdown
+
+HISTORY_PAGE = (
+    select(Analysis.id, Analysis.score, Analysis.risk_level, Company.name)
+    .join(Company, Analysis.company_id == Company.id)
+    .order_by(Analysis.created_at.desc(), Analysis.id.desc())
+    .limit(50)
+)
+
+def build_result(pages: int, rows: int) -> dict:
+    markdown = build_markdown(pages, rows)
+    transactions = extract_transactions_robust(markdown)
+    frame = build_transaction_frame(transactions)
+    monthly, summary = compute_financial_analysis(transactions, frame=frame)
+    return {
+        "status": "success",
+        "entity_name": "MEGAMART SDN BHD",
+        "summary": summary,
+        "transactions": transactions,
+        "graph_data": monthly["graph_data"],
+        "insights": monthly["insights"],
+        "top_payers": monthly.get("top_payers", []),
+        "red_flags": monthly.get("red_flags", []),
+        "fraud_warnings": [],
+        "raw_markdown": markdown,
+        "search_index": build_search_index([("statement.pdf", 1, markdown)])
+    }
+
+def legacy_save(Session, result: dict) -> int:
+    """The pre-async write path: separate company commit, then the rest."""
+    prepared = prepare_analysis(result)
+    db = Session()
+    try:
+        company = db.query(Company).filter(Company.name == prepared["company_name"]).first()
+        if not company:
+            company = Company(name=prepared["company_name"], ssm_number="Unknown")
+            db.add(company)
+            db.commit()
+            db.refresh(company)
+        analysis_id = write_analysis(db, prepared)
+        db.commit()
+        return analysis_id
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+async def loop_lag(stop: asyncio.Event, lags: list, interval: float = 0.005):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+async def run_layer(layer: str, path: str, result: dict, uploads: int, readers: int, companies: int) -> dict:
+    url = f"sqlite:///{path}"
+    setup_engine = create_sqlite_engine(url, tuned=(layer == "new"))
+    Base.metadata.create_all(bind=setup_engine)
+
+    if layer == "old":
+        Session = sessionmaker(autocommit=False, autoflush=False, bind=setup_engine)
+
+        async def save(i):
+            # Blocking call straight from the coroutine, like the old handler
+            return legacy_save(Session, dict(result, entity_name=f"COMPANY {i % companies}"))
+
+        async def read_page():
+            with Session() as db:
+                return db.execute(HISTORY_PAGE).all()
+    else:
+        async_engine = create_async_sqlite_engine(url.replace("sqlite://", "sqlite+aiosqlite://", 1))
+        AsyncSession = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+        async def save(i):
+            analysis_id = await save_analysis_async(dict(result, entity_name=f"COMPANY {i % companies}"), AsyncSession)
+            if analysis_id is None:
+                raise RuntimeError("save failed")
+            return analysis_id
+
+        async def read_page():
+            async with AsyncSession() as db:
+                return (await db.execute(HISTORY_PAGE)).all()
+
+    errors = []
+    read_ms = []
+    lags = []
+    saves_done = asyncio.Event()
+
+    async def saver(i):
+        try:
+            await save(i)
+        except Exception as e:
+            errors.append(str(e))
+
+    async def reader():
+        while not saves_done.is_set():
+            start = time.perf_counter()
+            try:
+                await read_page()
+            except Exception as e:
+                errors.append(str(e))
+            read_ms.append((time.perf_counter() - start) * 1000)
+            await asyncio.sleep(0)
+
+    ticker = asyncio.create_task(loop_lag(saves_done, lags))
+    reader_tasks = [asyncio.create_task(reader()) for _ in range(readers)]
+    start = time.perf_counter()
+    await asyncio.gather(*(saver(i) for i in range(uploads)))
+    elapsed = time.perf_counter() - start
+    saves_done.set()
+    await asyncio.gather(ticker, *reader_tasks)
+
+    with setup_engine.connect() as conn:
+        stored = conn.execute(select(func.count(Analysis.id))).scalar()
+        journal = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+    setup_engine.dispose()
+    if layer == "new":
+        await async_engine.dispose()
+
+    read_ms.sort()
+    return {
+        "layer": layer,
+        "journal": journal,
+        "elapsed_s": elapsed,
+        "saved": stored,
+        "errors": len(errors),
+        "reads": len(read_ms),
+        "read_p50_ms": statistics.median(read_ms) if read_ms else 0.0,
+        "read_p95_ms": read_ms[int(len(read_ms) * 0.95)] if read_ms else 0.0,
+        "max_lag_ms": max(lags, default=0.0) * 1000,
+        "first_error": errors[0] if errors else ""
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=int, default=40, help="concurrent saves per layer")
+    parser.add_argument("--readers", type=int, default=8, help="concurrent history readers")
+    parser.add_argument("--companies", type=int, default=5, help="distinct company names across uploads")
+    parser.add_argument("--pages", type=int, default=20, help="statement pages per upload")
+    parser.add_argument("--rows", type=int, default=40, help="rows per page")
+    args = parser.parse_args()
+
+    result = build_result(args.pages, args.rows)
+    print(f"payload: {len(result['transactions'])} transactions per upload, "
+          f"{args.uploads} uploads, {args.readers} readers")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for layer in ("old", "new"):
+            stats = asyncio.run(run_layer(layer, os.path.join(tmp, f"{layer}.db"), result,
+                                          args.uploads, args.readers, args.companies))
+            print(f"{layer}: journal={stats['journal']}  {stats['elapsed_s']:.2f}s  "
+                  f"{stats['saved'] / stats['elapsed_s']:.1f} saves/s  saved={stats['saved']}  errors={stats['errors']}  "
+                  f"reads={stats['reads']} (p50 {stats['read_p50_ms']:.1f} ms, p95 {stats['read_p95_ms']:.1f} ms)  "
+                  f"max loop lag {stats['max_lag_ms']:.0f} ms")
+            if stats["first_error"]:
+                print(f"    first error: {stats['first_error'][:200]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Throughput of extract_transactions_robust on a large multi-page markdown
+statement (header repeated on every page, narrative text between pages).
+
+Run from the server directory:
+    python -m benchmarks.bench_extraction --pages 500 --rows 40
+"""
+import time
+import random
+import argparse
+from app.services.ocr import extract_transactions_robust
+
+HEADER = "| Date | Transaction Description | Debit | Credit | Balance |\n|---|---|---|---|---|"
+DESCRIPTIONS = ["PAYMENT TO SUPPLIER XYZ", "CASH DEPOSIT", "TRF FROM MAIN CLIENT BERHAD", "RETURN CHEQUE - INSUFFICIENT FUNDS"]
+
+def build_markdown(pages: int, rows_per_page: int, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    balance = 10000.0
+    parts = []
+    for page in range(pages):
+        parts.append(f"MEGAMART SDN BHD\nStatement page {page + 1} of {pages}\n")
+        lines = [HEADER]
+        for i in range(rows_per_page):
+            day = (i % 28) + 1
+            month = (page % 12) + 1
+            amount = float(rng.randint(100, 5000))
+            if rng.random() < 0.5:
+                balance -= amount
+                debit, credit = f"{amount:,.2f}", ""
+            else:
+                balance += amount
+                debit, credit = "", f"{amount:,.2f}"
+            lines.append(f"| {day:02d}/{month:02d}/24 | {rng.choice(DESCRIPTIONS)} | {debit} | {credit} | {balance:,.2f} |")
+        parts.append("\n".join(lines))
+        parts.append("\nCarried forward\n")
+    return "\n".join(parts)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--rows", type=int, default=40, help="rows per page")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    markdown = build_markdown(args.pages, args.rows)
+    expected = args.pages * args.rows
+
+    best = float("inf")
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        transactions = extract_transactions_robust(markdown)
+        best = min(best, time.perf_counter() - start)
+
+    print(f"input: {args.pages} pages, {expected} rows, {len(markdown) / 1e6:.1f} MB markdown")
+    print(f"rows extracted: {len(transactions)} / {expected}")
+    print(f"best of {args.repeat}: {best * 1000:.1f} ms  ->  {len(transactions) / best:,.0f} rows/s")
+
+if __name__ == "__main__":
+    main()
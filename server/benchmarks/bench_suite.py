@@ -0,0 +1,194 @@
+"""
+Scaling benchmarks on seeded synthetic statements of 1 to 10,000 rows.
+
+For each size a statement is generated as markdown and as a PDF (see
+generate_synthetic.py) and the suite times:
+
+  extraction    extract_transactions_robust on the markdown
+  analytics     compute_financial_analysis on the extracted transactions
+  verification  verify_balances (running balance continuity) on them
+  metadata      check_metadata on the PDF
+  upload        POST /api/upload end to end, with the fixture OCR backend
+                serving the statement's markdown (no network, no OCR cache)
+
+Each benchmark reports the best of --repeat runs as rows/s, plus peak
+Python memory (tracemalloc) from one extra run. Results are compared with
+benchmarks/baselines.json; a throughput drop beyond --tolerance is a
+regression and the exit code is 1 (cases under a millisecond are shown
+but not checked). Baselines are machine specific:
+refresh them with --save-baseline on the machine that runs the check.
+
+Run from the server directory:
+    python -m benchmarks.bench_suite
+    python -m benchmarks.bench_suite --sizes 1000,10000 --only extraction,analytics
+    python -m benchmarks.bench_suite --sizes 100000 --only verification
+    python -m benchmarks.bench_suite --save-baseline
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+DEFAULT_SIZES = [1, 10, 100, 1000, 10000]
+BENCHMARKS = ["extraction", "analytics", "verification", "metadata", "upload"]
+MIN_MEASURE_SECONDS = 0.2
+MAX_RUNS = 200
+MIN_COMPARED_SECONDS = 0.001
+
+def configure(workdir: str) -> None:
+    """
+    Points the app at a scratch directory before it is imported: database and
+    OCR cache files live there, and OCR is served from fixtures written there.
+    """
+    sys.path.insert(0, SERVER_DIR)
+    os.environ.update({
+        "OCR_BACKEND": "fixture",
+        "OCR_FIXTURE_DIR": workdir,
+        "OCR_FIXTURE_LATENCY_MS": "0",
+        "OCR_TEXT_LAYER": "0",
+        "OCR_RATE_PER_SECOND": "0",
+        "OCR_CACHE_PATH": os.path.join(workdir, "ocr_cache.db"),
+        "OCR_CACHE_MAX_BYTES": "0", # Nothing fits, so every upload runs the (stub) OCR step
+    })
+    os.chdir(workdir) # The database URL is relative to the working directory
+
+def measure(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """
+    Best time of at least `repeat` runs, running more while under
+    MIN_MEASURE_SECONDS so that millisecond-sized cases are not pure noise.
+    """
+    best = float("inf")
+    runs, spent = 0, 0.0
+    while runs < repeat or (spent < MIN_MEASURE_SECONDS and runs < MAX_RUNS):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed)
+        runs, spent = runs + 1, spent + elapsed
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": best, "peak_mb": peak / 1e6}
+
+def prepare_statement(workdir: str, rows: int, seed: int) -> Dict[str, Any]:
+    from generate_synthetic import generate_rows, rows_to_markdown, write_statement_pdf
+    from app.services.ocr_backends import FIXTURE_PAGE_BREAK
+
+    statement = generate_rows(rows, seed)
+    pages = rows_to_markdown(statement)
+    pdf_path = os.path.join(workdir, f"statement_{rows}.pdf")
+    write_statement_pdf(statement, pdf_path)
+    with open(pdf_path, "rb") as f:
+        pdf_bytes = f.read()
+    # The fixture backend finds uploads (spooled under temp names) by content hash
+    with open(os.path.join(workdir, f"{hashlib.sha256(pdf_bytes).hexdigest()}.md"), "w", encoding="utf-8") as f:
+        f.write(FIXTURE_PAGE_BREAK.join(pages))
+    return {"markdown": "\n\n".join(pages), "pdf_path": pdf_path, "pdf_bytes": pdf_bytes}
+
+def run_suite(sizes: List[int], only: List[str], repeat: int, seed: int) -> Dict[str, Dict[str, Dict[str, float]]]:
+    from app.services.ocr import extract_transactions_robust, compute_financial_analysis, check_metadata
+    from app.services.balances import verify_balances
+    from fastapi.testclient import TestClient
+    import main
+
+    results: Dict[str, Dict[str, Dict[str, float]]] = {name: {} for name in only}
+    workdir = os.getcwd()
+    with TestClient(main.app) as client:
+        for rows in sizes:
+            statement = prepare_statement(workdir, rows, seed)
+            transactions = extract_transactions_robust(statement["markdown"])
+            if len(transactions) != rows:
+                raise RuntimeError(f"{rows}-row statement extracted {len(transactions)} rows")
+
+            def upload():
+                response = client.post("/api/upload", files=[("files", (f"statement_{rows}.pdf", statement["pdf_bytes"], "application/pdf"))])
+                body = response.json()
+                if response.status_code != 200 or len(body.get("transactions", [])) != rows:
+                    raise RuntimeError(f"upload of {rows} rows failed: {response.status_code} {str(body)[:200]}")
+
+            runs = {
+                "extraction": lambda: extract_transactions_robust(statement["markdown"]),
+                "analytics": lambda: compute_financial_analysis(transactions),
+                "verification": lambda: verify_balances(transactions, f"statement_{rows}.pdf"),
+                "metadata": lambda: check_metadata(statement["pdf_path"]),
+                "upload": upload,
+            }
+            for name in only:
+                stats = measure(runs[name], repeat)
+                stats["rows_per_s"] = rows / stats["seconds"]
+                results[name][str(rows)] = {key: round(value, 6 if key == "seconds" else 1) for key, value in stats.items()}
+    return results
+
+def compare(results, baselines, tolerance: float) -> List[str]:
+    """Prints the results next to the baselines; returns the regressions."""
+    regressions = []
+    print(f"{'benchmark':<14}{'rows':>7}{'best ms':>11}{'rows/s':>13}{'peak MB':>9}{'baseline':>13}{'change':>9}")
+    for name, by_size in results.items():
+        for rows, stats in by_size.items():
+            base = baselines.get(name, {}).get(rows)
+            change = ""
+            if base:
+                delta = stats["rows_per_s"] / base["rows_per_s"] - 1
+                change = f"{delta:+.0%}"
+                # Sub-millisecond timings move more than the tolerance between runs
+                if delta < -tolerance and stats["seconds"] >= MIN_COMPARED_SECONDS:
+                    change += " !"
+                    regressions.append(f"{name} @ {rows} rows: {stats['rows_per_s']:,.0f} rows/s vs baseline {base['rows_per_s']:,.0f}")
+            baseline = f"{base['rows_per_s']:,.0f}" if base else "-"
+            print(f"{name:<14}{rows:>7}{stats['seconds'] * 1000:>11.2f}{stats['rows_per_s']:>13,.0f}{stats['peak_mb']:>9.1f}"
+                  f"{baseline:>13}{change:>9}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="comma-separated row counts")
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help="comma-separated benchmarks to run")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed throughput drop before failing (0.3 = 30%%)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baselines")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    only = [b.strip() for b in args.only.split(",") if b.strip()]
+    unknown = set(only) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baselines = json.load(f)
+
+    baseline_path = os.path.abspath(args.baseline)
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        configure(workdir)
+        try:
+            results = run_suite(sizes, only, args.repeat, args.seed)
+        finally:
+            os.chdir(cwd)
+
+    regressions = compare(results, baselines, args.tolerance)
+    if args.save_baseline:
+        for name, by_size in results.items():
+            baselines.setdefault(name, {}).update(by_size)
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baselines saved to {baseline_path}")
+    elif regressions:
+        print("\nRegressions:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,14 @@
 from fpdf import FPDF
 import random
+import argparse
 from datetime import datetime, timedelta
+from typing import List, Tuple
+
+# (date, description, debit, credit, balance) as printed on the statement
+Row = Tuple[str, str, str, str, str]
+
+ENTITY_NAME = "MEGAMART SDN BHD"
+MARKDOWN_HEADER = "| Date | Transaction Description | Debit | Credit | Balance |\n|---|---|---|---|---|"
 
 class PDF(FPDF):
     def header(self):
@@ -44,21 +52,27 @@ class PDF(FPDF):
 
         self.ln(10)
 
-    def chapter_table(self, data):
+    def table_header(self):
         self.set_font('Arial', 'B', 8)
         self.set_fill_color(240, 240, 240)
         self.set_draw_color(200, 200, 200)
         
-        # Header
-        # Columns: Date | Value Date | Description | Debit | Credit | Balance
+        # Columns: Date | Description | Debit | Credit | Balance
         self.cell(20, 8, 'Date', 1, 0, 'C', 1)
         self.cell(80, 8, 'Transaction Description', 1, 0, 'C', 1)
         self.cell(30, 8, 'Debit', 1, 0, 'C', 1)
         self.cell(30, 8, 'Credit', 1, 0, 'C', 1)
         self.cell(30, 8, 'Balance', 1, 1, 'C', 1)
-
         self.set_font('Arial', '', 8)
+
+    def chapter_table(self, data):
+        self.table_header()
         for row in data:
+            # Long statements continue on a new page with the column header repeated
+            if self.get_y() + 6 > self.page_break_trigger:
+                self.cell(190, 0, '', 'T', 1)
+                self.add_page()
+                self.table_header()
             self.cell(20, 6, row[0], 'LR', 0, 'C')
             self.cell(80, 6, row[1][:45], 'LR', 0, 'L') # Truncate desc if too long
             self.cell(30, 6, row[2], 'LR', 0, 'R')
@@ -67,8 +81,8 @@ class PDF(FPDF):
             
         self.cell(190, 0, '', 'T', 1) # Closure line
 
-def generate_monthly_data(month_idx):
-    data = []
+def generate_monthly_data(month_idx, rng=random):
+    entries = [] # (date, description, debit, credit)
     # Fixed start date for the year
     year_start = datetime(2024, 1, 1)
     
@@ -76,68 +90,126 @@ def generate_monthly_data(month_idx):
     month_start = year_start + timedelta(days=30*month_idx)
     
     # Opening Balance logic
-    balance = 10000.00 + (13000.00 * month_idx)
-    
-    # Opening Balance Row
-    date_str = month_start.strftime('%d/%m/%y')
-    data.append((date_str, "OPENING BALANCE", "", "", f"{balance:,.2f}"))
+    opening_balance = 10000.00 + (13000.00 * month_idx)
     
     # 1. Concentration Risk
-    date_str = (month_start + timedelta(days=5)).strftime('%d/%m/%y')
-    credit = 20000.00
-    balance += credit
-    data.append((date_str, "TRF FROM MAIN CLIENT BERHAD", "", f"{credit:,.2f}", f"{balance:,.2f}"))
+    entries.append((month_start + timedelta(days=5), "TRF FROM MAIN CLIENT BERHAD", 0.0, 20000.00))
     
     # 2. Regular Operational Expenses
-    for i in range(random.randint(4, 7)):
-        day = random.randint(1, 28)
-        date_str = (month_start + timedelta(days=day)).strftime('%d/%m/%y')
-        debit = float(random.randint(500, 2000))
-        balance -= debit
-        data.append((date_str, "PAYMENT TO SUPPLIER XYZ", f"{debit:,.2f}", "", f"{balance:,.2f}"))
+    for i in range(rng.randint(4, 7)):
+        day = rng.randint(1, 28)
+        debit = float(rng.randint(500, 2000))
+        entries.append((month_start + timedelta(days=day), "PAYMENT TO SUPPLIER XYZ", debit, 0.0))
 
     # 3. Small Inflows
-    for i in range(random.randint(1, 4)):
-        day = random.randint(1, 28)
-        date_str = (month_start + timedelta(days=day)).strftime('%d/%m/%y')
-        credit = float(random.randint(100, 500))
-        balance += credit
-        data.append((date_str, "CASH DEPOSIT", "", f"{credit:,.2f}", f"{balance:,.2f}"))
+    for i in range(rng.randint(1, 4)):
+        day = rng.randint(1, 28)
+        credit = float(rng.randint(100, 500))
+        entries.append((month_start + timedelta(days=day), "CASH DEPOSIT", 0.0, credit))
         
     # 4. RED FLAG: Bounced Cheque (Every 2 months)
     if month_idx % 2 != 0: 
-        day = 15
-        date_str = (month_start + timedelta(days=day)).strftime('%d/%m/%y')
-        debit = 5000.00
-        balance -= debit
-        data.append((date_str, "RETURN CHEQUE - INSUFFICIENT FUNDS", f"{debit:,.2f}", "", f"{balance:,.2f}"))
+        entries.append((month_start + timedelta(days=15), "RETURN CHEQUE - INSUFFICIENT FUNDS", 5000.00, 0.0))
         
     # 5. RED FLAG: Gambling (Month 3 = April)
     if month_idx == 3:
-        day = 20
-        date_str = (month_start + timedelta(days=day)).strftime('%d/%m/%y')
-        debit = 2500.00
-        balance -= debit
-        data.append((date_str, "DEBIT CARD - GENTING CASINO", f"{debit:,.2f}", "", f"{balance:,.2f}"))
+        entries.append((month_start + timedelta(days=20), "DEBIT CARD - GENTING CASINO", 2500.00, 0.0))
     
-    # Sort
-    data.sort(key=lambda x: datetime.strptime(x[0], '%d/%m/%y'))
+    # Sort, then run the balance down the printed order so it adds up row by row
+    entries.sort(key=lambda e: e[0])
+    balance = opening_balance
+    data = [(month_start.strftime('%d/%m/%y'), "OPENING BALANCE", "", "", f"{balance:,.2f}")]
+    for date, description, debit, credit in entries:
+        balance += credit - debit
+        data.append((date.strftime('%d/%m/%y'), description,
+                     f"{debit:,.2f}" if debit else "", f"{credit:,.2f}" if credit else "", f"{balance:,.2f}"))
     
     return data, month_start
 
-# Main Generation Loop
-months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun"]
+# Scaled statements: (description, share of rows, debit or credit, amount range).
+# Inflows run slightly ahead of outflows, as for a growing business
+TRANSACTION_MIX = [
+    ("TRF FROM MAIN CLIENT BERHAD", 0.10, "credit", (5000, 12000)),
+    ("DUITNOW FROM ALPHA TRADING SDN BHD", 0.08, "credit", (1000, 5000)),
+    ("IBG CREDIT BETA ENTERPRISE", 0.05, "credit", (500, 3000)),
+    ("CASH DEPOSIT", 0.20, "credit", (100, 500)),
+    ("PAYMENT TO SUPPLIER XYZ", 0.35, "debit", (800, 3500)),
+    ("SALARY PAYMENT", 0.10, "debit", (1500, 4000)),
+    ("TNB ELECTRICITY BILL", 0.105, "debit", (200, 900)),
+    ("RETURN CHEQUE - INSUFFICIENT FUNDS", 0.01, "debit", (1000, 5000)),
+    ("DEBIT CARD - GENTING CASINO", 0.005, "debit", (500, 2500)),
+]
+
+# Dates are spread over at most two years so analytics keep every row
+MAX_SPAN_DAYS = 730
+
+def generate_rows(n_rows: int, seed: int = 0, start: datetime = datetime(2024, 1, 1)) -> List[Row]:
+    """
+    `n_rows` transactions in date order with a running balance, drawn from
+    TRANSACTION_MIX. The same seed always gives the same statement.
+    """
+    rng = random.Random(seed)
+    descriptions = [d for d, _, _, _ in TRANSACTION_MIX]
+    weights = [w for _, w, _, _ in TRANSACTION_MIX]
+    kinds = {d: (kind, bounds) for d, _, kind, bounds in TRANSACTION_MIX}
+    span = min(max(28, n_rows // 4), MAX_SPAN_DAYS)
 
-for i, m_name in enumerate(months):
+    balance = 50000.00
+    rows = []
+    for i, description in enumerate(rng.choices(descriptions, weights, k=n_rows)):
+        date_str = (start + timedelta(days=i * span // max(n_rows, 1))).strftime('%d/%m/%y')
+        kind, (low, high) = kinds[description]
+        amount = float(rng.randint(low, high))
+        if kind == "credit":
+            balance += amount
+            rows.append((date_str, description, "", f"{amount:,.2f}", f"{balance:,.2f}"))
+        else:
+            balance -= amount
+            rows.append((date_str, description, f"{amount:,.2f}", "", f"{balance:,.2f}"))
+    return rows
+
+def rows_to_markdown(rows: List[Row], rows_per_page: int = 40) -> List[str]:
+    """
+    The statement as OCR markdown, one string per page: entity header, then
+    the transaction table with its header repeated on every page.
+    """
+    pages = []
+    chunks = [rows[i:i + rows_per_page] for i in range(0, len(rows), rows_per_page)] or [[]]
+    for page, chunk in enumerate(chunks, start=1):
+        lines = [f"{ENTITY_NAME}\nSTATEMENT OF ACCOUNT\nPage {page} of {len(chunks)}\n", MARKDOWN_HEADER]
+        lines.extend(f"| {d} | {desc} | {debit} | {credit} | {balance} |" for d, desc, debit, credit, balance in chunk)
+        pages.append("\n".join(lines))
+    return pages
+
+def write_statement_pdf(rows: List[Row], filename: str, period_text: str = "Statement Date: 30 Jun 2024") -> None:
     pdf = PDF()
-    
-    # Set custom text for the header
-    pdf.period_text = f"Statement Period: 01 {m_name} 2024 - 28 {m_name} 2024"
-    
+    pdf.period_text = period_text
     pdf.add_page()
-    data, start_date = generate_monthly_data(i)
-    pdf.chapter_table(data)
-    
-    filename = f"Maybank_Statement_2024_{i+1:02d}_{m_name}.pdf"
+    pdf.chapter_table(rows)
     pdf.output(filename, 'F')
-    print(f"Generated: {filename}")
+
+def generate_monthly_statements(seed: int = 0):
+    """The six one-page demo statements (Jan to Jun 2024)."""
+    rng = random.Random(seed)
+    months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun"]
+    for i, m_name in enumerate(months):
+        data, start_date = generate_monthly_data(i, rng)
+        filename = f"Maybank_Statement_2024_{i+1:02d}_{m_name}.pdf"
+        write_statement_pdf(data, filename, f"Statement Period: 01 {m_name} 2024 - 28 {m_name} 2024")
+        print(f"Generated: {filename}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generates synthetic Maybank statements.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rows", type=int, help="write one statement with this many transactions (PDF and markdown) instead of the monthly set")
+    args = parser.parse_args()
+
+    if args.rows:
+        rows = generate_rows(args.rows, args.seed)
+        base = f"Synthetic_Statement_{args.rows}_rows"
+        write_statement_pdf(rows, f"{base}.pdf")
+        with open(f"{base}.md", "w", encoding="utf-8") as f:
+            f.write("\n\n".join(rows_to_markdown(rows)))
+        print(f"Generated: {base}.pdf, {base}.md")
+    else:
+        generate_monthly_statements(args.seed)
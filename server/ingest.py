@@ -0,0 +1,222 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import argparse
+import multiprocessing
+from datetime import datetime
+from typing import Any, Dict, List, Set, Tuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.database import SessionLocal, init_db
+from app.services.spool import SpooledFile
+from app.services.storage import prepare_analysis, write_analysis
+from app.services.telemetry import configure_logging
+
+DEFAULT_MANIFEST = "ingest_manifest.jsonl"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+logger = logging.getLogger("app.ingest")
+
+# (path, sha256, size)
+FileEntry = Tuple[str, str, int]
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def discover(root: str, group_by: str = "dir") -> Dict[str, List[str]]:
+    """
+    PDFs under `root`, grouped into one analysis per company. With "dir" the
+    statements in one directory are a company's (the usual archive layout);
+    with "file" every statement is analysed on its own.
+    """
+    groups: Dict[str, List[str]] = {}
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if not name.lower().endswith(".pdf"):
+                continue
+            path = os.path.join(directory, name)
+            group = os.path.relpath(directory if group_by == "dir" else path, root)
+            groups.setdefault(group, []).append(path)
+    return groups
+
+def load_manifest(path: str) -> Set[str]:
+    """
+    Hashes of files already stored by earlier runs. Failed entries are only
+    kept for the record, so those files are tried again.
+    """
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue # Line cut short by an interrupted write
+            if entry.get("status") == "ok":
+                done.add(entry["sha256"])
+    return done
+
+def append_manifest(path: str, entries: List[Dict[str, Any]]) -> None:
+    if not entries:
+        return
+    with open(path, "a", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(dict(entry, at=datetime.utcnow().isoformat())) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def init_worker(workers: int) -> None:
+    """
+    Pool processes split the OCR rate limit between them, so the pool as a
+    whole stays within OCR_RATE_PER_SECOND.
+    """
+    from app.services.ocr import ocr_client
+    configure_logging()
+    ocr_client.bucket.rate /= workers
+
+def process_group(group: str, files: List[FileEntry]) -> Dict[str, Any]:
+    """
+    Runs in a pool process: OCR, extraction and analytics for one company's
+    statements, then payload encoding, so the parent only writes to the database.
+    """
+    # Imported here: the pipeline opens the OCR cache, which must not be shared across processes
+    from app.services.ocr import process_spooled
+
+    start = time.perf_counter()
+    spooled = [SpooledFile(filename=os.path.basename(path), path=path, sha256=sha256, size=size) for path, sha256, size in files]
+    result = asyncio.run(process_spooled(spooled))
+    failed = {e["filename"]: e["error"] for e in result.get("file_errors", [])}
+    outcome = {
+        "group": group,
+        "files": files,
+        "failed": failed,
+        "status": result.get("status"),
+        "seconds": round(time.perf_counter() - start, 2)
+    }
+    if result.get("status") == "success":
+        outcome["entity_name"] = result.get("entity_name")
+        outcome["transactions"] = len(result["transactions"])
+        outcome["prepared"] = prepare_analysis(result)
+    return outcome
+
+def manifest_entries(outcome: Dict[str, Any], analysis_id=None) -> List[Dict[str, Any]]:
+    entries = []
+    for path, sha256, size in outcome["files"]:
+        error = outcome["failed"].get(os.path.basename(path)) or (None if analysis_id else outcome.get("error", outcome["status"]))
+        entry = {"sha256": sha256, "path": path, "group": outcome["group"], "status": "failed" if error else "ok"}
+        if error:
+            entry["error"] = error
+        else:
+            entry["analysis_id"] = analysis_id
+        entries.append(entry)
+    return entries
+
+def write_batch(batch: List[Dict[str, Any]], manifest_path: str) -> int:
+    """
+    Stores a batch of analyses in one transaction and records their files in
+    the manifest once committed. If the batch fails, each analysis is retried
+    on its own so one bad result does not hold back the others.
+    """
+    if not batch:
+        return 0
+    db = SessionLocal()
+    try:
+        ids = [write_analysis(db, outcome["prepared"]) for outcome in batch]
+        db.commit()
+        written = list(zip(batch, ids))
+    except Exception as e:
+        db.rollback()
+        logger.warning("Batch of %d failed (%s); writing one at a time", len(batch), e)
+        written = []
+        for outcome in batch:
+            try:
+                analysis_id = write_analysis(db, outcome["prepared"])
+                db.commit()
+                written.append((outcome, analysis_id))
+            except Exception as single_e:
+                db.rollback()
+                outcome["error"] = f"database: {single_e}"
+                append_manifest(manifest_path, manifest_entries(outcome))
+    finally:
+        db.close()
+
+    append_manifest(manifest_path, [entry for outcome, analysis_id in written for entry in manifest_entries(outcome, analysis_id)])
+    return len(written)
+
+def ingest(root: str, workers: int, batch_size: int, manifest_path: str, group_by: str, dry_run: bool = False):
+    configure_logging()
+    init_db()
+    groups = discover(root, group_by)
+    done = load_manifest(manifest_path)
+
+    pending: Dict[str, List[FileEntry]] = {}
+    seen: Set[str] = set()
+    total = skipped = 0
+    for group, paths in groups.items():
+        for path in paths:
+            total += 1
+            sha256 = file_hash(path)
+            if sha256 in done or sha256 in seen:
+                skipped += 1 # Already stored, or a copy of a file earlier in this run
+                continue
+            seen.add(sha256)
+            pending.setdefault(group, []).append((path, sha256, os.path.getsize(path)))
+
+    print(f"{total} statements in {len(groups)} groups; {skipped} already ingested or duplicated; "
+          f"{sum(len(f) for f in pending.values())} to process in {len(pending)} groups")
+    if dry_run or not pending:
+        return
+
+    start = time.perf_counter()
+    stored = failed = 0
+    batch: List[Dict[str, Any]] = []
+    # spawn: children start clean instead of inheriting the parent's open database connections
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker, initargs=(workers,)) as pool:
+        futures = {pool.submit(process_group, group, files): group for group, files in pending.items()}
+        for i, future in enumerate(as_completed(futures), start=1):
+            group = futures[future]
+            try:
+                outcome = future.result()
+            except Exception as e:
+                outcome = {"group": group, "files": pending[group], "failed": {}, "status": "error", "error": str(e)}
+
+            if outcome.get("prepared"):
+                batch.append(outcome)
+                print(f"[{i}/{len(pending)}] {group}: {outcome['entity_name']}, {outcome['transactions']} transactions in {outcome['seconds']}s")
+            else:
+                failed += 1
+                append_manifest(manifest_path, manifest_entries(outcome))
+                print(f"[{i}/{len(pending)}] {group}: failed ({outcome.get('error') or outcome['status']})")
+
+            if len(batch) >= batch_size:
+                stored += write_batch(batch, manifest_path)
+                batch = []
+        stored += write_batch(batch, manifest_path)
+
+    elapsed = time.perf_counter() - start
+    print(f"Done in {elapsed:.1f}s: {stored} analyses stored, {failed} groups failed. "
+          f"Re-run the same command to retry failures; finished files are skipped.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-ingest a directory tree of bank statements into the database.")
+    parser.add_argument("root", help="directory to scan for PDF statements")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="pipeline processes")
+    parser.add_argument("--batch-size", type=int, default=20, help="analyses per database commit")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST, help="record of finished files, used to resume")
+    parser.add_argument("--group-by", choices=["dir", "file"], default="dir", help="one analysis per directory or per file")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be processed")
+    args = parser.parse_args()
+    ingest(args.root, args.workers, args.batch_size, args.manifest, args.group_by, args.dry_run)
@@ -4,20 +4,27 @@ from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from contextlib import asynccontextmanager
 import os
+import logging
 import sqlite3
 import pandas as pd
 from app.database import init_db
+from app.services.telemetry import configure_logging, RequestContextMiddleware
 
 # Load environment variables
 load_dotenv()
+configure_logging()
+logger = logging.getLogger("app.main")
 
 # Verify API Key
-if not os.getenv("LLAMA_CLOUD_API_KEY"):
-    print("WARNING: LLAMA_CLOUD_API_KEY not found in environment variables. OCR will fail.")
+if not os.getenv("LLAMA_CLOUD_API_KEY") and os.getenv("OCR_BACKEND", "llamaparse") == "llamaparse":
+    logger.warning("LLAMA_CLOUD_API_KEY not found in environment variables. OCR will fail.")
 
 from app.api.upload import router as upload_router
 from app.api.history import router as history_router
 from app.api.chat import router as chat_router
+from app.api.jobs import router as jobs_router
+from app.api.transactions import router as transactions_router
+from app.api.metrics import router as metrics_router
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -39,12 +46,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+# Outermost: request ids and HTTP latency cover everything below, including CORS
+app.add_middleware(RequestContextMiddleware)
 
 # Include Routers
 app.include_router(upload_router)
 app.include_router(history_router)
 app.include_router(chat_router)
+app.include_router(jobs_router)
+app.include_router(transactions_router)
+app.include_router(metrics_router)
 
 @app.get("/", response_class=HTMLResponse)
 async def root():
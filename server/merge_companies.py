@@ -0,0 +1,42 @@
+import argparse
+from app.database import SessionLocal, init_db, create_tables, ensure_company_key_column, ensure_transaction_counted_column
+from app.services.companies import merge_duplicate_companies
+
+def merge_companies(dry_run: bool = False):
+    """
+    Consolidates companies whose names normalize to the same key (e.g.
+    "MEGAMART SDN BHD" and "MegaMart Sdn. Bhd.") and re-points their analyses
+    and transactions to the oldest record. Re-run after changing company_key
+    so stored keys follow the new rules.
+    """
+    if not dry_run:
+        # Databases from before the transactions and monthly aggregate tables
+        # lack them; merged companies get their months rebuilt from both
+        create_tables()
+        ensure_company_key_column()
+        ensure_transaction_counted_column()
+    db = SessionLocal()
+    try:
+        merges = merge_duplicate_companies(db, dry_run=dry_run)
+        for merge in merges:
+            names = ", ".join(f"#{m['id']} {m['name']!r}" for m in merge["merged"])
+            print(f"{merge['key']}: keep #{merge['kept']['id']} {merge['kept']['name']!r} <- {names} "
+                  f"({merge['analyses_moved']} analyses)")
+        if dry_run:
+            db.rollback()
+        else:
+            db.commit()
+    finally:
+        db.close()
+    if not dry_run:
+        init_db() # Builds the unique key index on databases that predate it
+
+    merged = sum(len(m["merged"]) for m in merges)
+    verb = "Would merge" if dry_run else "Merged"
+    print(f"{verb} {merged} duplicate companies into {len(merges)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge duplicate companies that share a normalized name.")
+    parser.add_argument("--dry-run", action="store_true", help="report the merges without changing anything")
+    args = parser.parse_args()
+    merge_companies(args.dry_run)
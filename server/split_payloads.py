@@ -0,0 +1,59 @@
+import json
+import argparse
+from sqlalchemy import exists, text
+from app.database import SessionLocal, Analysis, AnalysisSection, engine, init_db
+from app.services.payload import save_sections
+
+def split_payloads(batch_size: int = 50, vacuum: bool = False):
+    """
+    Moves legacy raw_json_results blobs into compressed analysis_sections rows
+    and clears the blob. Already-converted analyses are skipped, so the
+    migration can be re-run after an interruption.
+    """
+    init_db() # Creates analysis_sections if missing
+    db = SessionLocal()
+    converted = skipped = before = after = 0
+    try:
+        pending = [row.id for row in db.query(Analysis.id).filter(
+            Analysis.raw_json_results.isnot(None),
+            ~exists().where(AnalysisSection.analysis_id == Analysis.id)
+        ).order_by(Analysis.id)]
+        print(f"{len(pending)} analyses to convert")
+
+        for i, analysis_id in enumerate(pending, start=1):
+            analysis = db.query(Analysis).filter(Analysis.id == analysis_id).first()
+            try:
+                result = json.loads(analysis.raw_json_results)
+            except ValueError:
+                print(f"Skipping analysis {analysis_id}: corrupt JSON")
+                skipped += 1
+                continue
+
+            before += len(analysis.raw_json_results.encode("utf-8"))
+            save_sections(db, analysis_id, result)
+            db.flush()
+            after += sum(len(s.data) for s in db.query(AnalysisSection.data).filter(AnalysisSection.analysis_id == analysis_id))
+            analysis.raw_json_results = None
+            converted += 1
+            if i % batch_size == 0:
+                db.commit()
+                print(f"  {i}/{len(pending)} analyses")
+        db.commit()
+    finally:
+        db.close()
+
+    ratio = f" ({before / after:.1f}x smaller)" if after else ""
+    print(f"Done: {converted} converted, {skipped} skipped, {before} -> {after} payload bytes{ratio}")
+
+    if vacuum:
+        # Returns the freed pages to the filesystem
+        with engine.connect() as conn:
+            conn.execute(text("VACUUM"))
+        print("Database vacuumed")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert legacy analysis JSON blobs into compressed payload sections.")
+    parser.add_argument("--batch-size", type=int, default=50, help="analyses per commit")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM the database afterwards")
+    args = parser.parse_args()
+    split_payloads(args.batch_size, args.vacuum)
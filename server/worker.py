@@ -0,0 +1,43 @@
+import os
+import socket
+import asyncio
+import logging
+import argparse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.database import init_db
+from app.services.jobs import claim_job, run_job
+from app.services.telemetry import configure_logging
+
+logger = logging.getLogger("app.worker")
+
+async def worker_loop(slot: int, worker_id: str, poll_interval: float):
+    # Leases are owned per slot, so one slot can never complete a job a sibling re-claimed
+    worker_id = f"{worker_id}:{slot}"
+    while True:
+        job = await asyncio.to_thread(claim_job, worker_id)
+        if not job:
+            await asyncio.sleep(poll_interval)
+            continue
+        logger.info("[%s] slot %d running job %s (attempt %s/%s)", worker_id, slot, job["id"], job["attempts"], job["max_attempts"])
+        status = await run_job(job, worker_id)
+        logger.info("[%s] job %s -> %s", worker_id, job["id"], status)
+
+async def main(concurrency: int, poll_interval: float):
+    configure_logging()
+    init_db()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    logger.info("Worker %s started with %d slot(s)", worker_id, concurrency)
+    await asyncio.gather(*(worker_loop(i, worker_id, poll_interval) for i in range(concurrency)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Claims and runs queued analysis jobs.")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("WORKER_CONCURRENCY", "2")), help="jobs run at once by this process")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="seconds to wait when the queue is empty")
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.concurrency, args.poll_interval))
+    except KeyboardInterrupt:
+        logger.info("Worker stopped")
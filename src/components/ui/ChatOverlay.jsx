@@ -4,7 +4,28 @@ import { motion, AnimatePresence } from 'framer-motion';
 import ReactMarkdown from 'react-markdown';
 import remarkGfm from 'remark-gfm';
 
-const ChatOverlay = ({ isOpen, onClose }) => {
+// Parses a text/event-stream body from fetch (EventSource cannot POST)
+const readEvents = async function* (response) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const chunk = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            const data = chunk.split('\n').find(line => line.startsWith('data: '));
+            if (data) yield JSON.parse(data.slice(6));
+        }
+    }
+};
+
+const ChatOverlay = ({ isOpen, onClose, analysisId }) => {
     const [isTyping, setIsTyping] = useState(false);
     const [input, setInput] = useState('');
     const [messages, setMessages] = useState([
@@ -25,21 +46,29 @@ const ChatOverlay = ({ isOpen, onClose }) => {
         setIsTyping(true);
 
         try {
-            const res = await fetch('http://localhost:8000/api/chat', {
+            const res = await fetch('http://localhost:8000/api/chat/stream', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ message: userText })
+                // Scope the chat to the report on screen (newest analysis if unknown)
+                body: JSON.stringify({ message: userText, analysis_id: analysisId ?? null })
             });
 
             if (!res.ok) throw new Error("Failed to get response");
 
-            const data = await res.json();
-
-            setMessages(prev => [...prev, {
-                id: Date.now() + 1,
-                type: 'bot',
-                text: data.response
-            }]);
+            // Tokens are appended to one bot message as they arrive
+            const botId = Date.now() + 1;
+            let started = false;
+            for await (const event of readEvents(res)) {
+                if (event.event === 'error') throw new Error(event.detail);
+                if (event.event !== 'token') continue;
+                if (!started) {
+                    started = true;
+                    setIsTyping(false);
+                    setMessages(prev => [...prev, { id: botId, type: 'bot', text: event.text }]);
+                } else {
+                    setMessages(prev => prev.map(m => m.id === botId ? { ...m, text: m.text + event.text } : m));
+                }
+            }
         } catch (error) {
             console.error(error);
             setMessages(prev => [...prev, {
@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 
 export const useAnalysis = () => {
@@ -11,6 +11,7 @@ export const useAnalysis = () => {
     ]);
     const [currentStepIndex, setCurrentStepIndex] = useState(-1);
     const [error, setError] = useState(null);
+    const [detail, setDetail] = useState('Initializing LlamaParse...');
 
     const updateStep = (index, status) => {
         setSteps(prev => prev.map((step, i) =>
@@ -18,16 +19,56 @@ export const useAnalysis = () => {
         ));
     };
 
+    // Backend pipeline stages -> visible step
+    const STAGE_TO_STEP = {
+        spooling: 0,
+        metadata: 0,
+        ocr: 0,
+        extraction: 1,
+        analytics: 2,
+        indexing: 2,
+        saving: 2
+    };
+
+    const describeEvent = (event) => {
+        const files = `${event.files_done}/${event.total_files} files`;
+        const txns = `${event.transactions} transactions`;
+        if (event.event === 'stage_started') {
+            return `${event.stage}${event.file ? ` · ${event.file}` : ''} (${files}, ${txns})`;
+        }
+        if (event.event === 'stage_completed') {
+            return `${event.stage} done in ${Math.round(event.elapsed_ms)} ms (${files}, ${txns})`;
+        }
+        return null;
+    };
+
+    // Parses a text/event-stream body from fetch (EventSource cannot POST files)
+    const readEvents = async function* (response) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const chunk = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                const data = chunk.split('\n').find(line => line.startsWith('data: '));
+                if (data) yield JSON.parse(data.slice(6));
+            }
+        }
+    };
+
     const startAnalysis = async (files) => {
         setStatus('processing');
         setCurrentStepIndex(0);
         setError(null);
 
         try {
-            // Step 1: Upload and OCR
-            // We'll treat the upload API call as covering all steps for now, 
-            // but we can animate the progress bar while waiting.
-
             const formData = new FormData();
             files.forEach(file => {
                 formData.append('files', file);
@@ -36,12 +77,8 @@ export const useAnalysis = () => {
             // Start animation for step 1
             updateStep(0, 'process');
 
-            // Ideally we would stream progress, but for a simple prototype:
-            // We'll just wait for the response.
-            // To make it look "alive", we can simulate step completion if it takes time, 
-            // or just move to "done" when we get the response.
-
-            const response = await fetch('http://localhost:8000/api/upload', {
+            // The stream endpoint reports each real pipeline stage as it happens
+            const response = await fetch('http://localhost:8000/api/upload/stream', {
                 method: 'POST',
                 body: formData,
             });
@@ -50,19 +87,37 @@ export const useAnalysis = () => {
                 throw new Error('Upload failed');
             }
 
-            const data = await response.json();
-
-            // When data comes back, strict sequence:
-            updateStep(0, 'done');
-            setCurrentStepIndex(1);
+            let data = null;
+            let stepIndex = 0;
+
+            for await (const event of readEvents(response)) {
+                if (event.event === 'error') {
+                    throw new Error(event.detail);
+                }
+                if (event.event === 'result') {
+                    data = event.result;
+                    break;
+                }
+
+                const step = STAGE_TO_STEP[event.stage];
+                if (step !== undefined && step > stepIndex) {
+                    // Earlier steps are finished once a later stage begins
+                    for (let i = stepIndex; i < step; i++) updateStep(i, 'done');
+                    updateStep(step, 'process');
+                    setCurrentStepIndex(step);
+                    stepIndex = step;
+                }
+
+                const text = describeEvent(event);
+                if (text) setDetail(text);
+            }
 
-            // Fast forward other steps for visual effect
-            await new Promise(r => setTimeout(r, 500));
-            updateStep(1, 'done');
-            setCurrentStepIndex(2);
+            if (!data) {
+                throw new Error('Analysis stream ended unexpectedly');
+            }
 
-            await new Promise(r => setTimeout(r, 500));
-            updateStep(2, 'done');
+            for (let i = stepIndex; i < steps.length; i++) updateStep(i, 'done');
+            setCurrentStepIndex(steps.length - 1);
 
             setStatus('complete');
 
@@ -83,6 +138,7 @@ export const useAnalysis = () => {
         steps,
         currentStepIndex,
         startAnalysis,
+        detail,
         error
     };
 };
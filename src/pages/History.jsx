@@ -3,20 +3,36 @@ import { useNavigate } from 'react-router-dom';
 import { Search, Filter, Calendar, ChevronRight, FileText, Trash2 } from 'lucide-react';
 import { motion } from 'framer-motion';
 
+const RISK_LEVELS = ['High Risk', 'Moderate Risk', 'Low Risk Profile'];
+const PAGE_SIZE = 50;
+
 const History = () => {
     const [history, setHistory] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [total, setTotal] = useState(0);
+    const [riskLevel, setRiskLevel] = useState('');
     const [loading, setLoading] = useState(true);
+    const [loadingMore, setLoadingMore] = useState(false);
     const navigate = useNavigate();
 
     useEffect(() => {
         fetchHistory();
-    }, []);
+    }, [riskLevel]);
+
+    const fetchPage = async (cursor) => {
+        const params = new URLSearchParams({ limit: PAGE_SIZE });
+        if (riskLevel) params.set('risk_level', riskLevel);
+        if (cursor) params.set('cursor', cursor);
+        const res = await fetch(`http://localhost:8000/api/history?${params}`);
+        return res.json();
+    };
 
     const fetchHistory = async () => {
         try {
-            const res = await fetch('http://localhost:8000/api/history');
-            const data = await res.json();
-            setHistory(data);
+            const data = await fetchPage(null);
+            setHistory(data.items);
+            setNextCursor(data.next_cursor);
+            setTotal(data.total);
         } catch (error) {
             console.error("Failed to fetch history:", error);
         } finally {
@@ -24,13 +40,27 @@ const History = () => {
         }
     };
 
+    const loadMore = async () => {
+        setLoadingMore(true);
+        try {
+            const data = await fetchPage(nextCursor);
+            setHistory(prev => [...prev, ...data.items]);
+            setNextCursor(data.next_cursor);
+            setTotal(data.total);
+        } catch (error) {
+            console.error("Failed to fetch history:", error);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     const handleViewReport = async (id) => {
         try {
-            // Fetch full details
-            const res = await fetch(`http://localhost:8000/api/analysis/${id}`);
+            // Fetch only what the report renders (no transactions or raw markdown)
+            const res = await fetch(`http://localhost:8000/api/analysis/${id}?fields=summary,graph`);
             const data = await res.json();
             // Navigate to results with state
-            navigate('/results', { state: { result: data } });
+            navigate('/results', { state: { data } });
         } catch (error) {
             console.error("Failed to load report", error);
             alert("Could not load report details.");
@@ -56,6 +86,21 @@ const History = () => {
                 <p className="text-gray-400">Archive of all processed bank statements and risk assessments.</p>
             </header>
 
+            <div className="flex items-center justify-between mb-4">
+                <div className="flex items-center gap-2 text-gray-400">
+                    <Filter size={16} />
+                    <select
+                        value={riskLevel}
+                        onChange={(e) => setRiskLevel(e.target.value)}
+                        className="bg-gray-900 border border-gray-800 rounded-lg px-3 py-2 text-sm text-white"
+                    >
+                        <option value="">All risk levels</option>
+                        {RISK_LEVELS.map(level => <option key={level} value={level}>{level}</option>)}
+                    </select>
+                </div>
+                <span className="text-sm text-gray-500">Showing {history.length} of {total}</span>
+            </div>
+
             {loading ? (
                 <div className="text-center py-20 text-gray-500">Loading history...</div>
             ) : (
@@ -136,6 +181,17 @@ const History = () => {
                             )}
                         </tbody>
                     </table>
+                    {nextCursor && (
+                        <div className="p-6 text-center border-t border-gray-800">
+                            <button
+                                onClick={loadMore}
+                                disabled={loadingMore}
+                                className="text-gray-400 hover:text-brand transition-colors font-medium text-sm disabled:opacity-50"
+                            >
+                                {loadingMore ? 'Loading...' : 'Load more'}
+                            </button>
+                        </div>
+                    )}
                 </div>
             )}
         </div>
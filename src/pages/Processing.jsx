@@ -5,7 +5,7 @@ import { Check } from 'lucide-react';
 import { motion } from 'framer-motion';
 
 const Processing = () => {
-    const { status, steps, startAnalysis, error } = useAnalysis();
+    const { status, steps, startAnalysis, detail, error } = useAnalysis();
     const location = useLocation();
     const hasStarted = React.useRef(false);
 
@@ -33,7 +33,7 @@ const Processing = () => {
             <h2 className="text-2xl font-bold text-dark mb-2">Analyzing Data</h2>
             <div className="h-6 overflow-hidden relative w-full max-w-xs mb-8">
                 <p className="text-sm text-gray-500 transition-all duration-300 absolute w-full text-center top-0">
-                    Initializing LlamaParse...
+                    {detail}
                 </p>
             </div>
 
@@ -225,7 +225,7 @@ const Results = () => {
                 </button>
             </div>
 
-            <ChatOverlay isOpen={isChatOpen} onClose={() => setIsChatOpen(false)} />
+            <ChatOverlay isOpen={isChatOpen} onClose={() => setIsChatOpen(false)} analysisId={apiData?.id} />
         </motion.div>
     );
 };